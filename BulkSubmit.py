@@ -0,0 +1,188 @@
+"""Module containing the bulk ticket submission API for scripted and farm use.
+
+Submits many tickets without any UI, e.g. one per failed farm task:
+
+    from jiraticketsubmitter import BulkSubmit
+    specs = [BulkSubmit.TicketSpec(title='sim failed', description=log, item=hou.node('/obj/sim'))]
+    for result in BulkSubmit.submit_tickets(specs):
+        print result.key, result.error, result.seconds
+
+Environment collection, the hip file snapshot and the JIRA connection are shared by every ticket in a batch. The JIRA
+calls run on a bounded pool of worker threads behind a client side rate limit, and every call also goes through the
+session wide JiraThrottle.
+"""
+
+# standard Python modules
+from collections import namedtuple
+import Queue
+import threading
+import time
+
+# SESI supplied modules
+import hou
+
+# dneg modules
+import ticket_creator
+
+# local modules
+from jiraticketsubmitter import HipFileUtils, HoudiniTicket, JiraThrottle, TicketLedger, TransferScheduler
+
+# number of tickets submitted at the same time
+DN_BULK_MAX_WORKERS = 4
+
+# maximum number of tickets started per second
+DN_BULK_RATE_LIMIT = 2.0
+
+# one ticket to submit, only title and description are required
+TicketSpec = namedtuple("TicketSpec", ["title", "description", "item", "item_parent", "priority", "save_hip"])
+TicketSpec.__new__.__defaults__ = (None, None, None, False)
+
+# outcome of submitting one TicketSpec, key is None and error is set if it failed
+TicketResult = namedtuple("TicketResult", ["spec", "key", "error", "seconds", "queued_seconds"])
+
+
+# ----------------------------------------------------
+# functions defined for this module
+# ----------------------------------------------------
+
+
+def submit_ticket(jira_submit, title=None, description=None, submission_hip_file=None, creator=None,
+                  coalesce_duplicates=False):
+    """Create the issue for a HoudiniTicket and add the final description as its first comment, without any UI.
+
+    With coalesce_duplicates, a likely duplicate found in the TicketLedger gets the description added as a comment
+    instead of a new ticket being created.
+
+    Args:
+        jira_submit (HoudiniTicket): ticket built with disable_ui=True
+        title (str): ticket summary
+        description (str): ticket description
+        submission_hip_file (str): saved hip file to reference in the description, if any
+        creator (JiraTicketCreator): ticket creator to reuse, a new one is made if None
+        coalesce_duplicates (bool): comment on a likely duplicate ticket rather than create a new one
+
+    Raises:
+        hou.OperationFailed: title or description is missing
+        exceptions.TicketValidationError: raised if ticket is not valid
+
+    Returns:
+        jira.Issue: created issue, or the TicketLedger.LedgerEntry of the duplicate that was commented on
+
+    """
+    ticket = jira_submit
+    info = jira_submit.info_for_dialog
+    if title:
+        ticket.title = title
+    if description:
+        ticket.comment = description
+
+    # exit here if comment (description) or title (summary) is empty
+    if not ticket.title or ticket.title == HoudiniTicket.DN_TICKET_TITLE_MESSAGE:
+        raise hou.OperationFailed("Please enter a valid issue summary")
+    if not ticket.comment or ticket.comment == HoudiniTicket.DN_TICKET_DESCRIPTION_MESSAGE:
+        raise hou.OperationFailed("Please enter a valid issue description")
+
+    jira_server = info['jira_server']
+    jira = HoudiniTicket.get_jira_connection(server=jira_server)
+
+    # add to a likely duplicate instead of creating a new ticket
+    duplicate = TicketLedger.find_duplicate(jira_submit.ticket_signature) if coalesce_duplicates else None
+    if duplicate:
+        comment = "[{0}] {1}\n\n{2}".format(ticket.reporter, ticket.title, ticket.comment)
+        JiraThrottle.add_comment(jira_server, jira, duplicate.key, comment)
+        return duplicate
+
+    # prepend reporter to the ticket title
+    ticket.title = "[{0}] {1}".format(ticket.reporter, ticket.title)
+    final_description = HipFileUtils.set_submission_hip_location(info['final_jira_description'],
+                                                                 submission_hip_file)
+
+    creator = creator or ticket_creator.ext.jira.JiraTicketCreator()
+    creator.validate(ticket)
+
+    # create ticket and add final description as initial comment
+    issue = JiraThrottle.call(jira_server, creator.create, ticket)
+    if issue:
+        if final_description:
+            JiraThrottle.add_comment(jira_server, jira, issue, final_description)
+        if jira_submit.attachments:
+            HoudiniTicket.add_attachments(jira_server, jira, issue, jira_submit.attachments)
+            HoudiniTicket.set_auto_info_field(jira_server, jira, issue, jira_submit.attachments)
+        TicketLedger.record(jira_submit.ticket_signature, issue.key)
+        if submission_hip_file:
+            TransferScheduler.link_ticket(submission_hip_file, issue.key, jira_server)
+    return issue
+
+
+# noinspection PyBroadException
+def submit_tickets(specs, jira_server='jira', max_workers=DN_BULK_MAX_WORKERS, rate_limit=DN_BULK_RATE_LIMIT,
+                   coalesce_duplicates=False):
+    """Submit many tickets with bounded concurrency and a client side rate limit.
+
+    HoudiniTickets are built one after the other on the calling thread since they query Houdini, only the JIRA calls
+    run on the worker threads. At most one hip file snapshot is saved for the whole batch.
+
+    Args:
+        specs (list of TicketSpec): tickets to submit
+        jira_server (str): name of jira server to use
+        max_workers (int): number of tickets submitted at the same time
+        rate_limit (float): maximum number of tickets started per second, 0 for no limit
+        coalesce_duplicates (bool): comment on likely duplicate tickets rather than create new ones
+
+    Returns:
+        list of TicketResult: one result per spec, in the same order
+
+    """
+    results = [None] * len(specs)
+    jobs = Queue.Queue()
+    if coalesce_duplicates:
+        TicketLedger.refresh_index()
+
+    # one snapshot shared by every spec that asks for it
+    submission_hip_file = None
+    if any(_.save_hip for _ in specs):
+        priorities = [_.priority for _ in specs if _.save_hip]
+        submission_hip_file = HipFileUtils.save_and_transfer_hip(
+            is_ui=False, priority=min(priorities, key=TransferScheduler.get_priority_rank))
+
+    # build tickets, sharing the session caches for connection, watchers and environment info
+    for index, spec in enumerate(specs):
+        start = time.time()
+        try:
+            jira_submit = HoudiniTicket.HoudiniTicket(item=spec.item, item_parent=spec.item_parent, disable_ui=True,
+                                                      jira_server=jira_server)
+            if spec.priority:
+                jira_submit.priority = spec.priority
+        except Exception as e:
+            results[index] = TicketResult(spec, None, e, time.time() - start, 0.0)
+        else:
+            jobs.put((index, spec, jira_submit))
+
+    limiter = JiraThrottle.TokenBucket(rate_limit, burst=1)
+
+    def _worker():
+        creator = ticket_creator.ext.jira.JiraTicketCreator()
+        while True:
+            try:
+                index, spec, jira_submit = jobs.get_nowait()
+            except Queue.Empty:
+                return
+
+            queued = limiter.acquire()
+            start = time.time()
+            try:
+                hip_file = submission_hip_file if spec.save_hip else None
+                issue = submit_ticket(jira_submit, spec.title, spec.description, hip_file, creator,
+                                      coalesce_duplicates)
+                results[index] = TicketResult(spec, issue.key if issue else None, None, time.time() - start, queued)
+            except Exception as e:
+                results[index] = TicketResult(spec, None, e, time.time() - start, queued)
+
+    threads = [threading.Thread(target=_worker) for _ in range(max(1, min(max_workers, jobs.qsize())))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
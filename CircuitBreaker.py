@@ -0,0 +1,207 @@
+"""Module containing the circuit breaker that tracks JIRA availability for the submitter.
+
+Without it every submitter open blocks on a connection attempt, so artists wait out the full network timeout again
+and again while the server is down. A breaker per jira server opens on a failed connection. While it is open no
+connection is attempted in the foreground, the dialog opens straight away in "queue for later" mode and a background
+thread probes the server. Once a probe succeeds the breaker closes and queued tickets are submitted.
+
+Breaker state is shared within the process and cached briefly on local disk so new sessions skip a dead server too.
+"""
+
+# standard Python modules
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+# used by the jira client
+import requests
+
+# local modules
+from jiraticketsubmitter.MetadataCache import DN_JIRA_LOCAL_CACHE_DIR
+
+# breaker states
+DN_CIRCUIT_CLOSED = "closed"
+DN_CIRCUIT_OPEN = "open"
+DN_CIRCUIT_HALF_OPEN = "half_open"
+
+# consecutive failures that open the breaker, each one has already cost a full network timeout
+DN_CIRCUIT_FAILURE_THRESHOLD = 1
+
+# how long the breaker stays open before a background probe is made (seconds)
+DN_CIRCUIT_RESET_TIMEOUT = 60.0
+
+# how long breaker state cached on disk is trusted by other sessions (seconds)
+DN_CIRCUIT_DISK_TTL = 600.0
+
+# per jira server breakers for this process
+_BREAKERS = {}
+_LOCK = threading.Lock()
+
+
+# ----------------------------------------------------
+# classes defined for this module
+# ----------------------------------------------------
+
+
+class CircuitBreaker(object):
+    """Closed, open and half-open availability state of one jira server.
+
+    Args:
+        jira_server (str): name of jira server
+
+    """
+
+    def __init__(self, jira_server):
+        """Initialize a closed breaker, then pick up any recent state another session cached on disk."""
+        self.jira_server = jira_server
+        self.state = DN_CIRCUIT_CLOSED
+        self.failures = 0
+        self.changed_at = time.time()
+
+        self._prober = None
+        self._lock = threading.Lock()
+        self._read_state()
+
+    @property
+    def is_closed(self):
+        """bool: True if connections may be attempted in the foreground."""
+        return self.state == DN_CIRCUIT_CLOSED
+
+    def record_success(self):
+        """Close the breaker after a successful call."""
+        with self._lock:
+            changed = self.state != DN_CIRCUIT_CLOSED
+            self.failures = 0
+            self._set_state(DN_CIRCUIT_CLOSED, write=changed)
+
+    def record_failure(self):
+        """Count a failed call, opening the breaker once the threshold is reached."""
+        with self._lock:
+            self.failures += 1
+            if self.state == DN_CIRCUIT_HALF_OPEN or self.failures >= DN_CIRCUIT_FAILURE_THRESHOLD:
+                self._set_state(DN_CIRCUIT_OPEN)
+        if not self.is_closed:
+            self.probe_in_background()
+
+    def probe_in_background(self):
+        """Start the background prober unless it is already running."""
+        with self._lock:
+            if self._prober is not None and self._prober.is_alive():
+                return
+            self._prober = threading.Thread(target=self._probe_until_closed)
+            self._prober.daemon = True
+            self._prober.start()
+
+    # noinspection PyBroadException
+    def _probe_until_closed(self):
+        """Probe the server every reset timeout until it answers, then submit any queued tickets."""
+        from jiraticketsubmitter import TicketQueue
+        import ticket_creator
+
+        while not self.is_closed:
+            time.sleep(max(0.0, self.changed_at + DN_CIRCUIT_RESET_TIMEOUT - time.time()))
+            with self._lock:
+                self._set_state(DN_CIRCUIT_HALF_OPEN, write=False)
+            try:
+                # fresh connection and a real request, the cached session connection may be stale
+                connection = ticket_creator.ext.jira.tools.get_jira_connection(server=self.jira_server)
+                connection.server_info()
+            except Exception:
+                self.record_failure()
+            else:
+                self.record_success()
+
+        TicketQueue.submit_queued_tickets(self.jira_server)
+
+    def _set_state(self, state, write=True):
+        """Change state, call with the lock held.
+
+        Args:
+            state (str): new state
+            write (bool): cache the new state on disk
+
+        """
+        if state != self.state:
+            self.state = state
+            self.changed_at = time.time()
+        if write:
+            self._write_state()
+
+    def _get_state_path(self):
+        """Get the disk cache file of this breaker.
+
+        Returns:
+            str: path to state file
+
+        """
+        file_name = "circuit_{0}.json".format(self.jira_server.replace(os.sep, "_").replace(":", "_"))
+        return os.path.join(DN_JIRA_LOCAL_CACHE_DIR, file_name)
+
+    def _read_state(self):
+        """Pick up state cached on disk by another session, if recent enough."""
+        try:
+            with open(self._get_state_path(), "r") as _file:
+                cached = json.load(_file)
+        except (IOError, OSError, ValueError):
+            return
+
+        if cached.get('state') == DN_CIRCUIT_OPEN and time.time() - cached.get('changed_at', 0) < DN_CIRCUIT_DISK_TTL:
+            self.state = DN_CIRCUIT_OPEN
+            self.failures = cached.get('failures', DN_CIRCUIT_FAILURE_THRESHOLD)
+            self.changed_at = cached['changed_at']
+
+    def _write_state(self):
+        """Cache state on disk, failing silently."""
+        try:
+            if not os.path.isdir(DN_JIRA_LOCAL_CACHE_DIR):
+                os.makedirs(DN_JIRA_LOCAL_CACHE_DIR)
+            fd, tmp_path = tempfile.mkstemp(dir=DN_JIRA_LOCAL_CACHE_DIR, suffix=".tmp")
+            with os.fdopen(fd, "w") as _file:
+                json.dump({'state': self.state, 'failures': self.failures, 'changed_at': self.changed_at}, _file)
+            os.rename(tmp_path, self._get_state_path())
+        except (IOError, OSError):
+            pass
+
+
+# ----------------------------------------------------
+# functions defined for this module
+# ----------------------------------------------------
+
+
+def is_unreachable_error(error):
+    """Check if a failed JIRA call failed because the server could not be reached, rather than being rejected.
+
+    Args:
+        error (Exception): exception raised by the jira client or ticket creator
+
+    Returns:
+        bool: True for connection errors and timeouts
+
+    """
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, socket.error))
+
+
+def get_breaker(jira_server='jira'):
+    """Get the breaker shared by everything in this process that talks to a jira server.
+
+    An open breaker picked up from disk starts probing in the background straight away.
+
+    Args:
+        jira_server (str): name of jira server
+
+    Returns:
+        CircuitBreaker: the server's breaker
+
+    """
+    with _LOCK:
+        breaker = _BREAKERS.get(jira_server)
+        if breaker is None:
+            breaker = CircuitBreaker(jira_server)
+            _BREAKERS[jira_server] = breaker
+
+    if not breaker.is_closed:
+        breaker.probe_in_background()
+    return breaker
@@ -15,6 +15,7 @@ from qtswitch import QtCore
 # local modules
 from .HoudiniTicket import *
 from .HouJiraReportDialog import *
+from jiraticketsubmitter import ScreenCapture, Warmup
 
 
 # post fix to use for temp node to store shelf tool/parent names
@@ -26,6 +27,9 @@ DN_JIRA_SUBMIT_PANE_SLEEP_INC = 2.0
 # set sleep max for submission message detection thread (seconds)
 DN_JIRA_SUBMIT_PANE_SLEEP_MAX = 7200.0
 
+# build the lightweight submitter dialog rather than the full JiraReportDialog ui
+DN_JIRA_LIGHTWEIGHT_DIALOG = True
+
 
 # ----------------------------------------------------
 # functions defined for this module
@@ -59,16 +63,9 @@ def create_interface(pane_tab):
         # check for shelf tmp name
         m = line.search(sel_nodes[0].path())
         if not m:
-            jira_submit = HoudiniTicket(item=sel_nodes[0], pane_tab=pane_tab)
-            dialog = HouJiraReportDialog(**jira_submit.info_for_dialog)
-
-            # parent new dialog to main window if in houdini 16 and up
-            # NOTE: can't do this in houdini 15 and below because in 15 dialog is a PyQt4.QtGui.QWidget whereas parent
-            # hou.ui.mainQtWindow() is a PySide.QtGui.QWidget
-            if int(hou.applicationVersionString().split(".")[0]) >= 16:
-                dialog.setParent(hou.qt.mainWindow(), QtCore.Qt.Window)
-
-            return dialog
+            # one ticket for the whole selection, e.g. a broken chain of nodes
+            jira_submit = HoudiniTicket(item=sel_nodes[0], items=sel_nodes, pane_tab=pane_tab)
+            return create_dialog(jira_submit)
 
         # matches shelf tool regex so treat as shelf tool jira
         elif m.group("node") and m.group("parent"):
@@ -84,13 +81,7 @@ def create_interface(pane_tab):
                 if owner_parent_name in hou.shelves.shelves():
                     tool_shelf = hou.shelves.shelves()[owner_parent_name]
                 jira_submit = HoudiniTicket(item=tool, item_parent=tool_shelf, pane_tab=pane_tab)
-                dialog = HouJiraReportDialog(**jira_submit.info_for_dialog)
-
-                # parent new dialog to main window if in houdini 16 and up
-                # NOTE: can't do this in houdini 15 and below because in 15 dialog is a PyQt4.QtGui.QWidget whereas
-                # parent hou.ui.mainQtWindow() is a PySide.QtGui.QWidget
-                if int(hou.applicationVersionString().split(".")[0]) >= 16:
-                    dialog.setParent(hou.qt.mainWindow(), QtCore.Qt.Window)
+                dialog = create_dialog(jira_submit)
 
                 # try to remove temp node
                 try:
@@ -107,15 +98,34 @@ def create_interface(pane_tab):
     # generic case
     else:
         jira_submit = HoudiniTicket(item=None, pane_tab=pane_tab)
-        dialog = HouJiraReportDialog(**jira_submit.info_for_dialog)
+        return create_dialog(jira_submit)
 
-        # parent new dialog to main window if in houdini 16 and up
-        # NOTE: can't do this in houdini 15 and below because in 15 dialog is a PyQt4.QtGui.QWidget whereas parent
-        # hou.ui.mainQtWindow() is a PySide.QtGui.QWidget
-        if int(hou.applicationVersionString().split(".")[0]) >= 16:
-                dialog.setParent(hou.qt.mainWindow(), QtCore.Qt.Window)
 
-        return dialog
+def create_dialog(jira_submit):
+    """Create the report dialog for a HoudiniTicket and parent it to the main window.
+
+    Uses the hidden dialog kept ready by the Warmup module when there is one.
+
+    Args:
+        jira_submit (HoudiniTicket): ticket to create dialog for.
+
+    Returns:
+        HouJiraReportDialog: dialog object to pass to parent panel
+
+    """
+    dialog = Warmup.take_dialog() if DN_JIRA_LIGHTWEIGHT_DIALOG else None
+    if dialog is not None:
+        dialog.retarget(**jira_submit.info_for_dialog)
+    else:
+        dialog = HouJiraReportDialog(lightweight=DN_JIRA_LIGHTWEIGHT_DIALOG, **jira_submit.info_for_dialog)
+
+    # parent new dialog to main window if in houdini 16 and up
+    # NOTE: can't do this in houdini 15 and below because in 15 dialog is a PyQt4.QtGui.QWidget whereas parent
+    # hou.ui.mainQtWindow() is a PySide.QtGui.QWidget
+    if int(hou.applicationVersionString().split(".")[0]) >= 16:
+        dialog.setParent(hou.qt.mainWindow(), QtCore.Qt.Window)
+
+    return dialog
 
 
 def check_shelf_tool_owner_name(**kwargs):
@@ -254,12 +264,16 @@ def launch_jira_submit_panel(item=None):
         hou.Node: Reference to pane_tab object.
 
     """
-    if isinstance(item, hou.Node):
-        # select only the node which is passed to the panel launcher
+    if isinstance(item, hou.Node) and not item.isSelected():
+        # select only the node which is passed to the panel launcher, a selection it is part of is kept for a multi
+        # node ticket
         for _node in hou.selectedNodes():
             _node.setSelected(False)
         item.setSelected(True)
 
+    # grab the viewer and network editor before the submitter pane covers them
+    ScreenCapture.capture_before_open()
+
     # Open a floating parameter pane for a particular node
     desktop = hou.ui.curDesktop()
     pane_tab = desktop.createFloatingPaneTab(hou.paneTabType.PythonPanel, size=(700, 600))
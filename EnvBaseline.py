@@ -0,0 +1,369 @@
+"""Module containing the cached site environment baseline that tickets are diffed against.
+
+Every ticket used to carry the full HOUDINI_PATH, DN HOUDINI tool versions and BOB package list, which are the same
+for nearly every artist on a show running the same Houdini version. A baseline of that environment is stored once per
+show and Houdini version in the shared tools data area, and tickets carry only their deviations from it plus the
+baseline id. The full environment of a ticket can be rebuilt from the baseline and the diff:
+
+    hython -m jiraticketsubmitter.EnvBaseline rebuild houdini_environment_diff.json
+
+and a show's baseline regenerated from the current environment with:
+
+    hython -m jiraticketsubmitter.EnvBaseline build
+"""
+
+# standard Python modules
+import argparse
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+
+# shared baseline files, <show>_<houdini version>.json is the current baseline of a show, <baseline id>.json are
+# never changed once written so old tickets can always be rebuilt
+DN_ENV_BASELINE_DIR = "/tools/SITE/data/houdini/jira_env_baselines"
+
+# format of baseline and diff files
+DN_ENV_BASELINE_VERSION = 1
+
+# attachment holding a ticket's diff, as taken by the rebuild command
+DN_ENV_DIFF_ATTACHMENT_NAME = "houdini_environment_diff.json"
+
+# environment sections, list sections are ordered and diffed whole, dict sections are diffed per key
+DN_ENV_LIST_SECTIONS = ("houdini_path",)
+DN_ENV_DICT_SECTIONS = ("curtools", "bob")
+
+# baselines read this session, keyed by show and houdini version
+_BASELINES = {}
+_LOCK = threading.Lock()
+
+
+def collect_environment():
+    """Collect the environment sections of the current session.
+
+    Returns:
+        dict: section name to list or OrderedDict
+
+    """
+    from jiraticketsubmitter import TicketInfo
+
+    return {'houdini_path': TicketInfo.get_houdini_path_list(),
+            'curtools': TicketInfo.get_curtools_dict(),
+            'bob': TicketInfo.get_bob_dict()}
+
+
+def get_baseline_id(show, houdini_version, environment):
+    """Build the id of a baseline from its content.
+
+    Args:
+        show (str): show the baseline is for
+        houdini_version (str): hou.applicationVersionString()
+        environment (dict): as returned by collect_environment
+
+    Returns:
+        str: baseline id
+
+    """
+    text = json.dumps(environment, sort_keys=True)
+    return "{0}_{1}_{2}".format(show, houdini_version, hashlib.sha1(text).hexdigest()[:10])
+
+
+def get_baseline_path(name):
+    """Get the path of a baseline file.
+
+    Args:
+        name (str): baseline id, or <show>_<houdini version> for the current baseline
+
+    Returns:
+        str: path to baseline file
+
+    """
+    return os.path.join(DN_ENV_BASELINE_DIR, "{0}.json".format(name.replace(os.sep, "_")))
+
+
+def read_baseline(name):
+    """Read a baseline file.
+
+    Args:
+        name (str): baseline id, or <show>_<houdini version> for the current baseline
+
+    Returns:
+        dict: baseline with 'id' and 'environment' keys, None if it can't be read
+
+    """
+    try:
+        with open(get_baseline_path(name), "r") as _file:
+            baseline = json.load(_file, object_pairs_hook=OrderedDict)
+    except (IOError, OSError, ValueError):
+        return None
+
+    if baseline.get('version') != DN_ENV_BASELINE_VERSION:
+        return None
+    return baseline
+
+
+def write_baseline(show, houdini_version, environment, replace=False):
+    """Store an environment as the baseline of a show and Houdini version.
+
+    Args:
+        show (str): show the baseline is for
+        houdini_version (str): hou.applicationVersionString()
+        environment (dict): as returned by collect_environment
+        replace (bool): replace the current baseline, otherwise an existing one is kept
+
+    Raises:
+        IOError: baseline dir is not writable
+
+    Returns:
+        dict: the current baseline
+
+    """
+    baseline = OrderedDict([('version', DN_ENV_BASELINE_VERSION),
+                            ('id', get_baseline_id(show, houdini_version, environment)),
+                            ('show', show),
+                            ('houdini_version', houdini_version),
+                            ('environment', environment)])
+
+    if not os.path.isdir(DN_ENV_BASELINE_DIR):
+        os.makedirs(DN_ENV_BASELINE_DIR)
+
+    for name, is_current in ((baseline['id'], False), ("{0}_{1}".format(show, houdini_version), True)):
+        path = get_baseline_path(name)
+        if os.path.exists(path) and not (is_current and replace):
+            continue
+        fd, tmp_path = tempfile.mkstemp(dir=DN_ENV_BASELINE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w") as _file:
+            json.dump(baseline, _file, indent=1)
+        os.chmod(tmp_path, 0o644)
+        if is_current and not replace:
+            # the first session to get here creates the current baseline, the others use it
+            try:
+                os.link(tmp_path, path)
+            except OSError:
+                pass
+            os.remove(tmp_path)
+        else:
+            os.rename(tmp_path, path)
+
+    return read_baseline("{0}_{1}".format(show, houdini_version)) or baseline
+
+
+def get_baseline(show, houdini_version, environment=None):
+    """Get the current baseline of a show and Houdini version, once per session.
+
+    The first session to find no baseline creates one from its own environment.
+
+    Args:
+        show (str): show the baseline is for
+        houdini_version (str): hou.applicationVersionString()
+        environment (dict): environment to create the baseline from if there is none
+
+    Returns:
+        dict: baseline, None if there is none and it could not be created
+
+    """
+    key = (show, houdini_version)
+    with _LOCK:
+        if key not in _BASELINES:
+            baseline = read_baseline("{0}_{1}".format(show, houdini_version))
+            if baseline is None and environment is not None:
+                try:
+                    baseline = write_baseline(show, houdini_version, environment)
+                except (IOError, OSError):
+                    baseline = None
+            _BASELINES[key] = baseline
+        return _BASELINES[key]
+
+
+def diff_environment(baseline, environment):
+    """Get the deviations of an environment from a baseline.
+
+    Args:
+        baseline (dict): as returned by get_baseline
+        environment (dict): as returned by collect_environment
+
+    Returns:
+        OrderedDict: diff with the baseline id, list sections that differ in full, and for dict sections the
+            'changed' keys with their values and the 'removed' keys
+
+    """
+    diff = OrderedDict([('version', DN_ENV_BASELINE_VERSION), ('baseline', baseline['id'])])
+    base_environment = baseline['environment']
+
+    for section in DN_ENV_LIST_SECTIONS:
+        if list(environment[section]) != list(base_environment.get(section, [])):
+            diff[section] = list(environment[section])
+
+    for section in DN_ENV_DICT_SECTIONS:
+        base = base_environment.get(section, {})
+        current = environment[section]
+        changed = OrderedDict((k, v) for k, v in current.iteritems() if base.get(k) != v)
+        removed = [k for k in base if k not in current]
+        if changed or removed:
+            diff[section] = OrderedDict([('changed', changed), ('removed', removed)])
+
+    return diff
+
+
+def apply_diff(baseline, diff):
+    """Rebuild a full environment from a baseline and a diff.
+
+    Args:
+        baseline (dict): baseline the diff was made against
+        diff (dict): as returned by diff_environment
+
+    Raises:
+        ValueError: the diff was made against another baseline
+
+    Returns:
+        dict: section name to list or OrderedDict
+
+    """
+    if diff['baseline'] != baseline['id']:
+        raise ValueError("Diff is against baseline {0}, not {1}".format(diff['baseline'], baseline['id']))
+
+    base_environment = baseline['environment']
+    environment = {}
+    for section in DN_ENV_LIST_SECTIONS:
+        environment[section] = list(diff.get(section, base_environment.get(section, [])))
+
+    for section in DN_ENV_DICT_SECTIONS:
+        values = OrderedDict(base_environment.get(section, {}))
+        changes = diff.get(section, {})
+        for key in changes.get('removed', []):
+            values.pop(key, None)
+        values.update(changes.get('changed', {}))
+        environment[section] = OrderedDict(sorted(values.iteritems()))
+
+    return environment
+
+
+def format_environment(environment):
+    """Format a full environment the way TicketInfo does for the ticket description.
+
+    Args:
+        environment (dict): as returned by collect_environment or apply_diff
+
+    Returns:
+        dict: AutoInfo field name to section text
+
+    """
+    sections = {'houdinipath': "HOUDINI_PATH: \n" + "".join("{0}\n".format(_) for _ in environment['houdini_path']),
+                'curtools': "Current DN HOUDINI Tools versions:\n\n" + "".join(
+                    "{0}        {1}\n".format(k, v) for k, v in environment['curtools'].iteritems()),
+                'bobpaths': ''}
+    if environment['bob']:
+        sections['bobpaths'] = "BOB Paths and Versions: \n\n" + "".join(
+            '{0}      {1}\n'.format(k, v) for k, v in environment['bob'].iteritems())
+    return sections
+
+
+def format_diff(diff):
+    """Format a diff for the ticket description.
+
+    Args:
+        diff (dict): as returned by diff_environment
+
+    Returns:
+        dict: AutoInfo field name to section text
+
+    """
+    baseline_id = diff['baseline']
+    if 'houdini_path' in diff:
+        houdinipath = "HOUDINI_PATH (differs from site baseline {0}): \n".format(baseline_id) + "".join(
+            "{0}\n".format(_) for _ in diff['houdini_path'])
+    else:
+        houdinipath = "HOUDINI_PATH: same as site baseline {0}\n".format(baseline_id)
+
+    sections = {'houdinipath': houdinipath}
+    for field, section, title, line in (('curtools', 'curtools', "DN HOUDINI Tools versions", "{0}        {1}\n"),
+                                        ('bobpaths', 'bob', "BOB Paths and Versions", "{0}      {1}\n")):
+        if section not in diff:
+            sections[field] = "{0}: same as site baseline {1}\n".format(title, baseline_id)
+            continue
+        text = "{0} changed from site baseline {1}:\n\n".format(title, baseline_id)
+        text += "".join(line.format(k, v) for k, v in diff[section]['changed'].iteritems())
+        text += "".join(line.format(k, "(not set)") for k in diff[section]['removed'])
+        sections[field] = text
+    return sections
+
+
+# noinspection PyBroadException
+def get_environment_sections(show, houdini_version):
+    """Get the environment sections for a ticket, as a diff against the site baseline when there is one.
+
+    Args:
+        show (str): current show, None if not in a show
+        houdini_version (str): hou.applicationVersionString()
+
+    Returns:
+        tuple: AutoInfo field name to section text dict, the diff or None if the full environment is used, and the
+            full environment
+
+    """
+    environment = collect_environment()
+    baseline = None
+    if show:
+        try:
+            baseline = get_baseline(show, houdini_version, environment)
+        except Exception as e:
+            print "{0}: could not get environment baseline: {1}".format(__name__, e)
+
+    if baseline is None:
+        return format_environment(environment), None, environment
+
+    diff = diff_environment(baseline, environment)
+    return format_diff(diff), diff, environment
+
+
+def main(argv=None):
+    """Rebuild a ticket's full environment, or regenerate the current show's baseline.
+
+    Args:
+        argv (list): arguments, defaults to sys.argv[1:]
+
+    Returns:
+        int: exit code, 0 on success
+
+    """
+    parser = argparse.ArgumentParser(prog="jiraticketsubmitter.EnvBaseline",
+                                     description="Houdini JIRA ticket environment baselines.")
+    commands = parser.add_subparsers(dest="command")
+    rebuild = commands.add_parser("rebuild", help="rebuild the full environment of a ticket")
+    rebuild.add_argument("diff", help="{0} attached to the ticket, - for stdin".format(DN_ENV_DIFF_ATTACHMENT_NAME))
+    rebuild.add_argument("--json", action="store_true", help="print JSON instead of the description sections")
+    build = commands.add_parser("build", help="store the current environment as the show's baseline")
+    build.add_argument("--show", default=os.environ.get("SHOW"), help="show to store the baseline for")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        import hou
+        baseline = write_baseline(args.show, hou.applicationVersionString(), collect_environment(), replace=True)
+        print "Stored baseline {0}".format(baseline['id'])
+        return 0
+
+    if args.diff == "-":
+        diff = json.load(sys.stdin, object_pairs_hook=OrderedDict)
+    else:
+        with open(args.diff, "r") as _file:
+            diff = json.load(_file, object_pairs_hook=OrderedDict)
+
+    baseline = read_baseline(diff['baseline'])
+    if baseline is None:
+        sys.stderr.write("Could not read baseline {0}\n".format(diff['baseline']))
+        return 1
+
+    environment = apply_diff(baseline, diff)
+    if args.json:
+        print json.dumps(environment, indent=1)
+    else:
+        sections = format_environment(environment)
+        print "\n".join(sections[_] for _ in ('houdinipath', 'curtools', 'bobpaths') if sections[_])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""Module containing the manifest of files referenced by a hip file snapshot.
+
+Tickets whose hip file references caches and textures on other filesystems can't be reproduced at another site
+until someone works out which files to sync. The manifest lists the scene's external file references with their
+size and modification time, written next to the snapshot so site transfers can include or skip them on purpose.
+
+Our NFS mounts can be slow, so files are stat'ed in parallel within a time budget. Files not stat'ed in time are
+still listed, without size or time. Only reading the references needs the main thread, in a UI session the files are
+stat'ed and the manifest written on a daemon thread so saving a ticket's snapshot doesn't wait for them.
+"""
+
+# standard Python modules
+from collections import OrderedDict
+import glob
+import json
+from multiprocessing.pool import ThreadPool
+import os
+import re
+import threading
+import time
+
+# SESI supplied modules
+import hou
+
+# format of the manifest file
+DN_MANIFEST_VERSION = 1
+
+# threads stat'ing files
+DN_MANIFEST_WORKERS = 16
+
+# time the stat calls may take in total (seconds)
+DN_MANIFEST_TIME_BUDGET = 5.0
+
+# frame variables in file references, replaced with a wildcard to find the files of a sequence
+DN_MANIFEST_FRAME_RE = re.compile(r"\$\{?(FF|F\d*)\}?(?![A-Za-z0-9_])")
+
+
+def get_manifest_path(hip_path):
+    """Get the manifest path of a hip file snapshot.
+
+    Args:
+        hip_path (str): saved hip file
+
+    Returns:
+        str: manifest path
+
+    """
+    return "{0}_manifest.json".format(os.path.splitext(hip_path)[0])
+
+
+def get_file_references():
+    """Get the scene's external file references, with variables expanded on the main thread.
+
+    Returns:
+        OrderedDict: raw reference to (expanded path or glob pattern of a sequence, parameters using it), sorted by
+            reference
+
+    """
+    references = {}
+    for parm, reference in hou.fileReferences():
+        if reference.startswith("op:"):
+            continue
+        if reference not in references:
+            path = hou.expandString(DN_MANIFEST_FRAME_RE.sub("*", reference))
+            references[reference] = (path, [])
+        references[reference][1].append(parm.path() if parm else None)
+    return OrderedDict(sorted(references.iteritems()))
+
+
+def stat_reference(reference, path):
+    """Stat the file or files of a file reference.
+
+    Args:
+        reference (str): raw file reference
+        path (str): expanded path, glob pattern for sequences
+
+    Returns:
+        OrderedDict: whether it exists, size in bytes and latest modification time, and for sequences the number of
+            files found
+
+    """
+    info = OrderedDict([('reference', reference), ('path', path), ('exists', False), ('size', None),
+                        ('mtime', None)])
+
+    if DN_MANIFEST_FRAME_RE.search(reference):
+        files = glob.glob(path)
+        info['sequence'] = len(files)
+    else:
+        files = [path]
+
+    stats = []
+    for file_path in files:
+        try:
+            stats.append(os.stat(file_path))
+        except OSError:
+            continue
+    if stats:
+        info['exists'] = True
+        info['size'] = sum(_.st_size for _ in stats)
+        info['mtime'] = max(_.st_mtime for _ in stats)
+    return info
+
+
+def collect_manifest(time_budget=DN_MANIFEST_TIME_BUDGET, workers=DN_MANIFEST_WORKERS, references=None):
+    """Stat the scene's file references in parallel.
+
+    Args:
+        time_budget (float): how long to wait for the stat calls (seconds)
+        workers (int): threads stat'ing files
+        references (OrderedDict): as returned by get_file_references, read now if not given
+
+    Returns:
+        OrderedDict: manifest, references not stat'ed in time are listed with 'timed_out' set
+
+    """
+    start = time.time()
+    references = get_file_references() if references is None else references
+
+    pool = ThreadPool(max(1, min(workers, len(references))))
+    results = [(_, pool.apply_async(stat_reference, (_, references[_][0]))) for _ in references]
+    pool.close()
+
+    files = []
+    timed_out = 0
+    for reference, result in results:
+        result.wait(max(0.0, start + time_budget - time.time()))
+        if result.ready() and result.successful():
+            info = result.get()
+        else:
+            info = OrderedDict([('reference', reference), ('path', references[reference][0]), ('timed_out', True)])
+            timed_out += 1
+        info['parms'] = references[reference][1]
+        files.append(info)
+
+    # don't wait for stat calls stuck on a slow mount, the pool threads are daemons
+    if not timed_out:
+        pool.join()
+
+    return OrderedDict([('version', DN_MANIFEST_VERSION),
+                        ('hip', None),
+                        ('created', time.time()),
+                        ('seconds', time.time() - start),
+                        ('timed_out', timed_out),
+                        ('total_size', sum(_.get('size') or 0 for _ in files)),
+                        ('files', files)])
+
+
+def write_manifest(hip_path, time_budget=DN_MANIFEST_TIME_BUDGET, references=None):
+    """Write the manifest of the scene's file references next to a hip file snapshot.
+
+    Args:
+        hip_path (str): saved hip file
+        time_budget (float): how long to wait for the stat calls (seconds)
+        references (OrderedDict): as returned by get_file_references, read now if not given
+
+    Returns:
+        str: manifest path, None if it could not be written
+
+    """
+    manifest = collect_manifest(time_budget, references=references)
+    manifest['hip'] = hip_path
+    manifest_path = get_manifest_path(hip_path)
+    try:
+        with open(manifest_path, "w") as _file:
+            json.dump(manifest, _file, indent=1)
+    except (IOError, OSError) as e:
+        print "{0}: could not write manifest {1}: {2}".format(__name__, manifest_path, e)
+        return None
+    return manifest_path
+
+
+def write_manifest_in_background(hip_path, on_written=None, time_budget=DN_MANIFEST_TIME_BUDGET):
+    """Read the scene's file references now and write the manifest on a daemon thread.
+
+    Args:
+        hip_path (str): saved hip file
+        on_written (callable): called with the manifest path once it is written
+        time_budget (float): how long to wait for the stat calls (seconds)
+
+    Returns:
+        threading.Thread: thread writing the manifest
+
+    """
+    references = get_file_references()
+
+    def _write():
+        manifest_path = write_manifest(hip_path, time_budget, references)
+        if manifest_path and on_written is not None:
+            on_written(manifest_path)
+
+    thread = threading.Thread(target=_write)
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -3,7 +3,6 @@
 # standard Python modules
 import datetime
 import os
-import subprocess
 import time
 import re
 import string
@@ -15,19 +14,14 @@ import dnsitedata
 # SESI supplied modules
 import hou
 
+# local modules
+from jiraticketsubmitter import FileManifest, SnapshotRetention, SnapshotRetrieve, TransferScheduler
 
-#    site hip file transfer mappings, { 'source site': 'destination sites' }
-#    i.e. 'mum': 'lon, van'
-#    "if site for source hip file is mumbai, then copy to london and vancouver"
+# site transfer mappings now live with the TransferScheduler, still available from here for existing callers
+from jiraticketsubmitter.TransferScheduler import DN_TRANSFER_MAP, DN_REMOTE_HOST_MAP  # noqa: F401
 
-DN_TRANSFER_MAP = {'vancouver': 'london,',
-                   'mumbai': 'london,vancouver',
-                   'london': 'vancouver,'}
-
-# remote host names
-DN_REMOTE_HOST_MAP = {'london': 'nomachine2',
-                      'vancouver': 'vannomachine2',
-                      'mumbai': 'mumnomachine2'}
+# write a manifest of the scene's referenced files next to saved hip files by default
+DN_HIP_MANIFEST = True
 
 
 def create_timestamped_hip_path(path):
@@ -53,62 +47,32 @@ def create_timestamped_hip_path(path):
     return os.path.join(os.sep, cur_file_dir, new_file_name)
 
 
-def transfer_hip(new_file_path):
+def transfer_hip(new_file_path, priority=None):
     """Transfer hip file to other sites.
 
+    The transfer is queued with the TransferScheduler, which sends it now or later depending on its size and the
+    ticket priority.
+
     Args:
         new_file_path (str): current input full path to file
+        priority (str): priority of the ticket the file belongs to
 
     """
-    # get my current site
-    site_name = dnsitedata.local_site().name
-
-    # loop over destinations and run rsync
-    if site_name in DN_TRANSFER_MAP:
-        for dest_site in DN_TRANSFER_MAP[site_name].split(','):
-            # rsync: letting failed calls just pass thru silently
-            if dest_site:
-                rsync_hip_file(dest_site.strip(), new_file_path)
+    TransferScheduler.schedule_transfer(new_file_path, priority)
 
 
 def rsync_hip_file(dest_site, path_to_file):
-    """Run rsync command to copy file to remote site.
+    """Run rsync command to copy file to remote site right away, bypassing the TransferScheduler queue.
 
     Args:
-        dest_site (str): output destination site host name.
+        dest_site (str): output destination site name.
         path_to_file (str): destination path for file.
 
-    Raises:
-        hou.OperationFailed: rsync command itself returned an error.
-        subprocess.CalledProcessError: couldnt reach the remote site before even running rsync (fail silently).
+    Returns:
+        bool: True if the file was copied
 
     """
-    # get proper destination host name
-    if dest_site in DN_REMOTE_HOST_MAP:
-        host_name = DN_REMOTE_HOST_MAP[dest_site]
-    else:
-        return
-
-    # run rsync
-    user = os.environ["USER"]
-    dest_host = '{0}@{1}'.format(user, host_name)
-    dest_dir = os.path.dirname(path_to_file)
-
-    try:
-        # first, make output dir (fail silently)
-        subprocess.Popen(["ssh", dest_host, "mkdir -p {0}".format(dest_dir)])
-        dest_dir = '{0}:{1}'.format(dest_host, dest_dir)
-
-        # run rsync command (fail silently)
-        sync_paths = "{0} {1}".format(path_to_file, dest_dir)
-        rsync_command = "rsync --progress -avvux -ii --keep-dirlinks {0}".format(sync_paths)
-        print "\n{0}: Running rsync of backup hip file to remote site:\n\t{1}\n".format(__name__, rsync_command)
-        ret = hou.hscript("{0} {1}".format("unix", rsync_command))
-        if ret[0]:
-            raise hou.OperationFailed("rsync returned error: {0}".format(ret))
-
-    except subprocess.CalledProcessError:
-        pass
+    return TransferScheduler.rsync_file(dest_site, path_to_file)
 
 
 def print_message(message, is_ui=True):
@@ -211,9 +175,15 @@ def validate_hip_path_or_force_save(orig_path, is_ui=True):
     return valid_path
 
 
-def save_hip():
+def save_hip(is_ui=None, manifest=DN_HIP_MANIFEST, on_manifest=None):
     """Save backup hip file for JIRA reporting.
 
+    Args:
+        is_ui (bool): if we can prompt the user, defaults to hou.isUIAvailable()
+        manifest (bool): write a manifest of the scene's referenced files next to the saved file, in the background
+            when there is a UI
+        on_manifest (callable): called with the manifest path once it is written
+
     Raises:
         hou.OperationFailed: if anything goes wrong with saving to new name, just reset it and return.
 
@@ -222,7 +192,7 @@ def save_hip():
 
     """
     success = True
-    is_ui = hou.isUIAvailable()
+    is_ui = hou.isUIAvailable() if is_ui is None else is_ui
     save_file_path = ''
 
     # ensure current hip file has been saved and is not 'untitled'
@@ -248,9 +218,94 @@ def save_hip():
         # set name back to original valid_path
         hou.hipFile.setName(valid_path)
 
+    # stat'ing the referenced files can take seconds, don't hold up the UI for it
+    if success and manifest:
+        if is_ui:
+            FileManifest.write_manifest_in_background(save_file_path, on_manifest)
+        else:
+            manifest_path = FileManifest.write_manifest(save_file_path)
+            if manifest_path and on_manifest is not None:
+                on_manifest(manifest_path)
+
+    # the jira folder is held to the retention policy, now and by the scheduled job
+    if success:
+        SnapshotRetention.register_snapshot(save_file_path)
+        SnapshotRetention.enforce_in_background(valid_dir)
+
     return success, save_file_path
 
 
+def save_and_transfer_hip(is_ui=None, manifest=DN_HIP_MANIFEST, priority=None):
+    """Save a backup hip file for a ticket and transfer it to the remote site(s), transfers fail silently.
+
+    The referenced files manifest is transferred along with it, the referenced files themselves are not.
+
+    Args:
+        is_ui (bool): if we can prompt the user, defaults to hou.isUIAvailable()
+        manifest (bool): write a manifest of the scene's referenced files next to the saved file
+        priority (str): priority of the ticket, decides how urgently the file is transferred
+
+    Returns:
+        str: path of the saved hip file, None if it could not be saved
+
+    """
+    saved_hip, submission_hip_file = save_hip(is_ui, manifest, lambda _: transfer_hip(_, priority))
+    if saved_hip and submission_hip_file:
+        transfer_hip(submission_hip_file, priority)
+        return submission_hip_file
+    return None
+
+
+def set_submission_hip_location(description, submission_hip_file=None, manifest=DN_HIP_MANIFEST):
+    """Point the 'Submission HIP location' section of a ticket description at the saved hip file.
+
+    Args:
+        description (str): final jira description
+        submission_hip_file (str): saved hip file, None if no hip file was saved
+        manifest (bool): a manifest is written next to the saved file, it may still be being written in the background
+
+    Returns:
+        str: fixed description
+
+    """
+    hip_save_string = "No HIP file supplied. Working Dir is: {0}\n".format(hou.getenv('HIP'))
+    if submission_hip_file:
+        hip_save_string = "Submission HIP location:\n{0}\n".format(submission_hip_file)
+        manifest_path = FileManifest.get_manifest_path(submission_hip_file)
+        manifest = manifest or os.path.exists(manifest_path)
+        if manifest:
+            hip_save_string += "Referenced files manifest: {0}\n".format(manifest_path)
+        if TransferScheduler.is_pulled(submission_hip_file):
+            hip_save_string += get_pull_manifest(submission_hip_file, [manifest_path] if manifest else None)
+        hip_save_string += "\n"
+    return re.sub(r"Submission HIP location:\n.*\n\n", hip_save_string, description)
+
+
+def get_pull_manifest(submission_hip_file, pending_files=None):
+    """Describe where a snapshot left at this site by the pull transfer policy is, and how to fetch it.
+
+    Args:
+        submission_hip_file (str): saved hip file
+        pending_files (list): files of the snapshot still being written, listed by name until they exist
+
+    Returns:
+        str: description lines
+
+    """
+    site_name = dnsitedata.local_site().name
+    files = SnapshotRetrieve.get_snapshot_files(submission_hip_file)
+    files.update((_, None) for _ in pending_files or [] if _ not in files)
+    text = "Snapshot kept at {0}, not copied to other sites. Fetch it with:\n" \
+           "{{noformat}}hython -m jiraticketsubmitter.SnapshotRetrieve fetch {1} --origin {2}{{noformat}}\n".format(
+               site_name.capitalize(), submission_hip_file, site_name)
+    for path, size in sorted(files.items()):
+        if size is None:
+            text += "* {0}\n".format(os.path.basename(path))
+        else:
+            text += "* {0} ({1:.1f} MB)\n".format(os.path.basename(path), size / 1048576.0)
+    return text
+
+
 def kill_pane_tab(queue, pane_tab):
     """Kill the pane tab. Also remove any temp files.
 
@@ -4,11 +4,11 @@
 # standard Python modules
 import os
 import Queue
-import re
 import subprocess
 import sys
 import threading
 import tempfile
+import time
 
 # qt stuff
 from qtswitch import QtGui
@@ -18,18 +18,31 @@ import wizqt.widget.text_edit
 import hou
 
 # local modules
-from jiraticketsubmitter import TicketInfo, HipFileUtils
+from jiraticketsubmitter import TicketInfo, HipFileUtils, CircuitBreaker, JiraThrottle, MetadataCache, TicketLedger
+from jiraticketsubmitter import LogCapture, ProfileCapture, ScreenCapture, SnapshotUpload, TicketQueue
+from jiraticketsubmitter import TransferScheduler
+from jiraticketsubmitter.HoudiniTicket import DN_TICKET_TITLE_MESSAGE, DN_TICKET_DESCRIPTION_MESSAGE
+from jiraticketsubmitter.HoudiniTicket import add_attachments, get_jira_connection, set_auto_info_field
 
 # dneg modules
 from ticket_creator import Ticket, exceptions
-from ticket_creator.ext.jira import JiraReportDialog, JiraTicketCreator, tools
+from ticket_creator.ext.jira import JiraReportDialog, JiraTicketCreator
 
-# init title
-DN_TICKET_TITLE_MESSAGE = '< ISSUE SUMMARY REQUIRED >'
+# priorities shown in the submitter, in display order, and the one selected by default
+DN_TICKET_PRIORITIES = ('Trivial', 'Minor', 'Major', 'Critical', 'Blocker')
+DN_TICKET_DEFAULT_PRIORITY = 'Minor'
 
-# init description
-DN_TICKET_DESCRIPTION_MESSAGE = '< ISSUE DESCRIPTION REQUIRED - ** KNOWN BUG w RMB menu (dont use), ' \
-                                'USE Ctl-C Ctl-V INSTEAD ** >'
+# issue types offered by the lightweight dialog until server metadata has been cached
+DN_TICKET_ISSUE_TYPES = ('Bug', 'Task', 'Improvement')
+
+# time to first paint we aim for when opening the dialog (milliseconds)
+DN_DIALOG_FIRST_PAINT_TARGET_MS = 200.0
+
+# priority tool tip
+DN_TICKET_PRIORITY_TOOL_TIP = 'The importance of the issue in relation to other issues.\n\n' \
+                              'Major: Very important, but workaround available\n' \
+                              'Critical: Needs immediate attention, user cant work\n' \
+                              'Blocker: -- SHOW STOPPER -- Entire show cannot work!\n'
 
 # ----------------------------------------------------
 # classes defined for this module
@@ -46,6 +59,12 @@ class HouJiraReportDialog(JiraReportDialog):
         kwargs["disable_ui"] (bool): force turn off ui mode so ticket can be created from python shell
         kwargs["pane_tab"] (object): parent pane_tab object dialog is attached to (None if not in ui mode)
         kwargs["final_jira_description"] (str): full description text to go to ticket
+        kwargs["lightweight"] (bool): only build the widgets the submitter shows instead of the full base class ui
+        kwargs["warmup"] (bool): dialog is built ahead of time and shown once retargeted, which takes the captures
+        kwargs["open_time"] (float): time.time() the submitter was opened at, used to measure time to first paint
+        kwargs["ticket_signature"] (str): signature used to look up likely duplicate tickets, None to skip the check
+        kwargs["queue_for_later"] (bool): JIRA is unreachable, queue the ticket locally instead of creating it
+        kwargs["attachments"] (list of tuple): (file name, data) pairs to upload to the issue once it is created
 
     Raises:
         exceptions.TicketValidationError: raised if ticket is not valid
@@ -69,6 +88,32 @@ class HouJiraReportDialog(JiraReportDialog):
         self.jira = None
         self.save_hip = False
         self.save_hip_toggle = None
+        self.submission_hip_file = None
+
+        # attach the hip file to the issue, for sites and vendors without the rsync mirror
+        self.attach_hip = kwargs["attach_hip"] if 'attach_hip' in kwargs else False
+        self.attach_hip_toggle = None
+        self.ticket_signature = kwargs["ticket_signature"] if 'ticket_signature' in kwargs else None
+        self.queue_for_later = kwargs["queue_for_later"] if 'queue_for_later' in kwargs else False
+        self.attachments = kwargs["attachments"] if 'attachments' in kwargs else []
+
+        # node a profile of a forced recook can be attached for, None if the ticket is not on a node
+        self.profile_node = kwargs["profile_node"] if 'profile_node' in kwargs else None
+        self.profile = False
+        self.profile_toggle = None
+
+        # tails of the session's logs, captured in the background while the dialog is open
+        self._log_capture = None
+
+        # scene viewer and network editor screenshots, encoded in the background while the dialog is open
+        self._screen_capture = None
+        self.screenshot_toggle = None
+
+        # lightweight mode skips JiraReportDialog widget construction entirely
+        self._lightweight = kwargs["lightweight"] if 'lightweight' in kwargs else False
+        self._warmup = kwargs["warmup"] if 'warmup' in kwargs else False
+        self._open_time = kwargs["open_time"] if 'open_time' in kwargs else time.time()
+        self.first_paint_ms = None
 
         # member widget uiDescriptionTextEdit is overridden later, need to init here first
         self.uiDescriptionTextEdit = None
@@ -94,8 +139,16 @@ class HouJiraReportDialog(JiraReportDialog):
         except exceptions.TicketValidationError:
             raise
 
+        # the full base class ui talks to the server, so queue mode always uses the lightweight one
+        self._lightweight = self._lightweight or self.queue_for_later
+
+        # build only the widgets we show, no server round trips or widgets that get torn down again
+        if self._is_ui and self._lightweight:
+            QtGui.QDialog.__init__(self, self._parent)
+            self.build_lightweight_ui()
+
         # init parent if in ui mode
-        if self._is_ui:
+        elif self._is_ui:
             # JiraReportDialog __init__ initializes _ticket_creator,
             # sets the connection and validates ticket
             super(HouJiraReportDialog, self).__init__(self._ticket, self._parent)
@@ -112,20 +165,86 @@ class HouJiraReportDialog(JiraReportDialog):
             self.post_fix_summary_line_edit()
             self.post_fix_watchers_line_edit()
             self.post_create_save_check_box()
+            self.post_create_attach_check_box()
+            self.post_create_profile_check_box()
+            self.post_create_screenshot_check_box()
+
+        # a warm-up dialog is not shown yet, retarget captures the session as it is when the submitter opens
+        if self._warmup:
+            return
+
+        # dialog is up, collect the log tails and encode the screenshots while the artist types
+        self._log_capture = LogCapture.start_capture()
+        if self._is_ui:
+            self._screen_capture = ScreenCapture.take_capture()
+            self.screenshot_toggle.setVisible(self._screen_capture is not None)
 
     # create jira ticket
-    def create_ticket(self, save_hip=False):
+    def create_ticket(self, save_hip=False, profile=False, attach_hip=False):
         """Expose the create ticket for use in non-ui mode.
 
         Args:
             save_hip (bool): copy over save_hip toggle
+            profile (bool): copy over profile toggle, node tickets only, also saves the hip file
+            attach_hip (bool): copy over attach_hip toggle, also saves the hip file
         """
         self.save_hip = save_hip
+        self.profile = profile
+        self.attach_hip = attach_hip
         try:
             self._createTicket()
         except:
             raise
 
+    def retarget(self, **kwargs):
+        """Point an already built lightweight dialog at a new ticket, e.g. one kept ready by the Warmup module.
+
+        Args:
+            **kwargs: same keyword arguments as the constructor, normally HoudiniTicket.info_for_dialog.
+
+        Raises:
+            exceptions.TicketValidationError: raised if ticket is not valid
+            AssertionError: raised if dialog is not lightweight or ticket is not a 'Ticket' object
+
+        """
+        assert self._lightweight
+        ticket = kwargs["ticket"] if 'ticket' in kwargs else None
+        assert isinstance(ticket, Ticket)
+        self._ticket_creator.validate(ticket)
+
+        self._ticket = ticket
+        self._url = None
+        self.pane_tab = kwargs["pane_tab"] if 'pane_tab' in kwargs else None
+        self.final_jira_description = kwargs["final_jira_description"] if 'final_jira_description' in kwargs else ''
+        self.jira_server = kwargs["jira_server"] if 'jira_server' in kwargs else 'jira'
+        self._open_time = kwargs["open_time"] if 'open_time' in kwargs else time.time()
+        self.ticket_signature = kwargs["ticket_signature"] if 'ticket_signature' in kwargs else None
+        self.queue_for_later = kwargs["queue_for_later"] if 'queue_for_later' in kwargs else False
+        self.attachments = kwargs["attachments"] if 'attachments' in kwargs else []
+        self.profile_node = kwargs["profile_node"] if 'profile_node' in kwargs else None
+        self.first_paint_ms = None
+        self.issue = None
+        self.save_hip = False
+        self.submission_hip_file = None
+        self.attach_hip = kwargs["attach_hip"] if 'attach_hip' in kwargs else False
+        self.profile = False
+
+        # reset widgets to the new ticket
+        self.uiSummaryLineEdit.setText(self._ticket.title)
+        self.uiDescriptionTextEdit.setText(self._ticket.comment)
+        self.uiTypeComboBox.setCurrentIndex(max(self.uiTypeComboBox.findText(self._ticket.issue_type), 0))
+        self.uiPriorityComboBox.setCurrentIndex(max(self.uiPriorityComboBox.findText(DN_TICKET_DEFAULT_PRIORITY), 0))
+        self.save_hip_toggle.setChecked(False)
+        self.attach_hip_toggle.setChecked(self.attach_hip)
+        self.profile_toggle.setChecked(False)
+        self.profile_toggle.setVisible(self.profile_node is not None)
+        self.post_set_queue_mode()
+        self._warmup = False
+        self._log_capture = LogCapture.start_capture()
+        self._screen_capture = ScreenCapture.take_capture()
+        self.screenshot_toggle.setChecked(True)
+        self.screenshot_toggle.setVisible(self._screen_capture is not None)
+
     # convenience function to set title and comment
     def set_title_and_comment(self, **kwargs):
         """Set the ticket title and comment in non-ui mode.
@@ -161,6 +280,30 @@ class HouJiraReportDialog(JiraReportDialog):
             thread.daemon = True
             thread.start()
 
+    def paintEvent(self, event):
+        """Record and report the time from opening the submitter to the first paint of the dialog."""
+        if self.first_paint_ms is None:
+            self.first_paint_ms = (time.time() - self._open_time) * 1000.0
+            mode = "lightweight" if self._lightweight else "full"
+            print "{0}: {1} dialog first paint after {2:.1f} ms (target {3:.0f} ms)".format(
+                __name__, mode, self.first_paint_ms, DN_DIALOG_FIRST_PAINT_TARGET_MS)
+
+        super(HouJiraReportDialog, self).paintEvent(event)
+
+    def _updateTicket(self):
+        """Update the ticket from the ui.
+
+        Overriding from parent class, the lightweight ui does not have the widgets the base class reads from.
+        """
+        if not self._lightweight:
+            super(HouJiraReportDialog, self)._updateTicket()
+            return
+
+        self._ticket.title = unicode(self.uiSummaryLineEdit.text()).strip()
+        self._ticket.comment = unicode(self.uiDescriptionTextEdit.toPlainText()).strip()
+        self._ticket.issue_type = str(self.uiTypeComboBox.currentText())
+        self._ticket.priority = str(self.uiPriorityComboBox.currentText())
+
     def _createTicket(self):
         """Log the given ticket in Jira.
 
@@ -187,41 +330,91 @@ class HouJiraReportDialog(JiraReportDialog):
                 raise hou.OperationFailed(message)
             return
 
+        # offer to add to a likely duplicate instead of creating a new ticket, unless JIRA is known to be down
+        duplicate = None if self.queue_for_later else TicketLedger.find_duplicate(self.ticket_signature)
+        if duplicate and self._is_ui and self.update_duplicate_issue(duplicate):
+            return
+
         # prepend reporter to the ticket title
         self._ticket.title = "[{0}] {1}".format(self._ticket.reporter, self._ticket.title)
 
-        # save issue specific hip file
-        hip_save_string = "No HIP file supplied. Working Dir is: {0}\n".format(hou.getenv('HIP'))
-        if self.save_hip or (self._is_ui and self.save_hip_toggle and self.save_hip_toggle.isChecked()):
-            saved_hip, submission_hip_file = HipFileUtils.save_hip()
-
-            # transfer hip file to remote site(s), fail silently
-            if saved_hip and submission_hip_file:
-                HipFileUtils.transfer_hip(submission_hip_file)
-                hip_save_string = "Submission HIP location:\n{0}\n\n".format(submission_hip_file)
+        # profile a forced recook of the node, the profile is kept next to the hip file so that is saved too
+        profile_result = None
+        if self.profile_node is not None and \
+                (self.profile or (self._is_ui and self.profile_toggle and self.profile_toggle.isChecked())):
+            profile_result = ProfileCapture.profile_node(self.profile_node)
+
+        # save issue specific hip file and transfer it to remote site(s)
+        self.submission_hip_file = None
+        if self._is_ui and self.attach_hip_toggle:
+            self.attach_hip = self.attach_hip_toggle.isChecked()
+        if self.save_hip or (self._is_ui and self.save_hip_toggle and self.save_hip_toggle.isChecked()) or \
+                profile_result or self.attach_hip:
+            self.submission_hip_file = HipFileUtils.save_and_transfer_hip(priority=self._ticket.priority)
+
+        # save the profile first, the description lists the snapshot's files
+        profile_path = None
+        if profile_result:
+            profile_path = ProfileCapture.save_profile(profile_result, self.submission_hip_file,
+                                                       self._ticket.priority)
 
         # fix jira description
-        self.final_jira_description = re.sub(r"Submission HIP location:\n.*\n\n", hip_save_string,
-                                             self.final_jira_description)
+        self.final_jira_description = HipFileUtils.set_submission_hip_location(self.final_jira_description,
+                                                                               self.submission_hip_file)
+        if profile_result:
+            self.final_jira_description += "\n" + ProfileCapture.format_summary(profile_result, profile_path)
+
+        # add the log tails captured since the dialog opened
+        if self._log_capture is not None:
+            self.attachments.extend(self._log_capture.get_attachments())
+            self._log_capture = None
+
+        # add the screenshots grabbed when the dialog opened, unless the artist unticked them
+        if self._screen_capture is not None:
+            if self.screenshot_toggle is None or self.screenshot_toggle.isChecked():
+                self.attachments.extend(self._screen_capture.get_attachments())
+            self._screen_capture = None
+
+        # JIRA is known to be down, keep the ticket for later
+        if self.queue_for_later:
+            self.queue_ticket()
+            return
 
-        # create ticket and add final description as initial comment
+        # create ticket and add final description as initial comment, queue it if JIRA went away since opening, or
+        # only its comment and attachments if the issue was created before it went away
         try:
             self.create_issue()
-        except (AssertionError, BaseException):
-            raise
+        except Exception as e:
+            if not (self._is_ui and CircuitBreaker.is_unreachable_error(e)):
+                raise
+            CircuitBreaker.get_breaker(self.jira_server).record_failure()
+            self.queue_ticket()
 
     def create_issue(self):
         """Create actual issue."""
         # first let's make a ticket creator object if missing
-        self.jira = tools.get_jira_connection(server=self.jira_server)
+        self.jira = get_jira_connection(server=self.jira_server)
 
         # create issue
-        self.issue = self._ticket_creator.create(self._ticket)
+        self.issue = None
+        self.issue = JiraThrottle.call(self.jira_server, self._ticket_creator.create, self._ticket)
 
         # add a comment by connection to ticket issue
         if self.issue:
+            # the issue exists from here on, record it before anything else can fail
+            TicketLedger.record(self.ticket_signature, self.issue.key)
+
+            # confirm on the ticket when its hip snapshot reaches each site
+            if self.submission_hip_file:
+                TransferScheduler.link_ticket(self.submission_hip_file, self.issue.key, self.jira_server)
+                if self.attach_hip:
+                    SnapshotUpload.attach_snapshot(self.submission_hip_file, self.issue.key, self.jira_server)
+
             if self.final_jira_description:
-                self.jira.add_comment(self.issue, self.final_jira_description)
+                JiraThrottle.add_comment(self.jira_server, self.jira, self.issue, self.final_jira_description, window=0)
+            if self.attachments:
+                add_attachments(self.jira_server, self.jira, self.issue, self.attachments)
+                set_auto_info_field(self.jira_server, self.jira, self.issue, self.attachments)
 
             # attempt to open system browser with the issue for further
             # editing if required, such as adding watchers or attaching
@@ -235,6 +428,70 @@ class HouJiraReportDialog(JiraReportDialog):
             print "----------------------------------------------\n"
 
         # DONE, cleanup ui
+        self._close_submitter()
+
+        # for future scripting use
+        return self.issue
+
+    def queue_ticket(self):
+        """Queue the ticket locally, it is submitted once JIRA can be reached again.
+
+        If the issue was already created only its comment and attachments are added later, its snapshot was linked and
+        its ledger entry recorded when it was created.
+        """
+        key = self.issue.key if self.issue else None
+        TicketQueue.queue_ticket(self._ticket, self.final_jira_description, self.jira_server, self.ticket_signature,
+                                 self.attachments, self.submission_hip_file, self.attach_hip, key)
+        CircuitBreaker.get_breaker(self.jira_server).probe_in_background()
+
+        if key:
+            message = "JIRA server '{0}' went away after {1} was created.\n" \
+                      "Its description and attachments have been queued and will be added " \
+                      "automatically.".format(self.jira_server, key)
+        else:
+            message = "JIRA server '{0}' can't be reached right now.\n" \
+                      "Your ticket has been queued and will be submitted automatically.".format(self.jira_server)
+        if self._is_ui:
+            hou.ui.displayMessage(message, title="Ticket Queued")
+        else:
+            print "{0}: {1}".format(__name__, message)
+
+        self._close_submitter()
+
+    def update_duplicate_issue(self, duplicate):
+        """Offer to add a comment or watcher to a likely duplicate ticket instead of creating a new one.
+
+        Args:
+            duplicate (TicketLedger.LedgerEntry): recently filed ticket with the same signature
+
+        Returns:
+            bool: True if the existing ticket was updated and no new ticket should be created
+
+        """
+        hours = (time.time() - duplicate.time) / 3600.0
+        message = "{0} filed {1} on the same item {2:.1f} hours ago.\n\n" \
+                  "Add to that ticket instead of creating a new one?".format(duplicate.user, duplicate.key, hours)
+        response = hou.ui.displayMessage(message, buttons=('Add Comment', 'Add Me As Watcher', 'Create New Ticket'),
+                                         severity=hou.severityType.ImportantMessage, default_choice=0,
+                                         close_choice=2, title="Possible Duplicate Ticket")
+        if response == 2:
+            return False
+
+        self.jira = get_jira_connection(server=self.jira_server)
+        if response == 0:
+            comment = "[{0}] {1}\n\n{2}".format(self._ticket.reporter, self._ticket.title, self._ticket.comment)
+            JiraThrottle.add_comment(self.jira_server, self.jira, duplicate.key, comment, window=0)
+        else:
+            JiraThrottle.add_watcher(self.jira_server, self.jira, duplicate.key, self._ticket.reporter, window=0)
+        print "{0}: Updated existing issue {1}".format(__name__, duplicate.key)
+
+        self._url = 'http://{0}/browse/{1}'.format(self.jira_server, duplicate.key)
+        self._open_url()
+        self._close_submitter()
+        return True
+
+    def _close_submitter(self):
+        """Close the dialog and let the parent session know it can kill the pane tab."""
         if self._is_ui and self.pane_tab:
             # close dialog
             self.close()
@@ -245,9 +502,6 @@ class HouJiraReportDialog(JiraReportDialog):
             tmp_file_suffix = "_hou_jira_submit_pane_tab_{0}_{1}".format(self.pane_tab.name(), hou.hipFile.basename())
             tempfile.NamedTemporaryFile(delete=True, suffix=tmp_file_suffix)
 
-        # for future scripting use
-        return self.issue
-
     def _open_url(self):
         """Code copied from stackoverflow to open.
 
@@ -265,6 +519,83 @@ class HouJiraReportDialog(JiraReportDialog):
             except OSError:
                 print 'Please open a browser on: {0}'.format(self._url)
 
+    # lightweight ui, built instead of the JiraReportDialog ui
+
+    def build_lightweight_ui(self):
+        """Build the submitter ui directly, creating only the widgets the Houdini submitter actually shows.
+
+        Widgets keep the base class names so the post_* edits and _createTicket work on either ui. Issue types and
+        priorities come from the on-disk metadata cache, which is refreshed in the background when stale.
+        """
+        issue_types, priorities = self.get_cached_metadata()
+
+        main_layout = QtGui.QVBoxLayout(self)
+
+        # main label
+        main_label = QtGui.QLabel('JIRA Submitter', self)
+        main_label.setStyleSheet("QLabel { color: white; }")
+        font = QtGui.QFont()
+        font.setFamily("Helvetica [Cronyx]")
+        font.setBold(True)
+        main_label.setFont(font)
+        main_layout.addWidget(main_label)
+
+        # issue type and priority
+        form_layout = QtGui.QFormLayout()
+        self.uiTypeComboBox = QtGui.QComboBox(self)
+        self.uiTypeComboBox.addItems(issue_types)
+        index = self.uiTypeComboBox.findText(self._ticket.issue_type)
+        self.uiTypeComboBox.setCurrentIndex(max(index, 0))
+        self.post_edit_type_box()
+        form_layout.addRow('Type', self.uiTypeComboBox)
+
+        self.uiPriorityComboBox = QtGui.QComboBox(self)
+        self.uiPriorityComboBox.addItems(priorities)
+        self.uiPriorityComboBox.setCurrentIndex(max(self.uiPriorityComboBox.findText(DN_TICKET_DEFAULT_PRIORITY), 0))
+        self.uiPriorityComboBox.setToolTip(DN_TICKET_PRIORITY_TOOL_TIP)
+        self.uiPriorityComboBox.setStyleSheet("QComboBox { combobox-popup: 0; }")
+        form_layout.addRow('Priority', self.uiPriorityComboBox)
+
+        # summary
+        self.uiSummaryLineEdit = QtGui.QLineEdit(self)
+        self.uiSummaryLineEdit.setText(self._ticket.title)
+        form_layout.addRow('Summary', self.uiSummaryLineEdit)
+        main_layout.addLayout(form_layout)
+
+        # description
+        self.uiDescriptionTextEdit = QtGui.QTextEdit(self)
+        self.uiDescriptionTextEdit.setText(self._ticket.comment)
+        main_layout.addWidget(self.uiDescriptionTextEdit)
+
+        # buttons
+        self.uiButtonBox = QtGui.QDialogButtonBox(self)
+        self.uiButtonBox.addButton(QtGui.QDialogButtonBox.Cancel)
+        self.uiCreateButton = self.uiButtonBox.addButton('Create Ticket', QtGui.QDialogButtonBox.AcceptRole)
+        self.uiCreateButton.clicked.connect(self._createTicket)
+        self.uiButtonBox.rejected.connect(self.reject)
+        main_layout.addWidget(self.uiButtonBox)
+        self.post_create_save_check_box()
+        self.post_create_attach_check_box()
+        self.post_create_profile_check_box()
+        self.post_create_screenshot_check_box()
+        self.post_set_queue_mode()
+
+    def get_cached_metadata(self):
+        """Get issue types and priorities to offer from the metadata cache, falling back to the module defaults.
+
+        Returns:
+            tuple (list, list): (issue type names, priority names in display order)
+
+        """
+        issue_types = list(DN_TICKET_ISSUE_TYPES)
+        priorities = list(DN_TICKET_PRIORITIES)
+
+        metadata = MetadataCache.get_metadata(self.jira_server, self._ticket.project)
+        if metadata:
+            issue_types = metadata['issue_types'] or issue_types
+            priorities = [_ for _ in DN_TICKET_PRIORITIES if _ in metadata['priorities']] or priorities
+        return issue_types, priorities
+
     # functions to edit QtDialog post JiraReportDialog init
 
     def post_create_save_check_box(self):
@@ -288,6 +619,54 @@ class HouJiraReportDialog(JiraReportDialog):
         self.uiButtonBox.addButton(toggle, QtGui.QDialogButtonBox.ActionRole)
         self.save_hip_toggle = toggle
 
+    def post_create_attach_check_box(self):
+        """Add the attach hip file checkbox."""
+        toggle = QtGui.QCheckBox('ATTACH HIP FILE TO TICKET', self)
+        toggle.setStyleSheet(self.save_hip_toggle.styleSheet())
+        toggle.setToolTip("Also attach the saved copy of the hip file to the ticket, for sites and vendors without "
+                          "the rsync mirror.\nIt is uploaded in the background, compressed files over {0:.0f} MB "
+                          "are not attached.".format(SnapshotUpload.DN_SNAPSHOT_UPLOAD_MAX_SIZE / 1048576.0))
+        toggle.setChecked(self.attach_hip)
+
+        # add attach toggle to same buttonBox as the save hip toggle
+        self.uiButtonBox.addButton(toggle, QtGui.QDialogButtonBox.ActionRole)
+        self.attach_hip_toggle = toggle
+
+    def post_create_screenshot_check_box(self):
+        """Add the screenshots checkbox, only shown when the panes could be grabbed."""
+        toggle = QtGui.QCheckBox('ATTACH SCREENSHOTS', self)
+        toggle.setStyleSheet(self.save_hip_toggle.styleSheet())
+        toggle.setToolTip("Attach the scene viewer and network editor as they were when the submitter opened.")
+        toggle.setChecked(True)
+        toggle.setVisible(False)
+
+        # add screenshot toggle to same buttonBox as the save hip toggle
+        self.uiButtonBox.addButton(toggle, QtGui.QDialogButtonBox.ActionRole)
+        self.screenshot_toggle = toggle
+
+    def post_create_profile_check_box(self):
+        """Add the profile checkbox, only shown for node tickets."""
+        toggle = QtGui.QCheckBox('PROFILE NODE (FORCES A RECOOK)', self)
+        toggle.setStyleSheet(self.save_hip_toggle.styleSheet())
+        toggle.setToolTip("Record a performance monitor profile of a forced recook of the node, limited to {0:.0f}s.\n"
+                          "The profile is saved next to a copy of the hip file.".format(
+                              ProfileCapture.DN_PROFILE_TIME_LIMIT))
+        toggle.setChecked(False)
+        toggle.setVisible(self.profile_node is not None)
+
+        # add profile toggle to same buttonBox as the save hip toggle
+        self.uiButtonBox.addButton(toggle, QtGui.QDialogButtonBox.ActionRole)
+        self.profile_toggle = toggle
+
+    def post_set_queue_mode(self):
+        """Let the artist know the ticket will be queued rather than created while JIRA is unreachable."""
+        if self.queue_for_later:
+            self.setWindowTitle('JIRA Submitter - JIRA unreachable, ticket will be queued')
+            self.uiCreateButton.setText('Queue Ticket')
+        else:
+            self.setWindowTitle('JIRA Submitter')
+            self.uiCreateButton.setText('Create Ticket')
+
     def post_delete_project_combo_box(self):
         """Get rid of project combo box."""
         project_box = self.uiProjectComboBox
@@ -297,26 +676,14 @@ class HouJiraReportDialog(JiraReportDialog):
         """Re-order priority QComboBox from base module setting first find the desired item then add it in desired
         order."""
         priority_box = self.uiPriorityComboBox
-        icon0 = priority_box.itemIcon(priority_box.findText('Minor'))
-        icon1 = priority_box.itemIcon(priority_box.findText('Trivial'))
-        icon2 = priority_box.itemIcon(priority_box.findText('Major'))
-        icon3 = priority_box.itemIcon(priority_box.findText('Critical'))
-        icon4 = priority_box.itemIcon(priority_box.findText('Blocker'))
+        icons = dict((name, priority_box.itemIcon(priority_box.findText(name))) for name in DN_TICKET_PRIORITIES)
         priority_box.clear()
-        priority_box.addItem(icon1, 'Trivial')
-        priority_box.addItem(icon0, 'Minor')
-        priority_box.addItem(icon2, 'Major')
-        priority_box.addItem(icon3, 'Critical')
-        priority_box.addItem(icon4, 'Blocker')
+        for name in DN_TICKET_PRIORITIES:
+            priority_box.addItem(icons[name], name)
 
         # set more info in tool tip
-        major_tip = 'Major: Very important, but workaround available'
-        critical_tip = 'Critical: Needs immediate attention, user cant work'
-        blocker_tip = 'Blocker: -- SHOW STOPPER -- Entire show cannot work!'
-        main_tip = 'The importance of the issue in relation to other issues.'
-        tool_tip = '{0}\n\n{1}\n{2}\n{3}\n'.format(main_tip, major_tip, critical_tip, blocker_tip)
-        priority_box.setToolTip(tool_tip)
-        priority_box.setCurrentIndex(1)
+        priority_box.setToolTip(DN_TICKET_PRIORITY_TOOL_TIP)
+        priority_box.setCurrentIndex(DN_TICKET_PRIORITIES.index(DN_TICKET_DEFAULT_PRIORITY))
 
         # make sure pop up menu is turned off for the menu
         priority_box.setStyleSheet("QComboBox { combobox-popup: 0; }")
@@ -12,8 +12,14 @@ called from OPmenu or from Dneg defined Shelf tools
 """
 
 # standard Python modules
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from cStringIO import StringIO
+import gzip
+import io
+import json
 import pwd
+import threading
+import time
 
 # dneg modules
 from dnhoufuncs import logging
@@ -22,14 +28,13 @@ from dnhoufuncs import logging
 import hou
 
 # import TicketInfo
-from jiraticketsubmitter import TicketInfo
+from jiraticketsubmitter import CircuitBreaker, EnvBaseline, JiraThrottle, SceneDiagnostics, TicketInfo, TicketLedger
+from jiraticketsubmitter import SnapshotUpload, TicketQueue
 
 import ticket_creator
 
 # local modules
 from .HipFileUtils import *
-from .HouJiraReportDialog import DN_TICKET_DESCRIPTION_MESSAGE
-from .HouJiraReportDialog import DN_TICKET_TITLE_MESSAGE
 
 # globals
 DN_TOOLS_SITE = "/tools/SITE/data/houdini"
@@ -41,14 +46,148 @@ DN_HOUDINI_JIRA_MASTER_LOGIN = "aru"  # Allen Ruilova
 # default site wide support project to use
 DN_HOUDINI_SUPPORT_PROJECT = "PTSUP"
 
+# init title
+DN_TICKET_TITLE_MESSAGE = '< ISSUE SUMMARY REQUIRED >'
+
+# init description
+DN_TICKET_DESCRIPTION_MESSAGE = '< ISSUE DESCRIPTION REQUIRED - ** KNOWN BUG w RMB menu (dont use), ' \
+                                'USE Ctl-C Ctl-V INSTEAD ** >'
+
 # job logger
 DN_JIRA_SUBMIT_LOG = logging.getLogger(module="ticket_creator.pipepkg_tools")
 
 # use named tuple to store session info auto generated in houdini
 AutoInfo = namedtuple("AutoInfo", ["location", "shot", "submitteditem", "opdefinitiontype",
-                                   "opdefinitionpath", "orighippath", "houdiniversion",
+                                   "opdefinitionpath", "scenediagnostics", "orighippath", "houdiniversion",
                                    "codeline1", "houdinipath", "curtools", "bobpaths", "codeline2"])
 
+# AutoInfo fields holding the environment dump, only summarized inline if the description gets too big
+DN_ENVIRONMENT_FIELDS = ("houdinipath", "curtools", "bobpaths")
+
+# size budget of the inline description (characters)
+DN_DESCRIPTION_INLINE_BUDGET = 32 * 1024
+
+# attachment holding the full environment dump when it does not fit inline
+DN_ENVIRONMENT_ATTACHMENT_NAME = "houdini_environment.txt.gz"
+
+# structured auto info, bump the version whenever a field is added, renamed or its meaning changes
+# version 2 adds the 'items' list of every selected node, item definition_path is None when it can't be found
+DN_AUTO_INFO_SCHEMA = "houdini_auto_info"
+DN_AUTO_INFO_VERSION = 2
+DN_AUTO_INFO_ATTACHMENT_NAME = "houdini_auto_info.json"
+
+# JIRA custom field the structured auto info is also stored in, e.g. customfield_12345, not stored if not set
+DN_AUTO_INFO_CUSTOM_FIELD = os.environ.get("DN_HOUDINI_JIRA_AUTO_INFO_FIELD")
+
+# add scene diagnostics of the submitted node's network to node tickets by default
+DN_SCENE_DIAGNOSTICS = True
+
+# per session caches, filled on first use or ahead of time by the Warmup module
+_JIRA_CONNECTIONS = {}
+_WATCHERS_CACHE = {}
+_STATIC_AUTO_INFO = {}
+_CACHE_LOCK = threading.Lock()
+
+
+# ----------------------------------------------------
+# functions defined for this module
+# ----------------------------------------------------
+
+
+def get_jira_connection(server='jira'):
+    """Get a connection to a JIRA server, reusing the one made earlier in this session.
+
+    Args:
+        server (str): name of jira server to use
+
+    Returns:
+        object: jira connection from ticket_creator
+
+    """
+    connection = _JIRA_CONNECTIONS.get(server)
+    if connection is None:
+        connection = ticket_creator.ext.jira.tools.get_jira_connection(server=server)
+        _JIRA_CONNECTIONS[server] = connection
+    return connection
+
+
+def add_attachments(jira_server, jira, issue, attachments):
+    """Upload in memory attachments to an issue through the JIRA throttle.
+
+    Args:
+        jira_server (str): name of jira server
+        jira (object): jira connection
+        issue (jira.Issue): issue to attach to
+        attachments (list of tuple): (file name, data) pairs
+
+    """
+    key = getattr(issue, 'key', issue)
+    for file_name, data in attachments:
+        JiraThrottle.call(jira_server, lambda: jira.add_attachment(key, io.BytesIO(data), file_name))
+
+
+# noinspection PyBroadException
+def set_auto_info_field(jira_server, jira, issue, attachments):
+    """Store the structured auto info found in an issue's attachments in DN_AUTO_INFO_CUSTOM_FIELD, if one is set.
+
+    Failures are only printed, the auto info is attached to the issue anyway.
+
+    Args:
+        jira_server (str): name of jira server
+        jira (object): jira connection
+        issue (jira.Issue): issue to update
+        attachments (list of tuple): (file name, data) pairs the issue was created with
+
+    """
+    payload = dict(attachments).get(DN_AUTO_INFO_ATTACHMENT_NAME)
+    if not DN_AUTO_INFO_CUSTOM_FIELD or not payload:
+        return
+
+    key = getattr(issue, 'key', issue)
+    try:
+        JiraThrottle.call(jira_server, lambda: jira.issue(key).update(fields={DN_AUTO_INFO_CUSTOM_FIELD: payload}))
+    except Exception as e:
+        print "{0}: could not store auto info in {1}: {2}".format(__name__, DN_AUTO_INFO_CUSTOM_FIELD, e)
+
+
+def summarize_section(section, attachment_name=DN_ENVIRONMENT_ATTACHMENT_NAME):
+    """Reduce an auto info section to its title line and an entry count.
+
+    Args:
+        section (str): section text, title on the first line
+        attachment_name (str): attachment the full section can be found in
+
+    Returns:
+        str: one line summary
+
+    """
+    lines = [_ for _ in section.splitlines() if _.strip()]
+    return "{0} ({1} entries, full list in {2})\n".format(lines[0].rstrip(": "), len(lines) - 1, attachment_name)
+
+
+def get_static_auto_info():
+    """Collect the auto info sections that do not depend on the submitted item, once per session.
+
+    Returns:
+        dict: AutoInfo field name to section text, plus the values the structured auto info is built from
+
+    """
+    with _CACHE_LOCK:
+        if not _STATIC_AUTO_INFO:
+            # environment sections are a diff against the show's site baseline when there is one
+            environment, environment_diff, full_environment = EnvBaseline.get_environment_sections(
+                os.environ.get("SHOW"), hou.applicationVersionString())
+
+            _STATIC_AUTO_INFO.update(location=TicketInfo.get_location_info(),
+                                     shot=TicketInfo.get_shot_info(),
+                                     houdiniversion=TicketInfo.get_houdini_version_info(),
+                                     environmentdiff=environment_diff,
+                                     fullenvironment=full_environment,
+                                     sitename=TicketInfo.get_site_name(),
+                                     houdiniversiondict=TicketInfo.get_houdini_version_dict(),
+                                     **environment)
+        return dict(_STATIC_AUTO_INFO)
+
 
 # ----------------------------------------------------
 # classes defined for this module
@@ -87,10 +226,12 @@ class HoudiniTicket(ticket_creator.Ticket):
         Args:
             **kwargs: Arbitrary keyword arguments.
             kwargs["item"] (hou.Node or hou.Tool): node or tool to open a ticket for, to be passed to panel script.
+            kwargs["items"] (list of hou.Node): selected nodes to open a single ticket for, item defaults to the first
             kwargs["item_parent"] (hou.Shelf): in case of a shelf tool, this is the parent shelf.
             kwargs["pane_tab"] (hou.PaneTab): pane tab window that is creating an instance of this class.
             kwargs["disable_ui"] (bool): force turn off ui mode so ticket can be created from python shell.
             kwargs["jira_server"] (str): name of jira server to use
+            kwargs["diagnostics"] (bool): add scene diagnostics to node tickets, defaults to DN_SCENE_DIAGNOSTICS
 
         Raises:
             ticket_creator.TicketCreatorException: general ticket creator exception
@@ -100,19 +241,49 @@ class HoudiniTicket(ticket_creator.Ticket):
             hou.OperationFailed: any houdini specific exception
 
         """
+        # time the submitter was opened, passed on so the dialog can report its time to first paint
+        self._open_time = time.time()
+
         # get kwargs
         self._hou_issue_item = kwargs['item'] if 'item' in kwargs else None
+        self._hou_issue_nodes = list(kwargs['items']) if kwargs.get('items') else []
+        if self._hou_issue_item is None and self._hou_issue_nodes:
+            self._hou_issue_item = self._hou_issue_nodes[0]
         self._hou_issue_parent = kwargs['item_parent'] if 'item_parent' in kwargs else None
         self._pane_tab = kwargs['pane_tab'] if 'pane_tab' in kwargs else None
         self._is_ui = not kwargs['disable_ui'] if 'disable_ui' in kwargs else hou.isUIAvailable()
         self._jira_server = kwargs['jira_server'] if 'jira_server' in kwargs else 'jira'
+        self._diagnostics = kwargs['diagnostics'] if 'diagnostics' in kwargs else DN_SCENE_DIAGNOSTICS
 
-        # first make sure we have a proper jira connection
+        # first make sure we have a proper jira connection, unless the server is known to be down. In ui mode the
+        # dialog then queues the ticket for later instead of making the artist wait out another network timeout
+        self.queue_for_later = False
+        breaker = CircuitBreaker.get_breaker(self._jira_server)
         try:
-            ticket_creator.ext.jira.tools.get_jira_connection(server=self._jira_server)
+            if not breaker.is_closed:
+                raise ticket_creator.TicketCreatorException("JIRA server '{0}' is unreachable, "
+                                                            "retry later".format(self._jira_server))
+            get_jira_connection(server=self._jira_server)
         except:
-            raise ticket_creator.TicketCreatorException("Error: ticket_creator could not get connection to "
-                                                        "JIRA server '{0}'".format(self._jira_server))
+            if breaker.is_closed:
+                breaker.record_failure()
+            if not self._is_ui:
+                raise ticket_creator.TicketCreatorException("Error: ticket_creator could not get connection to "
+                                                            "JIRA server '{0}'".format(self._jira_server))
+            self.queue_for_later = True
+        else:
+            breaker.record_success()
+
+            # submit anything queued while the server was down
+            if TicketQueue.has_queued_tickets():
+                TicketQueue.submit_queued_tickets_in_background(self._jira_server)
+
+            # finish attaching snapshots cut short by earlier sessions
+            if SnapshotUpload.has_queued_uploads():
+                SnapshotUpload.resume_uploads_in_background(self._jira_server)
+
+        # pick up tickets filed elsewhere since we last looked, for the duplicate check
+        TicketLedger.refresh_index_in_background()
 
         # store info about jira submission
         self._auto_info = None
@@ -121,6 +292,21 @@ class HoudiniTicket(ticket_creator.Ticket):
         self._hou_issue_type = ""
         self._final_jira_description = ""
 
+        # (file name, data) pairs uploaded to the issue once it is created
+        self.attachments = []
+
+        # signature used to spot duplicate tickets, None for generic tickets
+        self.ticket_signature = None
+
+        # structured form of the auto info, see DN_AUTO_INFO_SCHEMA
+        self.auto_info_payload = None
+
+        # SceneDiagnostics.DiagnosticsResult of the submitted node's network, None if not collected
+        self.scene_diagnostics = None
+
+        # TicketInfo.get_nodes_dicts of every submitted node, empty if the ticket is not on nodes
+        self._node_infos = []
+
         # initial people copied as watchers on all houdini issues
         # this is augmented with a file called "houdiniJiraWatchers.dat" which
         # is a simple list of logins, one per line. This lives in:
@@ -170,7 +356,13 @@ class HoudiniTicket(ticket_creator.Ticket):
                                     "final_jira_description": self._final_jira_description,
                                     "jira_server": self._jira_server,
                                     "parent": None,
-                                    "disable_ui": not self._is_ui}
+                                    "disable_ui": not self._is_ui,
+                                    "open_time": self._open_time,
+                                    "ticket_signature": self.ticket_signature,
+                                    "queue_for_later": self.queue_for_later,
+                                    "attachments": self.attachments,
+                                    "profile_node": self._hou_issue_item if self._hou_issue_type == "dneg_node"
+                                    else None}
 
         except hou.OperationFailed:
             raise
@@ -211,10 +403,20 @@ class HoudiniTicket(ticket_creator.Ticket):
         Any found are added to self._allIssuesWatchers, unless the login
         is already part of the list.
 
+        Results are cached per show for the rest of the session.
+
         Raises:
             KeyError: if user of tool has an invalid user name. (actually does a 'pass' rather than raise)
 
         """
+        # reuse watchers found earlier in this session
+        show = os.environ["SHOW"]
+        if show in _WATCHERS_CACHE:
+            for user in _WATCHERS_CACHE[show]:
+                if user not in self._all_issues_watchers:
+                    self._all_issues_watchers.append(user)
+            return
+
         # Currently this searches on the current job and SITE, this can be expanded in future possibly to sequences or
         # even shots
         search_locations = [DN_TOOLS_SITE, os.path.join(os.sep, "tools", os.environ["SHOW"], "data", "houdini")]
@@ -260,6 +462,8 @@ class HoudiniTicket(ticket_creator.Ticket):
                             message = "In file: {0}\nInvalid user login: {1}".format(path, user)
                             print message
 
+        _WATCHERS_CACHE[show] = list(self._all_issues_watchers)
+
     def _check_item(self):
         """See what the item is that the Jira ticket should be submitted on.
 
@@ -268,13 +472,12 @@ class HoudiniTicket(ticket_creator.Ticket):
 
         """
 
-        def _set_support_project_and_group(item, is_node=True):
-            """Check the install path of otl to determine the show release location, set the support
-            group to 'pipe_td' if the show release is not SITE.
+        def _set_support_project_and_group(paths):
+            """Check the install paths of the otls or tools to determine the show release location, set the support
+            group to 'pipe_td' if any show release is not SITE.
 
             Args:
-                item (hou.Node): node to check
-                is_node (bool): True = hou.Node, False = hou.Tool
+                paths (list of str): definition paths of the submitted items
 
             Returns (str): group to use
 
@@ -286,24 +489,25 @@ class HoudiniTicket(ticket_creator.Ticket):
             # set regex for testing
             show_re = re.compile(r"/tools/(?P<show>[a-zA-Z0-9_-]+)")
 
-            # get path
-            path = item.type().definition().libraryFilePath() if is_node else item.filePath()
-
-            # test path
-            g = show_re.search(path)
-            if g and g.group('show') != 'SITE':
-                group = 'pipe_td'
+            # test paths, a show release anywhere in the selection goes to the show's TDs first
+            for path in paths:
+                g = show_re.search(path or "")
+                if g and g.group('show') != 'SITE':
+                    group = 'pipe_td'
 
             return group
 
-        # case where it's a hou.Node (or subclass, usually)
+        # case where it's a hou.Node (or subclass, usually), or several selected nodes
         if isinstance(self._hou_issue_item, hou.Node):
-            self.group = _set_support_project_and_group(self._hou_issue_item)
+            if self._hou_issue_item not in self._hou_issue_nodes:
+                self._hou_issue_nodes.insert(0, self._hou_issue_item)
+            self._node_infos = TicketInfo.get_nodes_dicts(self._hou_issue_nodes)
+            self.group = _set_support_project_and_group(set(_['definition_path'] for _ in self._node_infos))
             self._hou_issue_type = "dneg_node"
 
         # case where it's a hou.Tool (or subclass, potentially)
         elif isinstance(self._hou_issue_item, hou.Tool):
-            self.group = _set_support_project_and_group(self._hou_issue_item, is_node=False)
+            self.group = _set_support_project_and_group([self._hou_issue_item.filePath()])
             self._hou_issue_type = "dneg_tool"
 
         # case where it's just generic and will capture whatever it can
@@ -316,41 +520,148 @@ class HoudiniTicket(ticket_creator.Ticket):
         """Collect various bits of info from the environment and Houdini to automatically add to the Jira ticket."""
         hpath_info = "Submission HIP location:\n{0}\n\n".format(hou.getenv('HIP'))
 
-        # take the whole HOUDINI_PATH too
-        hpath = "HOUDINI_PATH: \n"
-        for loc in os.environ['HOUDINI_PATH'].split(":"):
-            hpath += "{0}\n".format(loc)
+        # sections that do not depend on the item are collected once per session
+        static_info = get_static_auto_info()
+
+        # cached errors, warnings and cook times of the node's network, bounded so it costs next to nothing
+        diagnostics_info = ""
+        if self._diagnostics and self._hou_issue_type == "dneg_node":
+            self.scene_diagnostics = SceneDiagnostics.collect_diagnostics(self._hou_issue_nodes)
+            diagnostics_info = SceneDiagnostics.format_table(self.scene_diagnostics)
+
+        # item sections list every node of a multi node ticket, from the info gathered when checking the item
+        if len(self._node_infos) > 1:
+            item_info = TicketInfo.get_nodes_item_info(self._node_infos)
+            type_info = TicketInfo.get_nodes_type_info(self._node_infos)
+            path_info = TicketInfo.get_nodes_path_info(self._node_infos)
+        else:
+            item_info = TicketInfo.get_item_info(self._hou_issue_type, self._hou_issue_item, self._hou_issue_parent)
+            type_info = TicketInfo.get_item_type_info(self._hou_issue_type, self._hou_issue_item)
+            path_info = TicketInfo.get_item_path_info(self._hou_issue_type, self._hou_issue_item)
 
         # ---------------------------------------------------------------------
         # stuff to go into final description
 
         self._auto_info = AutoInfo(
-            location=TicketInfo.get_location_info(),
-            shot=TicketInfo.get_shot_info(),
-            submitteditem=TicketInfo.get_item_info(self._hou_issue_type, self._hou_issue_item, self._hou_issue_parent),
-            opdefinitiontype=TicketInfo.get_item_type_info(self._hou_issue_type, self._hou_issue_item),
-            opdefinitionpath=TicketInfo.get_item_path_info(self._hou_issue_type, self._hou_issue_item),
+            location=static_info['location'],
+            shot=static_info['shot'],
+            submitteditem=item_info,
+            opdefinitiontype=type_info,
+            opdefinitionpath=path_info,
+            scenediagnostics=diagnostics_info,
             orighippath=hpath_info,
-            houdiniversion=TicketInfo.get_houdini_version_info(),
+            houdiniversion=static_info['houdiniversion'],
             codeline1="{code:collapse=true|title=Environment Info Below} ",
-            houdinipath=hpath,
-            curtools=TicketInfo.get_curtools_info(),
-            bobpaths=TicketInfo.get_bob_info(),
+            houdinipath=static_info['houdinipath'],
+            curtools=static_info['curtools'],
+            bobpaths=static_info['bobpaths'],
             codeline2="{code}")
 
+        # the diff is small, always attach it so the full environment can be rebuilt from the site baseline
+        if static_info['environmentdiff']:
+            self.attachments.append((EnvBaseline.DN_ENV_DIFF_ATTACHMENT_NAME,
+                                     json.dumps(static_info['environmentdiff'], indent=1)))
+
+        # generic tickets are never matched as duplicates
+        if self._hou_issue_type != "generic":
+            self.ticket_signature = TicketLedger.get_signature(self._auto_info.opdefinitiontype,
+                                                               self._auto_info.opdefinitionpath,
+                                                               hou.applicationVersionString())
+
+        # the same info for scripts, attached and stored in a custom field so tickets can be queried without parsing
+        self.auto_info_payload = self._build_auto_info_payload(static_info, hou.getenv('HIP'))
+        self.attachments.append((DN_AUTO_INFO_ATTACHMENT_NAME, json.dumps(self.auto_info_payload, sort_keys=True)))
+
+    def _build_auto_info_payload(self, static_info, hip_path):
+        """Build the structured auto info from the values already collected for the description.
+
+        Args:
+            static_info (dict): as returned by get_static_auto_info
+            hip_path (str): hip file location at submission time
+
+        Returns:
+            OrderedDict: versioned auto info
+
+        """
+        environment = OrderedDict([('baseline', None), ('diff', None), ('full', None)])
+        if static_info['environmentdiff']:
+            environment['baseline'] = static_info['environmentdiff']['baseline']
+            environment['diff'] = static_info['environmentdiff']
+        else:
+            environment['full'] = static_info['fullenvironment']
+
+        return OrderedDict([('schema', DN_AUTO_INFO_SCHEMA),
+                            ('version', DN_AUTO_INFO_VERSION),
+                            ('site', static_info['sitename']),
+                            ('show', os.environ.get("SHOW")),
+                            ('shot', os.environ.get("SHOT")),
+                            ('user', os.environ.get("USER")),
+                            ('houdini', static_info['houdiniversiondict']),
+                            ('item', TicketInfo.get_item_dict(self._hou_issue_type, self._hou_issue_item,
+                                                              self._hou_issue_parent)),
+                            ('items', self._node_infos),
+                            ('hip', hip_path),
+                            ('signature', self.ticket_signature),
+                            ('environment', environment),
+                            ('diagnostics', self._get_diagnostics_payload())])
+
+    def _get_diagnostics_payload(self):
+        """Get the scene diagnostics for the structured auto info.
+
+        Returns:
+            OrderedDict: walk summary and the notable nodes, None if diagnostics were not collected
+
+        """
+        if self.scene_diagnostics is None:
+            return None
+        return OrderedDict([('visited', self.scene_diagnostics.visited),
+                            ('seconds', self.scene_diagnostics.seconds),
+                            ('stopped_by', self.scene_diagnostics.stopped_by),
+                            ('nodes', [_._asdict()
+                                       for _ in SceneDiagnostics.get_notable_nodes(self.scene_diagnostics)])])
+
     def _build_final_description(self):
         """
         Populate the self._final_jira_description variable.
 
-        Basically takes all the auto generated info and tacks it on the end of the user-entered description.
+        Basically takes all the auto generated info and tacks it on the end of the user-entered description, written in
+        a single pass. If the environment sections would take it over DN_DESCRIPTION_INLINE_BUDGET only a summary of
+        them goes inline and the full dump is added to self.attachments as a compressed file.
 
         """
-        self._final_jira_description = "{0}\n{1}".format(self._final_jira_description, "-" * 79)
-        self._final_jira_description = "{0}\nAUTO GENERATED INFO FOLLOWS".format(self._final_jira_description)
-        self._final_jira_description = "{0}\n{1}".format(self._final_jira_description, "-" * 79)
+        # noqa: The leading underscore on the method name isn't there to discourage use.
+        auto_info = self._auto_info._asdict()
+        size = sum(len(_) for _ in auto_info.itervalues() if _)
+        inline_environment = size <= DN_DESCRIPTION_INLINE_BUDGET
+
+        description = StringIO()
+        description.write(self._final_jira_description)
+        description.write("\n{0}\nAUTO GENERATED INFO FOLLOWS\n{0}".format("-" * 79))
 
         # iterate over keys in named tuple
-        # noqa: The leading underscore on the method name isn't there to discourage use.
-        for _, value in self._auto_info._asdict().iteritems():
+        for field, value in auto_info.iteritems():
             if value:
-                self._final_jira_description = "{0}\n{1}".format(self._final_jira_description, value)
+                if field in DN_ENVIRONMENT_FIELDS and not inline_environment:
+                    value = summarize_section(value)
+                description.write("\n")
+                description.write(value)
+        self._final_jira_description = description.getvalue()
+
+        if not inline_environment:
+            self.attachments.append((DN_ENVIRONMENT_ATTACHMENT_NAME, self._compress_environment()))
+
+    def _compress_environment(self):
+        """Gzip the full environment sections.
+
+        Returns:
+            str: compressed data
+
+        """
+        data = io.BytesIO()
+        with gzip.GzipFile(fileobj=data, mode="wb") as _file:
+            for field in DN_ENVIRONMENT_FIELDS:
+                value = getattr(self._auto_info, field)
+                if value:
+                    _file.write(value.encode("utf-8") if isinstance(value, unicode) else value)
+                    _file.write("\n")
+        return data.getvalue()
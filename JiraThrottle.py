@@ -0,0 +1,350 @@
+"""Module containing client side rate limiting and request coalescing for the session's JIRA calls.
+
+When a show-wide blocker hits, hundreds of sessions call JIRA at the same moment and the server starts throttling
+everyone. Every JIRA call made by the submitter goes through a token bucket per jira server which also backs off
+when the server answers with Retry-After. Identical comment and watcher updates to the same issue are merged into
+a single request.
+"""
+
+# standard Python modules
+import threading
+import time
+
+# JIRA calls started per second, per jira server
+DN_JIRA_CALL_RATE = 2.0
+
+# calls that may be started at once after a quiet period
+DN_JIRA_CALL_BURST = 5
+
+# identical comment/watcher updates started within this window are merged (seconds)
+DN_JIRA_COALESCE_WINDOW = 0.5
+
+# how many times a throttled call is retried
+DN_JIRA_MAX_RETRIES = 3
+
+# back off used when the server throttles without a usable Retry-After header (seconds)
+DN_JIRA_DEFAULT_RETRY_AFTER = 5.0
+
+# http status codes the server uses to throttle clients
+DN_JIRA_THROTTLE_STATUS_CODES = (429, 503)
+
+# per jira server buckets and metrics, and the in flight coalesced updates
+_BUCKETS = {}
+_METRICS = {}
+_PENDING = {}
+_LOCK = threading.Lock()
+
+
+# ----------------------------------------------------
+# classes defined for this module
+# ----------------------------------------------------
+
+
+class TokenBucket(object):
+    """Token bucket shared between threads.
+
+    Args:
+        rate (float): tokens added per second, 0 or None for no limit
+        burst (int): most tokens the bucket holds
+
+    """
+
+    def __init__(self, rate=DN_JIRA_CALL_RATE, burst=DN_JIRA_CALL_BURST):
+        """Initialize a full bucket."""
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last_time = time.time()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, blocking until one is available.
+
+        Returns:
+            float: seconds spent waiting
+
+        """
+        if not self.rate:
+            return 0.0
+
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_time) * self.rate)
+            self._last_time = now
+
+            # tokens can go negative, which queues callers behind each other
+            self._tokens -= 1.0
+            wait = max(0.0, -self._tokens / self.rate, self._paused_until - now)
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def try_acquire(self):
+        """Take a token if one is available, without waiting.
+
+        Returns:
+            bool: True if a token was taken
+
+        """
+        if not self.rate:
+            return True
+
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_time) * self.rate)
+            self._last_time = now
+            if self._tokens < 1.0 or self._paused_until > now:
+                return False
+            self._tokens -= 1.0
+            return True
+
+    def pause(self, seconds):
+        """Hand out no tokens for a while, e.g. after the server asked us to retry later.
+
+        Args:
+            seconds (float): how long to pause for
+
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.time() + seconds)
+
+
+class ThrottleMetrics(object):
+    """Counters for the JIRA calls made to one server."""
+
+    def __init__(self):
+        """Initialize counters."""
+        self.calls = 0
+        self.queued_seconds = 0.0
+        self.max_queued_seconds = 0.0
+        self.retries = 0
+        self.saved_calls = 0
+        self._lock = threading.Lock()
+
+    def record_call(self, queued):
+        """Count a call that was started after queueing.
+
+        Args:
+            queued (float): seconds the call waited for a token
+
+        """
+        with self._lock:
+            self.calls += 1
+            self.queued_seconds += queued
+            self.max_queued_seconds = max(self.max_queued_seconds, queued)
+
+    def record_retry(self):
+        """Count a throttled call that is retried."""
+        with self._lock:
+            self.retries += 1
+
+    def record_saved(self):
+        """Count a call that was merged into another one."""
+        with self._lock:
+            self.saved_calls += 1
+
+    def as_dict(self):
+        """Get the counters.
+
+        Returns:
+            dict: counter name to value
+
+        """
+        with self._lock:
+            return {'calls': self.calls,
+                    'queued_seconds': self.queued_seconds,
+                    'max_queued_seconds': self.max_queued_seconds,
+                    'mean_queued_seconds': self.queued_seconds / self.calls if self.calls else 0.0,
+                    'retries': self.retries,
+                    'saved_calls': self.saved_calls}
+
+
+class _PendingUpdate(object):
+    """An update in flight that identical updates can wait on instead of sending their own request."""
+
+    def __init__(self):
+        """Initialize an unfinished update."""
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# ----------------------------------------------------
+# functions defined for this module
+# ----------------------------------------------------
+
+
+def get_bucket(jira_server='jira'):
+    """Get the token bucket shared by all calls to a jira server.
+
+    Args:
+        jira_server (str): name of jira server
+
+    Returns:
+        TokenBucket: the server's bucket
+
+    """
+    with _LOCK:
+        if jira_server not in _BUCKETS:
+            _BUCKETS[jira_server] = TokenBucket()
+        return _BUCKETS[jira_server]
+
+
+def get_metrics(jira_server='jira'):
+    """Get the metrics object for a jira server.
+
+    Args:
+        jira_server (str): name of jira server
+
+    Returns:
+        ThrottleMetrics: the server's metrics
+
+    """
+    with _LOCK:
+        if jira_server not in _METRICS:
+            _METRICS[jira_server] = ThrottleMetrics()
+        return _METRICS[jira_server]
+
+
+def report_metrics():
+    """Print the metrics of every jira server called this session."""
+    for jira_server in sorted(_METRICS):
+        metrics = _METRICS[jira_server].as_dict()
+        print "{0}: {1}: {2} calls, {3:.2f}s queued (max {4:.2f}s), {5} retries, {6} calls saved".format(
+            __name__, jira_server, metrics['calls'], metrics['queued_seconds'], metrics['max_queued_seconds'],
+            metrics['retries'], metrics['saved_calls'])
+
+
+def get_retry_after(error):
+    """Get how long the server asked us to wait from a failed call.
+
+    Args:
+        error (Exception): exception raised by the jira client, usually a JIRAError
+
+    Returns:
+        float: seconds to wait, None if the error is not a throttling response
+
+    """
+    if getattr(error, 'status_code', None) not in DN_JIRA_THROTTLE_STATUS_CODES:
+        return None
+
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return max(0.0, float(headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        # missing or an http date, just use the default back off
+        return DN_JIRA_DEFAULT_RETRY_AFTER
+
+
+# noinspection PyBroadException
+def call(jira_server, func, *args, **kwargs):
+    """Run a JIRA call behind the server's token bucket, retrying throttled calls after Retry-After.
+
+    Args:
+        jira_server (str): name of jira server
+        func (callable): jira client method or ticket creator call
+        *args: arguments to pass to func
+        **kwargs: keyword arguments to pass to func
+
+    Returns:
+        object: whatever func returns
+
+    """
+    bucket = get_bucket(jira_server)
+    metrics = get_metrics(jira_server)
+    attempt = 0
+    while True:
+        metrics.record_call(bucket.acquire())
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            retry_after = get_retry_after(e)
+            if retry_after is None or attempt >= DN_JIRA_MAX_RETRIES:
+                raise
+            attempt += 1
+            metrics.record_retry()
+            bucket.pause(retry_after)
+
+
+def add_comment(jira_server, jira, key, body, window=DN_JIRA_COALESCE_WINDOW):
+    """Add a comment to an issue, merged with identical comments to the same issue.
+
+    Args:
+        jira_server (str): name of jira server
+        jira (object): jira connection
+        key (str or jira.Issue): issue to comment on
+        body (str): comment text
+        window (float): how long to wait for identical comments to merge with, 0 to only join one in flight
+
+    Returns:
+        object: the jira client's result
+
+    """
+    key = getattr(key, 'key', key)
+    return _coalesced(jira_server, ('comment', key, body), window, jira.add_comment, key, body)
+
+
+def add_watcher(jira_server, jira, key, user, window=DN_JIRA_COALESCE_WINDOW):
+    """Add a watcher to an issue, merged with identical watcher updates to the same issue.
+
+    Args:
+        jira_server (str): name of jira server
+        jira (object): jira connection
+        key (str or jira.Issue): issue to watch
+        user (str): login to add as watcher
+        window (float): how long to wait for identical updates to merge with, 0 to only join one in flight
+
+    Returns:
+        object: the jira client's result
+
+    """
+    key = getattr(key, 'key', key)
+    return _coalesced(jira_server, ('watcher', key, user), window, jira.add_watcher, key, user)
+
+
+# noinspection PyBroadException
+def _coalesced(jira_server, update, window, func, *args):
+    """Send an update once for every identical update started within the window.
+
+    The first caller waits out the window then sends the request, callers joining before the request is done wait for
+    its result.
+
+    Args:
+        jira_server (str): name of jira server
+        update (tuple): identifies identical updates
+        window (float): how long the first caller waits for others to join (seconds)
+        func (callable): jira client method
+        *args: arguments to pass to func
+
+    Returns:
+        object: whatever func returns
+
+    """
+    key = (jira_server,) + update
+    with _LOCK:
+        pending = _PENDING.get(key)
+        is_owner = pending is None
+        if is_owner:
+            pending = _PendingUpdate()
+            _PENDING[key] = pending
+
+    if not is_owner:
+        get_metrics(jira_server).record_saved()
+        pending.done.wait()
+    else:
+        if window > 0:
+            time.sleep(window)
+        try:
+            pending.result = call(jira_server, func, *args)
+        except Exception as e:
+            pending.error = e
+        finally:
+            with _LOCK:
+                del _PENDING[key]
+            pending.done.set()
+
+    if pending.error is not None:
+        raise pending.error
+    return pending.result
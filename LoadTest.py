@@ -0,0 +1,685 @@
+"""Module containing the load test of many artist sessions filing tickets at once, against a local fake JIRA server.
+
+When a show-wide blocker is fixed and JIRA comes back after an outage, hundreds of sessions submit their queued
+tickets at the same moment. This tool replays that against FakeJiraServer, a small stand-in for the JIRA REST API
+with configurable latency, capacity, errors, throttling and an initial outage, so scaling changes to the submitter can
+be checked before rollout:
+
+    hython -m jiraticketsubmitter.LoadTest --sessions 300 --outage 10 --throttle-rate 50 --error-rate 0.01
+
+Each simulated session files a node ticket the way the submitter does: get_jira_connection, the issue created with
+ticket_creator's JiraTicketCreator, its description comment, the attachments and the auto info field, each through
+JiraThrottle. The connection ticket_creator would make is replaced by a jira client pointed at the fake server, for
+whichever jira server is asked for. Every session has a jira server name, and so a token bucket, a CircuitBreaker and a
+ticket queue dir, of its own, as separate Houdini processes would. A session that can't reach the server opens its
+breaker and queues the ticket with TicketQueue. Once the breaker's background probe sees the server again the session
+submits its queue with TicketQueue.submit_queued_tickets, as the next submitter to connect would. Sessions run on
+threads, optionally spread over several processes, and keep the submitter's local files in a temporary dir.
+
+The report gives throughput, latency percentiles from the start of a session to its ticket being created, throttle
+retries and queueing, what the server saw and the failure modes.
+"""
+
+# standard Python modules
+import argparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from collections import OrderedDict
+import cgi
+import getpass
+import itertools
+import json
+from multiprocessing import Pool
+import os
+import random
+import shutil
+import socket
+from SocketServer import ThreadingMixIn
+import sys
+import tempfile
+import threading
+import time
+
+# third party modules
+import jira
+
+# local modules
+from jiraticketsubmitter import CircuitBreaker, HoudiniTicket, JiraThrottle, TicketQueue
+from jiraticketsubmitter.HoudiniTicket import add_attachments, get_jira_connection, set_auto_info_field
+import ticket_creator
+from ticket_creator.ext.jira import JiraTicketCreator
+
+# REST API path prefix served by the fake server
+DN_LOAD_TEST_API = "/rest/api/2"
+
+# per request socket timeout of the simulated sessions (seconds)
+DN_LOAD_TEST_SOCKET_TIMEOUT = 30.0
+
+# how often a session with a queued ticket tries to submit it once its breaker is closed (seconds)
+DN_LOAD_TEST_RECONNECT_INTERVAL = 2.0
+
+# custom field the auto info is stored in, if the submitter isn't set up with one
+DN_LOAD_TEST_AUTO_INFO_FIELD = "customfield_10000"
+
+# issue types the fake server knows
+DN_LOAD_TEST_ISSUE_TYPES = ("Bug", "Task", "Story", "Improvement", "New Feature", "Sub-task")
+
+# base url of the fake server the jira connections of this process go to
+_FAKE_SERVER_URL = None
+
+# percentiles reported for the session latency
+DN_LOAD_TEST_PERCENTILES = (0.5, 0.9, 0.99)
+
+
+# ----------------------------------------------------
+# classes defined for this module
+# ----------------------------------------------------
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    """HTTP server handling each request on a thread of its own."""
+
+    daemon_threads = True
+    request_queue_size = 512
+
+
+class FakeJiraHandler(BaseHTTPRequestHandler):
+    """Request handler of FakeJiraServer, the fake server is reached through self.server.fake."""
+
+    def log_message(self, *args):
+        """Keep the console quiet."""
+        pass
+
+    def do_GET(self):
+        """Serve GET requests."""
+        self.server.fake.handle(self, "GET")
+
+    def do_POST(self):
+        """Serve POST requests."""
+        self.server.fake.handle(self, "POST")
+
+    def do_PUT(self):
+        """Serve PUT requests."""
+        self.server.fake.handle(self, "PUT")
+
+
+class FakeJiraServer(object):
+    """Local stand-in for the parts of the JIRA REST API the submitter uses.
+
+    Created issues are kept in self.issues with their fields, comments and attachment names and sizes. Set
+    keep_attachment_data to also keep what was attached in self.attachment_data, by (issue key, file name).
+
+    Args:
+        latency (float): mean time each request takes (seconds)
+        jitter (float): standard deviation of the request time (seconds)
+        capacity (int): requests handled at the same time, the others wait for a free slot
+        error_rate (float): fraction of requests answered with a 500
+        throttle_rate (float): requests per second accepted over all clients before answering 429, 0 for no limit
+        throttle_burst (int): requests accepted at once after a quiet period
+        outage (float): how long the server is down after start(), connections are refused meanwhile (seconds)
+
+    """
+
+    def __init__(self, latency=0.1, jitter=0.05, capacity=50, error_rate=0.0, throttle_rate=0.0, throttle_burst=20,
+                 outage=0.0):
+        """Initialize the server and pick its port, nothing listens until start() and any outage are over."""
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.outage = outage
+        self.issues = OrderedDict()
+        self.attachment_data = {}
+        self.keep_attachment_data = False
+        self.stats = OrderedDict([('requests', 0), ('throttled', 0), ('errors', 0), ('issues', 0), ('comments', 0),
+                                  ('attachments', 0), ('updates', 0), ('max_concurrent', 0)])
+
+        self._throttle = JiraThrottle.TokenBucket(throttle_rate, throttle_burst) if throttle_rate else None
+        self._slots = threading.Semaphore(max(1, capacity))
+        self._concurrent = 0
+        self._keys = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+        self._timer = None
+
+        # find a free port now so clients know where to connect during the outage
+        probe = socket.socket()
+        probe.bind(("127.0.0.1", 0))
+        self.port = probe.getsockname()[1]
+        probe.close()
+
+    @property
+    def url(self):
+        """str: base url of the server."""
+        return "http://127.0.0.1:{0}".format(self.port)
+
+    def start(self):
+        """Start serving, once the outage is over.
+
+        Returns:
+            FakeJiraServer: self
+
+        """
+        if self.outage > 0:
+            self._timer = threading.Timer(self.outage, self._serve)
+            self._timer.daemon = True
+            self._timer.start()
+        else:
+            self._serve()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def handle(self, request, method):
+        """Answer a request after the simulated latency, unless it is throttled or picked to fail.
+
+        Args:
+            request (FakeJiraHandler): request being handled
+            method (str): http method
+
+        """
+        length = int(request.headers.get('Content-Length') or 0)
+        body = request.rfile.read(length) if length else ""
+        with self._lock:
+            self.stats['requests'] += 1
+
+        # throttled requests are rejected straight away, like a proxy in front of the server would
+        if self._throttle is not None and not self._throttle.try_acquire():
+            with self._lock:
+                self.stats['throttled'] += 1
+            self._send(request, 429, {'errorMessages': ["Rate limit exceeded"]},
+                       {'Retry-After': "{0:.0f}".format(max(1.0, 1.0 / self._throttle.rate))})
+            return
+
+        with self._slots:
+            with self._lock:
+                self._concurrent += 1
+                self.stats['max_concurrent'] = max(self.stats['max_concurrent'], self._concurrent)
+            try:
+                time.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+                if random.random() < self.error_rate:
+                    with self._lock:
+                        self.stats['errors'] += 1
+                    self._send(request, 500, {'errorMessages': ["Simulated server error"]})
+                    return
+                self._route(request, method, body)
+            finally:
+                with self._lock:
+                    self._concurrent -= 1
+
+    def _route(self, request, method, body):
+        """Answer a request that was let through.
+
+        Args:
+            request (FakeJiraHandler): request being handled
+            method (str): http method
+            body (str): request body
+
+        """
+        path = request.path.split("?")[0]
+        parts = path[len(DN_LOAD_TEST_API):].strip("/").split("/") if path.startswith(DN_LOAD_TEST_API) else []
+
+        if method == "GET" and parts == ["serverInfo"]:
+            self._send(request, 200, {'version': "7.0.0", 'versionNumbers': [7, 0, 0], 'deploymentType': "Server",
+                                      'serverTitle': "FakeJiraServer"})
+        elif method == "GET" and parts == ["field"]:
+            self._send(request, 200, [])
+        elif method == "GET" and parts == ["issuetype"]:
+            self._send(request, 200, [{'id': str(_ + 1), 'name': name}
+                                      for _, name in enumerate(DN_LOAD_TEST_ISSUE_TYPES)])
+        elif method == "GET" and len(parts) == 2 and parts[0] == "project":
+            self._send(request, 200, {'id': "10000", 'key': parts[1], 'name': parts[1]})
+        elif method == "POST" and parts == ["issue"]:
+            key = "LOAD-{0}".format(next(self._keys))
+            with self._lock:
+                self.issues[key] = {'fields': json.loads(body or "{}").get('fields', {}), 'attachment': [],
+                                    'comments': []}
+                self.stats['issues'] += 1
+            self._send(request, 201, self._get_issue(key, fields=False))
+        elif len(parts) >= 2 and parts[0] == "issue" and parts[1] not in self.issues:
+            self._send(request, 404, {'errorMessages': ["Issue does not exist"]})
+        elif method == "GET" and len(parts) == 2:
+            self._send(request, 200, self._get_issue(parts[1]))
+        elif method == "PUT" and len(parts) == 2:
+            with self._lock:
+                self.issues[parts[1]]['fields'].update(json.loads(body or "{}").get('fields', {}))
+                self.stats['updates'] += 1
+            self._send(request, 204)
+        elif method == "POST" and parts[2:] == ["comment"]:
+            comment = json.loads(body or "{}").get('body')
+            with self._lock:
+                self.issues[parts[1]]['comments'].append(comment)
+                self.stats['comments'] += 1
+            self._send(request, 201, {'body': comment})
+        elif method == "POST" and parts[2:] == ["watchers"]:
+            self._send(request, 204)
+        elif method == "POST" and parts[2:] == ["attachments"]:
+            form = cgi.FieldStorage(fp=_StringReader(body), headers=request.headers,
+                                    environ={'REQUEST_METHOD': "POST"})
+            attachment = {'filename': form['file'].filename, 'size': len(form['file'].value)}
+            with self._lock:
+                self.issues[parts[1]]['attachment'].append(attachment)
+                self.stats['attachments'] += 1
+                if self.keep_attachment_data:
+                    self.attachment_data[(parts[1], attachment['filename'])] = form['file'].value
+            self._send(request, 200, [attachment])
+        else:
+            self._send(request, 404, {'errorMessages': ["Not supported by FakeJiraServer"]})
+
+    def _get_issue(self, key, fields=True):
+        """Get the JSON of an issue, as the REST API gives it.
+
+        Args:
+            key (str): issue key
+            fields (bool): include the fields, an issue just created is answered without them
+
+        Returns:
+            dict: issue
+
+        """
+        issue = {'id': key.split("-")[1], 'key': key,
+                 'self': "{0}{1}/issue/{2}".format(self.url, DN_LOAD_TEST_API, key)}
+        if fields:
+            with self._lock:
+                issue['fields'] = dict(self.issues[key]['fields'], attachment=list(self.issues[key]['attachment']))
+        return issue
+
+    @staticmethod
+    def _send(request, status, payload=None, headers=None):
+        """Write a JSON response.
+
+        Args:
+            request (FakeJiraHandler): request being handled
+            status (int): http status code
+            payload (object): JSON body, None for no body
+            headers (dict): extra headers
+
+        """
+        data = json.dumps(payload) if payload is not None else ""
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(data)
+
+    def _serve(self):
+        """Start listening and serve on a daemon thread."""
+        self._server = _ThreadingHTTPServer(("127.0.0.1", self.port), FakeJiraHandler)
+        self._server.fake = self
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+
+class _StringReader(object):
+    """File like reader of a request body already read, for cgi.FieldStorage."""
+
+    def __init__(self, data):
+        """Initialize the reader at the start of the data."""
+        self._data = data
+        self._offset = 0
+
+    def read(self, size=-1):
+        """Read bytes."""
+        end = len(self._data) if size is None or size < 0 else self._offset + size
+        data, self._offset = self._data[self._offset:end], min(end, len(self._data))
+        return data
+
+    def readline(self, size=-1):
+        """Read a line."""
+        end = self._data.find("\n", self._offset)
+        end = len(self._data) if end < 0 else end + 1
+        if size is not None and size >= 0:
+            end = min(end, self._offset + size)
+        data, self._offset = self._data[self._offset:end], end
+        return data
+
+
+# ----------------------------------------------------
+# functions defined for this module
+# ----------------------------------------------------
+
+
+def use_fake_server(url, options):
+    """Send the jira connections of this process to the fake server and keep the submitter's local files apart.
+
+    ticket_creator's get_jira_connection is replaced wherever ticket_creator holds it, so get_jira_connection, the
+    ticket creator and the CircuitBreaker probes all reach the fake server.
+
+    Args:
+        url (str): base url of the fake server
+        options (argparse.Namespace): load test options
+
+    Returns:
+        str: temporary dir holding the breaker state and ticket queues, for the caller to remove
+
+    """
+    global _FAKE_SERVER_URL
+    _FAKE_SERVER_URL = url
+    for name, module in sys.modules.items():
+        if name.startswith("ticket_creator") and hasattr(module, "get_jira_connection"):
+            module.get_jira_connection = get_fake_connection
+
+    tmp_dir = tempfile.mkdtemp(prefix="jira_load_test_")
+    CircuitBreaker.DN_JIRA_LOCAL_CACHE_DIR = tmp_dir
+    CircuitBreaker.DN_CIRCUIT_RESET_TIMEOUT = options.reset_timeout
+    TicketQueue.DN_TICKET_QUEUE_DIR = os.path.join(tmp_dir, "queued_tickets")
+    HoudiniTicket.DN_AUTO_INFO_CUSTOM_FIELD = HoudiniTicket.DN_AUTO_INFO_CUSTOM_FIELD or DN_LOAD_TEST_AUTO_INFO_FIELD
+    return tmp_dir
+
+
+def get_fake_connection(*args, **kwargs):
+    """Connect to the fake server whichever jira server is asked for, in place of ticket_creator's get_jira_connection.
+
+    Returns:
+        jira.JIRA: new connection, the server info is checked like a real connection does
+
+    """
+    # JiraThrottle does the retrying, the client's own back-off would hide it
+    return jira.JIRA(options={'server': _FAKE_SERVER_URL}, max_retries=0, timeout=DN_LOAD_TEST_SOCKET_TIMEOUT)
+
+
+def run_session(index, options):
+    """File one ticket the way a submitter session does, queueing it while the server can't be reached.
+
+    Args:
+        index (int): session number, used to give the session a jira server name of its own
+        options (argparse.Namespace): load test options
+
+    Returns:
+        dict: 'key', 'latency' to the issue being created, or to the queued ticket being submitted, 'seconds' for the
+            whole session, 'queued_ticket', 'retries', 'queued_seconds' and 'failure' as "step: error", None if the
+            ticket was filed
+
+    """
+    jira_server = "loadtest-{0}-{1}".format(os.getpid(), index)
+    queue_dir = os.path.join(TicketQueue.DN_TICKET_QUEUE_DIR, jira_server)
+    breaker = CircuitBreaker.get_breaker(jira_server)
+    result = {'key': None, 'latency': None, 'seconds': None, 'queued_ticket': False, 'retries': 0,
+              'queued_seconds': 0.0, 'failure': None}
+    start = time.time()
+
+    # opening the submitter costs some time before anything is sent
+    time.sleep(options.open_cost)
+
+    ticket = ticket_creator.Ticket()
+    ticket.project = options.project
+    ticket.issue_type = "Bug"
+    ticket.title = "[loadtest] session {0}".format(index)
+    ticket.comment = "Load test ticket of session {0}".format(index)
+    ticket.reporter = getpass.getuser()
+    description = "x" * options.description_size
+    attachments = [("attachment_{0}.bin".format(_), "x" * size) for _, size in enumerate(options.attachment_sizes)]
+    if attachments:
+        attachments[-1] = (HoudiniTicket.DN_AUTO_INFO_ATTACHMENT_NAME, attachments[-1][1])
+
+    step = "connect"
+    issue = None
+    try:
+        try:
+            jira_connection = get_jira_connection(server=jira_server)
+            breaker.record_success()
+
+            step = "create"
+            issue = JiraThrottle.call(jira_server, JiraTicketCreator().create, ticket)
+            result['key'] = issue.key
+            result['latency'] = time.time() - start
+
+            step = "comment"
+            JiraThrottle.add_comment(jira_server, jira_connection, issue, description, window=0)
+            step = "attachment"
+            add_attachments(jira_server, jira_connection, issue, attachments)
+            set_auto_info_field(jira_server, jira_connection, issue, attachments)
+        except Exception as e:
+            if not CircuitBreaker.is_unreachable_error(e):
+                raise
+
+            # the breaker probes in the background, the ticket or what is left of it waits in the queue meanwhile
+            breaker.record_failure()
+            step = "queue"
+            TicketQueue.queue_ticket(ticket, description, jira_server, attachments=attachments,
+                                     key=issue.key if issue else None, queue_dir=queue_dir)
+            result['queued_ticket'] = True
+
+            step = "submit"
+            while TicketQueue.has_queued_tickets(queue_dir):
+                if time.time() - start > options.timeout:
+                    raise RuntimeError("still queued after {0:.0f}s".format(options.timeout))
+                if breaker.is_closed:
+                    keys = TicketQueue.submit_queued_tickets(jira_server, queue_dir)
+                    if keys:
+                        result['key'] = keys[0]
+                        result['latency'] = result['latency'] or time.time() - start
+                        break
+                time.sleep(DN_LOAD_TEST_RECONNECT_INTERVAL)
+    except Exception as e:
+        result['failure'] = "{0}: {1}".format(step, "unreachable" if CircuitBreaker.is_unreachable_error(e) else e)
+
+    result['seconds'] = time.time() - start
+    metrics = JiraThrottle.get_metrics(jira_server).as_dict()
+    result['retries'] = metrics['retries']
+    result['queued_seconds'] = metrics['queued_seconds']
+    return result
+
+
+def run_sessions(count, url, options, first_index=0):
+    """Run sessions on threads of this process against the fake server, started over the ramp up time.
+
+    Args:
+        count (int): number of sessions
+        url (str): base url of the server
+        options (argparse.Namespace): load test options
+        first_index (int): number of the first session
+
+    Returns:
+        list of dict: session results as returned by run_session
+
+    """
+    results = [None] * count
+    tmp_dir = use_fake_server(url, options)
+
+    def _session(offset):
+        time.sleep(options.ramp * offset / max(1, count))
+        results[offset] = run_session(first_index + offset, options)
+
+    threads = [threading.Thread(target=_session, args=(_,)) for _ in range(count)]
+    try:
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+
+def _run_process_share(args):
+    """Run a share of the sessions in a worker process.
+
+    Args:
+        args (tuple): (count, url, options, first_index)
+
+    Returns:
+        list of dict: session results
+
+    """
+    return run_sessions(*args)
+
+
+def run_load_test(options):
+    """Start the fake server and run the sessions against it.
+
+    Args:
+        options (argparse.Namespace): load test options, as parsed by parse_args
+
+    Returns:
+        OrderedDict: summary as returned by summarize
+
+    """
+    server = FakeJiraServer(options.latency, options.jitter, options.capacity, options.error_rate,
+                            options.throttle_rate, options.throttle_burst, options.outage).start()
+    start = time.time()
+    try:
+        processes = max(1, min(options.processes, options.sessions))
+        if processes == 1:
+            results = run_sessions(options.sessions, server.url, options)
+        else:
+            shares = [options.sessions // processes + (1 if _ < options.sessions % processes else 0)
+                      for _ in range(processes)]
+            pool = Pool(processes)
+            try:
+                results = sum(pool.map(_run_process_share, [(share, server.url, options, sum(shares[:_]))
+                                                            for _, share in enumerate(shares)]), [])
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        server.stop()
+    return summarize(results, server.stats, time.time() - start, options)
+
+
+def get_percentile(values, fraction):
+    """Get a percentile of some values.
+
+    Args:
+        values (list): sorted values
+        fraction (float): percentile as a fraction, e.g. 0.99
+
+    Returns:
+        float: value, None if there are no values
+
+    """
+    if not values:
+        return None
+    return values[int(round(fraction * (len(values) - 1)))]
+
+
+def summarize(results, server_stats, seconds, options=None):
+    """Summarize the session results.
+
+    Args:
+        results (list of dict): as returned by run_session
+        server_stats (dict): FakeJiraServer.stats
+        seconds (float): wall clock time of the whole test
+        options (argparse.Namespace): load test options, included in the summary
+
+    Returns:
+        OrderedDict: summary
+
+    """
+    latencies = sorted(_['latency'] for _ in results if _['latency'] is not None)
+    filed = [_ for _ in results if not _['failure']]
+    failures = {}
+    for result in results:
+        if result['failure']:
+            failures[result['failure']] = failures.get(result['failure'], 0) + 1
+
+    return OrderedDict([
+        ('options', vars(options) if options else None),
+        ('sessions', len(results)),
+        ('filed', len(filed)),
+        ('failed', len(results) - len(filed)),
+        ('seconds', seconds),
+        ('throughput', len(filed) / seconds if seconds else 0.0),
+        ('latency', OrderedDict([("p{0:g}".format(_ * 100), get_percentile(latencies, _))
+                                 for _ in DN_LOAD_TEST_PERCENTILES] +
+                                [('max', latencies[-1] if latencies else None)])),
+        ('queued_tickets', sum(1 for _ in results if _['queued_ticket'])),
+        ('retries', sum(_['retries'] for _ in results)),
+        ('retried_sessions', sum(1 for _ in results if _['retries'])),
+        ('queued_seconds_mean', sum(_['queued_seconds'] for _ in results) / len(results) if results else 0.0),
+        ('queued_seconds_max', max([_['queued_seconds'] for _ in results] or [0.0])),
+        ('server', server_stats),
+        ('failure_modes', OrderedDict(sorted(failures.items(), key=lambda _: -_[1])))])
+
+
+def format_report(summary):
+    """Format a summary for the console.
+
+    Args:
+        summary (dict): as returned by summarize
+
+    Returns:
+        str: report text
+
+    """
+    def _seconds(value):
+        return "-" if value is None else "{0:.2f}s".format(value)
+
+    lines = ["{0} sessions in {1:.1f}s: {2} tickets filed, {3} failed, {4} queued while the server was down".format(
+                 summary['sessions'], summary['seconds'], summary['filed'], summary['failed'],
+                 summary['queued_tickets']),
+             "throughput {0:.2f} tickets/s".format(summary['throughput']),
+             "latency to issue created: {0}".format(", ".join("{0} {1}".format(name, _seconds(value))
+                                                              for name, value in summary['latency'].items())),
+             "throttle retries {0} in {1} sessions, client queueing mean {2} max {3}".format(
+                 summary['retries'], summary['retried_sessions'], _seconds(summary['queued_seconds_mean']),
+                 _seconds(summary['queued_seconds_max'])),
+             "server: {0}".format(", ".join("{0} {1}".format(_, summary['server'][_]) for _ in summary['server']))]
+    if summary['failure_modes']:
+        lines.append("failure modes:")
+        lines += ["    {0:>5}  {1}".format(count, failure) for failure, count in summary['failure_modes'].items()]
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    """Parse command line arguments.
+
+    Args:
+        argv (list): arguments, defaults to sys.argv[1:]
+
+    Returns:
+        argparse.Namespace: load test options
+
+    """
+    parser = argparse.ArgumentParser(prog="jiraticketsubmitter.LoadTest",
+                                     description="Load test the submitter's JIRA calls against a local fake server.")
+    parser.add_argument("--sessions", type=int, default=300, help="artist sessions filing a ticket")
+    parser.add_argument("--processes", type=int, default=1, help="processes the sessions are spread over")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which the sessions start")
+    parser.add_argument("--project", default="LOAD", help="project of the tickets")
+    parser.add_argument("--open-cost", type=float, default=0.0, help="seconds each session spends opening")
+    parser.add_argument("--timeout", type=float, default=300.0,
+                        help="seconds a session keeps trying to reach the server")
+    parser.add_argument("--latency", type=float, default=0.1, help="mean seconds the server takes per request")
+    parser.add_argument("--jitter", type=float, default=0.05, help="standard deviation of the request time")
+    parser.add_argument("--capacity", type=int, default=50, help="requests the server handles at the same time")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with a 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="requests per second the server accepts before answering 429, 0 for no limit")
+    parser.add_argument("--throttle-burst", type=int, default=20, help="requests accepted at once when quiet")
+    parser.add_argument("--outage", type=float, default=0.0, help="seconds the server is down at the start")
+    parser.add_argument("--reset-timeout", type=float, default=CircuitBreaker.DN_CIRCUIT_RESET_TIMEOUT,
+                        help="seconds a session's circuit breaker stays open before it probes the server")
+    parser.add_argument("--description-size", type=int, default=8 * 1024, help="bytes of the description comment")
+    parser.add_argument("--attachment-sizes", type=int, nargs="*", default=[2 * 1024, 4 * 1024],
+                        help="bytes of each attachment, by default the environment diff and the auto info")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the load test and print the report.
+
+    Args:
+        argv (list): arguments, defaults to sys.argv[1:]
+
+    Returns:
+        int: exit code, 0 if every ticket was filed
+
+    """
+    options = parse_args(argv)
+    summary = run_load_test(options)
+    print json.dumps(summary, indent=1) if options.json else format_report(summary)
+    return 0 if not summary['failed'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
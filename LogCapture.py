@@ -0,0 +1,176 @@
+"""Module containing the bounded tail capture of the session's console and log files.
+
+Support nearly always asks the artist for the shell output. The last few kilobytes of the session's log files are
+attached to the ticket instead. Only the tail of each file is read, by seeking, so multi-gigabyte logs cost the same
+as small ones. Collection runs on a background thread started once the dialog is open and is picked up when the
+ticket is created.
+
+Logs are the session's stdout and stderr when they are redirected to files, plus any files matching the colon
+separated glob patterns in $DN_HOUDINI_JIRA_LOG_FILES.
+"""
+
+# standard Python modules
+import glob
+import os
+import threading
+
+# extra log files to capture, colon separated glob patterns, environment variables are expanded
+DN_LOG_FILES_ENV = "DN_HOUDINI_JIRA_LOG_FILES"
+
+# most bytes read from the end of each file
+DN_LOG_TAIL_BYTES = 64 * 1024
+
+# most bytes captured over all files, the most recently modified files are captured first
+DN_LOG_TAIL_TOTAL_BYTES = 256 * 1024
+
+# most files captured
+DN_LOG_MAX_FILES = 8
+
+# longest the ticket waits for a capture still running when it is created (seconds)
+DN_LOG_CAPTURE_WAIT = 2.0
+
+
+# ----------------------------------------------------
+# classes defined for this module
+# ----------------------------------------------------
+
+
+class LogCapture(object):
+    """Tail capture running on a daemon thread.
+
+    Args:
+        paths (list): log files to capture, defaults to get_log_paths()
+
+    """
+
+    def __init__(self, paths=None):
+        """Initialize the capture, call start() to run it."""
+        self.paths = paths
+        self.attachments = []
+        self._thread = threading.Thread(target=self._capture)
+        self._thread.daemon = True
+
+    def start(self):
+        """Start capturing in the background.
+
+        Returns:
+            LogCapture: self
+
+        """
+        self._thread.start()
+        return self
+
+    def get_attachments(self, timeout=DN_LOG_CAPTURE_WAIT):
+        """Get the captured tails, waiting a little for a capture still running.
+
+        Args:
+            timeout (float): how long to wait (seconds)
+
+        Returns:
+            list of tuple: (file name, data) pairs, empty if the capture did not finish in time
+
+        """
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print "{0}: log capture did not finish in time, no logs attached".format(__name__)
+            return []
+        return list(self.attachments)
+
+    def _capture(self):
+        """Read the tail of each log file, within the per file and total caps."""
+        paths = self.paths if self.paths is not None else get_log_paths()
+        budget = DN_LOG_TAIL_TOTAL_BYTES
+        names = set()
+        for path in paths:
+            if budget <= 0:
+                break
+            try:
+                data = read_tail(path, min(DN_LOG_TAIL_BYTES, budget))
+            except (IOError, OSError):
+                continue
+            if not data:
+                continue
+
+            budget -= len(data)
+            name = "{0}.tail.txt".format(os.path.basename(path))
+            while name in names:
+                name = "_{0}".format(name)
+            names.add(name)
+            self.attachments.append((name, data))
+
+
+# ----------------------------------------------------
+# functions defined for this module
+# ----------------------------------------------------
+
+
+def get_log_paths():
+    """Get the session's log files, most recently modified first.
+
+    Returns:
+        list: log file paths, at most DN_LOG_MAX_FILES
+
+    """
+    paths = set()
+
+    # console output, when the session was started with it redirected to a file
+    for fd in (1, 2):
+        try:
+            path = os.readlink("/proc/self/fd/{0}".format(fd))
+        except OSError:
+            continue
+        if os.path.isfile(path):
+            paths.add(path)
+
+    for pattern in os.environ.get(DN_LOG_FILES_ENV, "").split(":"):
+        if pattern:
+            paths.update(_ for _ in glob.glob(os.path.expandvars(os.path.expanduser(pattern))) if os.path.isfile(_))
+
+    def _mtime(path):
+        """Get modification time, 0 if the file went away."""
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0
+
+    return sorted(paths, key=_mtime, reverse=True)[:DN_LOG_MAX_FILES]
+
+
+def read_tail(path, max_bytes=DN_LOG_TAIL_BYTES):
+    """Read the end of a file without reading the rest of it.
+
+    Args:
+        path (str): file to read
+        max_bytes (int): most bytes to read
+
+    Raises:
+        IOError: file can't be read
+
+    Returns:
+        str: last whole lines of the file, within max_bytes
+
+    """
+    with open(path, "rb") as _file:
+        _file.seek(0, os.SEEK_END)
+        size = _file.tell()
+        offset = max(0, size - max_bytes)
+        _file.seek(offset)
+        data = _file.read(size - offset)
+
+    # drop the partial first line when starting mid file
+    if offset and "\n" in data:
+        data = data[data.index("\n") + 1:]
+    return data
+
+
+def start_capture(paths=None):
+    """Start capturing log tails in the background.
+
+    Args:
+        paths (list): log files to capture, defaults to get_log_paths()
+
+    Returns:
+        LogCapture: running capture
+
+    """
+    return LogCapture(paths).start()
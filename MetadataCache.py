@@ -0,0 +1,180 @@
+"""Module containing the on-disk cache of JIRA create-metadata used to populate the submitter dialog.
+
+Project, issue-type, priority and component metadata hardly ever changes, so it is kept on local disk per jira
+server and project. Reads never go to the server, stale or missing entries are refreshed on a background thread.
+"""
+
+# standard Python modules
+import json
+import os
+import tempfile
+import threading
+import time
+
+# bump when the layout of the cached data changes, older files are then ignored
+DN_METADATA_CACHE_VERSION = 1
+
+# how long cached metadata is trusted before it is revalidated in the background (seconds)
+DN_METADATA_CACHE_TTL = 7 * 24 * 3600.0
+
+# local per user cache directory
+DN_JIRA_LOCAL_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "houdini_jira_submitter")
+
+# in memory copy of the metadata read this session, keyed by (jira_server, project)
+_METADATA = {}
+
+# (jira_server, project) keys currently being refreshed
+_REFRESHING = set()
+_LOCK = threading.Lock()
+
+
+def get_metadata(jira_server='jira', project='PTSUP', revalidate=True):
+    """Get create-metadata for a project without a JIRA round trip.
+
+    Args:
+        jira_server (str): name of jira server to use
+        project (str): project key
+        revalidate (bool): refresh in the background if the cached data is missing or older than the TTL
+
+    Returns:
+        dict: cached metadata with 'priorities', 'issue_types' and 'components' lists, None if nothing is cached yet
+
+    """
+    key = (jira_server, project)
+    metadata = _METADATA.get(key)
+    if metadata is None:
+        metadata = read_metadata(jira_server, project)
+        if metadata is not None:
+            _METADATA[key] = metadata
+
+    if revalidate and (metadata is None or time.time() - metadata['fetched_at'] > DN_METADATA_CACHE_TTL):
+        refresh_metadata_in_background(jira_server, project)
+
+    return metadata
+
+
+def get_cache_path(jira_server, project):
+    """Get the cache file path for a jira server and project.
+
+    Args:
+        jira_server (str): name of jira server
+        project (str): project key
+
+    Returns:
+        str: path to cache file
+
+    """
+    file_name = "createmeta_{0}_{1}.json".format(jira_server.replace(os.sep, "_").replace(":", "_"), project)
+    return os.path.join(DN_JIRA_LOCAL_CACHE_DIR, file_name)
+
+
+def read_metadata(jira_server, project):
+    """Read cached metadata from disk.
+
+    Args:
+        jira_server (str): name of jira server
+        project (str): project key
+
+    Returns:
+        dict: cached metadata, None if missing, unreadable or from another cache version
+
+    """
+    try:
+        with open(get_cache_path(jira_server, project), "r") as _file:
+            metadata = json.load(_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+    if metadata.get('version') != DN_METADATA_CACHE_VERSION:
+        return None
+    return metadata
+
+
+def write_metadata(metadata):
+    """Write metadata to disk, replacing the file atomically so readers never see a partial file.
+
+    Args:
+        metadata (dict): metadata as returned by fetch_metadata
+
+    """
+    path = get_cache_path(metadata['server'], metadata['project'])
+    if not os.path.isdir(DN_JIRA_LOCAL_CACHE_DIR):
+        os.makedirs(DN_JIRA_LOCAL_CACHE_DIR)
+
+    fd, tmp_path = tempfile.mkstemp(dir=DN_JIRA_LOCAL_CACHE_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as _file:
+        json.dump(metadata, _file, indent=1, sort_keys=True)
+    os.rename(tmp_path, path)
+
+
+def fetch_metadata(jira_server, project):
+    """Fetch create-metadata from the server.
+
+    Args:
+        jira_server (str): name of jira server
+        project (str): project key
+
+    Returns:
+        dict: metadata ready to be cached
+
+    """
+    from jiraticketsubmitter.HoudiniTicket import get_jira_connection
+    jira = get_jira_connection(server=jira_server)
+
+    meta = jira.createmeta(projectKeys=project)
+    projects = meta.get('projects', [])
+    issue_types = [_['name'] for _ in projects[0].get('issuetypes', [])] if projects else []
+
+    return {'version': DN_METADATA_CACHE_VERSION,
+            'server': jira_server,
+            'project': project,
+            'fetched_at': time.time(),
+            'priorities': [_.name for _ in jira.priorities()],
+            'issue_types': issue_types,
+            'components': [_.name for _ in jira.project_components(project)]}
+
+
+def refresh_metadata(jira_server='jira', project='PTSUP'):
+    """Fetch metadata from the server and update the caches.
+
+    Args:
+        jira_server (str): name of jira server
+        project (str): project key
+
+    Returns:
+        dict: fresh metadata
+
+    """
+    metadata = fetch_metadata(jira_server, project)
+    _METADATA[(jira_server, project)] = metadata
+    write_metadata(metadata)
+    return metadata
+
+
+def refresh_metadata_in_background(jira_server='jira', project='PTSUP'):
+    """Refresh metadata on a daemon thread, unless a refresh for the same key is already running.
+
+    Args:
+        jira_server (str): name of jira server
+        project (str): project key
+
+    """
+    key = (jira_server, project)
+    with _LOCK:
+        if key in _REFRESHING:
+            return
+        _REFRESHING.add(key)
+
+    # noinspection PyBroadException
+    def _refresh():
+        try:
+            refresh_metadata(jira_server, project)
+        except Exception as e:
+            print "{0}: could not refresh JIRA metadata for {1} on {2}: {3}".format(__name__, project, jira_server, e)
+        finally:
+            with _LOCK:
+                _REFRESHING.discard(key)
+
+    thread = threading.Thread(target=_refresh)
+    thread.daemon = True
+    thread.start()
@@ -0,0 +1,194 @@
+"""Module containing the "profile and submit" mode of node tickets.
+
+Records a performance monitor profile of a forced recook of the submitted node, so "this node is slow" tickets come
+with hard numbers. A single cook can't be stopped from python, so a frame is only cooked if it is expected to finish
+within the time limit, going by the node's last cook for the first frame and the frames cooked so far after that. The
+profile is saved gzipped next to the jira hip snapshot and the top costs recorded in it are summarized in the
+description.
+"""
+
+# standard Python modules
+from collections import namedtuple
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+
+# SESI supplied modules
+import hou
+
+# local modules
+from jiraticketsubmitter import HipFileUtils
+
+# frames cooked from the current frame on, as long as the time limit allows, at least one frame is always cooked
+DN_PROFILE_MAX_FRAMES = 3
+
+# time after which no more frames are cooked (seconds)
+DN_PROFILE_TIME_LIMIT = 30.0
+
+# most nodes listed in the description summary
+DN_PROFILE_TOP_COSTS = 10
+
+# cook cost of one node recorded in a profile, cook_time in ms
+ProfileCost = namedtuple("ProfileCost", ["path", "type", "cook_time", "cooks"])
+
+# result of profiling a node, stopped_by is None if all frames were cooked
+ProfileResult = namedtuple("ProfileResult", ["node_path", "frames", "seconds", "stopped_by", "top_costs",
+                                             "profile_file", "error"])
+
+
+def profile_node(node, max_frames=DN_PROFILE_MAX_FRAMES, time_limit=DN_PROFILE_TIME_LIMIT):
+    """Force a recook of a node while the performance monitor records.
+
+    Args:
+        node (hou.Node): node to profile
+        max_frames (int): most frames to cook from the current frame on
+        time_limit (float): no frame expected to end after this long is started, the first frame always is (seconds)
+
+    Returns:
+        ProfileResult: cook timings, profile_file is a temporary .hperf file to hand to save_profile
+
+    """
+    options = hou.PerfMonRecordOptions(cook_stats=True, solve_stats=True, draw_stats=False, gpu_draw_stats=False,
+                                       viewport_stats=False, script_stats=False, render_stats=False,
+                                       thread_stats=False, frame_stats=False, memory_stats=True, errors=True)
+    profile = hou.perfMon.startProfile("JIRA ticket profile of {0}".format(node.path()), options)
+
+    start = time.time()
+    frames = 0
+    stopped_by = None
+    error = None
+    try:
+        with hou.InterruptableOperation("Profiling {0} for JIRA ticket".format(node.path()),
+                                        open_interrupt_dialog=hou.isUIAvailable()):
+            frame = hou.frame()
+            while frames < max_frames:
+                # a running cook can't be stopped, only start a frame the mean frame time so far says will finish
+                elapsed = time.time() - start
+                if frames and elapsed + elapsed / frames > time_limit:
+                    stopped_by = "time limit"
+                    break
+                node.cook(force=True, frame_range=(frame + frames, frame + frames))
+                frames += 1
+    except hou.OperationInterrupted:
+        stopped_by = "interrupted"
+    except hou.Error as e:
+        error = e.instanceMessage()
+    finally:
+        # never leave the performance monitor recording
+        seconds = time.time() - start
+        profile.stop()
+
+    fd, profile_file = tempfile.mkstemp(suffix=".hperf")
+    os.close(fd)
+    try:
+        profile.save(profile_file)
+    except hou.Error:
+        os.remove(profile_file)
+        profile_file = None
+
+    return ProfileResult(node.path(), frames, seconds, stopped_by, get_profile_costs(profile)[:DN_PROFILE_TOP_COSTS],
+                         profile_file, error)
+
+
+def get_profile_costs(profile):
+    """Read the per node cook times recorded in a profile, most expensive first.
+
+    Args:
+        profile (hou.PerfMonProfile): stopped profile
+
+    Returns:
+        list of ProfileCost: self cook time of each node, empty if the profile's stats can't be read
+
+    """
+    try:
+        stats = profile.stats()
+        stats = json.loads(stats) if isinstance(stats, basestring) else stats
+        cook_stats = stats.get('cookStats') or {}
+    except (hou.Error, AttributeError, ValueError):
+        return []
+
+    # rows are keyed by node path, either as dicts or as lists in the order of the headers
+    headers = [_.lower() for _ in cook_stats.get('headers', [])]
+    rows = cook_stats.get('stats', cook_stats)
+    costs = []
+    for path, values in rows.items() if isinstance(rows, dict) else []:
+        if not isinstance(path, basestring) or not path.startswith("/"):
+            continue
+        if isinstance(values, (list, tuple)):
+            values = dict(zip(headers, values))
+        if not isinstance(values, dict):
+            continue
+        values = dict((str(name).lower(), value) for name, value in values.items())
+        cook_time = next((value for name, value in sorted(values.items())
+                          if "self" in name and "time" in name), values.get('time'))
+        if cook_time is None:
+            continue
+        node = hou.node(path)
+        costs.append(ProfileCost(path, node.type().nameWithCategory() if node else "", float(cook_time),
+                                 values.get('count')))
+    return sorted(costs, key=lambda _: -_.cook_time)
+
+
+def save_profile(result, submission_hip_file, priority=None):
+    """Gzip a profile next to the jira hip snapshot and transfer it to the remote site(s) along with it.
+
+    Args:
+        result (ProfileResult): as returned by profile_node
+        submission_hip_file (str): saved hip file, None if it could not be saved
+        priority (str): priority of the ticket, decides how urgently the profile is transferred
+
+    Returns:
+        str: path of the saved profile, None if there is no profile to save
+
+    """
+    if not result.profile_file:
+        return None
+    if not submission_hip_file:
+        os.remove(result.profile_file)
+        return None
+
+    profile_path = "{0}_profile.hperf.gz".format(os.path.splitext(submission_hip_file)[0])
+    try:
+        with open(result.profile_file, "rb") as source, gzip.open(profile_path, "wb") as target:
+            shutil.copyfileobj(source, target)
+    except (IOError, OSError) as e:
+        print "{0}: could not save profile {1}: {2}".format(__name__, profile_path, e)
+        return None
+    finally:
+        os.remove(result.profile_file)
+
+    HipFileUtils.transfer_hip(profile_path, priority)
+    return profile_path
+
+
+def format_summary(result, profile_path=None):
+    """Format the top costs of a profile for the ticket description.
+
+    Args:
+        result (ProfileResult): as returned by profile_node
+        profile_path (str): saved profile, as returned by save_profile
+
+    Returns:
+        str: section text
+
+    """
+    text = "Profile of forced recook of {0}: {1} frame(s) in {2:.2f} s{3}\n".format(
+        result.node_path, result.frames, result.seconds,
+        " (stopped by {0})".format(result.stopped_by) if result.stopped_by else "")
+    if result.error:
+        text += "Cook error: {0}\n".format(result.error)
+    text += "Performance monitor profile: {0}\n".format(profile_path or "not saved")
+
+    if result.top_costs:
+        text += "||Node||Type||Self cook ms||Cooks||\n"
+        for row in result.top_costs:
+            text += "|{0}|{1}|{2:.1f}|{3}|\n".format(row.path, row.type, row.cook_time,
+                                                     "-" if row.cooks is None else row.cooks)
+    elif not result.frames and result.stopped_by == "time limit":
+        text += "The node was not cooked, its last cook would have run past the time limit\n"
+    else:
+        text += "Per node cook times could not be read back, they are in the profile\n"
+    return text
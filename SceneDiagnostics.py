@@ -0,0 +1,148 @@
+"""Module containing the scene diagnostics added to node tickets.
+
+Walks the submitted node's subtree and everything upstream of it, reading the errors, warnings and cook times Houdini
+already holds for each node. Nothing is cooked. The walk stops at a node count and a time budget so a huge network
+can't hold up opening the dialog, and the result is added to the description as a compact table.
+"""
+
+# standard Python modules
+from collections import deque, namedtuple
+import time
+
+# SESI supplied modules
+import hou
+
+# most nodes visited by the walk
+DN_DIAGNOSTICS_MAX_NODES = 500
+
+# time the walk may take, a small slice of the dialog's time to first paint (seconds)
+DN_DIAGNOSTICS_TIME_BUDGET = 0.005
+
+# most rows in the table, nodes with errors come first, then warnings, then the slowest cooks
+DN_DIAGNOSTICS_MAX_ROWS = 15
+
+# longest message kept per node (characters)
+DN_DIAGNOSTICS_MAX_MESSAGE = 100
+
+# what is known about one node
+NodeDiagnostics = namedtuple("NodeDiagnostics", ["path", "type", "errors", "warnings", "cook_time", "needs_cook"])
+
+# result of a walk, stopped_by is None if the whole network was walked
+DiagnosticsResult = namedtuple("DiagnosticsResult", ["nodes", "visited", "seconds", "stopped_by"])
+
+
+def get_node_diagnostics(node):
+    """Read the cached state of a node, without cooking it.
+
+    Args:
+        node (hou.Node): node to read
+
+    Returns:
+        NodeDiagnostics: node state, cook_time of the last cook in ms is None if this Houdini version does not
+            keep it
+
+    """
+    last_cook_time = getattr(node, 'lastCookTime', None)
+    try:
+        needs_cook = node.needsToCook()
+    except hou.Error:
+        needs_cook = None
+    return NodeDiagnostics(node.path(), node.type().nameWithCategory(), node.errors(), node.warnings(),
+                           last_cook_time() if last_cook_time else None, needs_cook)
+
+
+def collect_diagnostics(node, max_nodes=DN_DIAGNOSTICS_MAX_NODES, time_budget=DN_DIAGNOSTICS_TIME_BUDGET):
+    """Walk a node's subtree and upstream nodes breadth first, closest nodes first.
+
+    Args:
+        node (hou.Node or list of hou.Node): submitted node, or nodes walked together
+        max_nodes (int): stop after this many nodes
+        time_budget (float): stop after this long (seconds)
+
+    Returns:
+        DiagnosticsResult: what was found
+
+    """
+    start = time.time()
+    nodes = []
+    seen = set()
+    pending = deque()
+    for root in node if isinstance(node, (list, tuple)) else [node]:
+        if root.sessionId() not in seen:
+            seen.add(root.sessionId())
+            pending.append(root)
+    stopped_by = None
+
+    while pending:
+        if len(nodes) >= max_nodes:
+            stopped_by = "node limit"
+            break
+        if time.time() - start > time_budget:
+            stopped_by = "time budget"
+            break
+
+        current = pending.popleft()
+        try:
+            nodes.append(get_node_diagnostics(current))
+            neighbours = list(current.inputs()) + list(current.children())
+        except hou.ObjectWasDeleted:
+            continue
+
+        for neighbour in neighbours:
+            if neighbour is not None and neighbour.sessionId() not in seen:
+                seen.add(neighbour.sessionId())
+                pending.append(neighbour)
+
+    return DiagnosticsResult(nodes, len(nodes), time.time() - start, stopped_by)
+
+
+def get_notable_nodes(diagnostics, max_rows=DN_DIAGNOSTICS_MAX_ROWS):
+    """Get the nodes worth looking at, with errors first, then warnings, then the slowest cooks.
+
+    Args:
+        diagnostics (DiagnosticsResult): as returned by collect_diagnostics
+        max_rows (int): most nodes to return
+
+    Returns:
+        list: NodeDiagnostics
+
+    """
+    rows = sorted(diagnostics.nodes, key=lambda _: (not _.errors, not _.warnings, -(_.cook_time or 0.0)))
+    return [_ for _ in rows if _.errors or _.warnings or _.cook_time][:max_rows]
+
+
+def format_table(diagnostics, max_rows=DN_DIAGNOSTICS_MAX_ROWS):
+    """Format diagnostics as a JIRA table, only listing the nodes worth looking at.
+
+    Args:
+        diagnostics (DiagnosticsResult): as returned by collect_diagnostics
+        max_rows (int): most rows to list
+
+    Returns:
+        str: section text
+
+    """
+    def _message(messages):
+        """Shorten a node's messages to fit in a table cell."""
+        text = " / ".join(" ".join(_.split()) for _ in messages)
+        if len(text) > DN_DIAGNOSTICS_MAX_MESSAGE:
+            text = text[:DN_DIAGNOSTICS_MAX_MESSAGE - 3] + "..."
+        return text.replace("|", "/") or " "
+
+    errors = sum(1 for _ in diagnostics.nodes if _.errors)
+    warnings = sum(1 for _ in diagnostics.nodes if _.warnings)
+    text = "Scene diagnostics: {0} nodes walked in {1:.0f} ms{2}, {3} with errors, {4} with warnings\n".format(
+        diagnostics.visited, diagnostics.seconds * 1000.0,
+        " (stopped at {0})".format(diagnostics.stopped_by) if diagnostics.stopped_by else "", errors, warnings)
+
+    rows = get_notable_nodes(diagnostics, max_rows)
+    if not rows:
+        return text
+
+    text += "||Node||Type||Cook ms||Dirty||Errors||Warnings||\n"
+    for row in rows:
+        text += "|{0}|{1}|{2}|{3}|{4}|{5}|\n".format(
+            row.path, row.type, "{0:.1f}".format(row.cook_time) if row.cook_time is not None else "-",
+            "-" if row.needs_cook is None else ("yes" if row.needs_cook else "no"),
+            _message(row.errors), _message(row.warnings))
+    return text
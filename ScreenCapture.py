@@ -0,0 +1,234 @@
+"""Module containing the scene viewer and network editor screenshots attached to tickets.
+
+Half of the "looks wrong" tickets come with nothing to look at. When the submitter opens, the pixels of the current
+scene viewer and network editor are grabbed on the main thread, which only takes a few milliseconds. Downscaling and
+JPEG encoding, the slow part, run on a daemon thread while the artist types, within DN_SCREENSHOT_TOTAL_BYTES over all
+images. The screenshots are picked up when the ticket is created, if the artist kept them.
+
+Set $DN_HOUDINI_JIRA_SCREENSHOTS to 0 to never grab the screen.
+"""
+
+# standard Python modules
+import os
+import threading
+import time
+
+# SESI supplied modules
+import hou
+from qtswitch import QtCore, QtGui
+
+# set this environment variable to 0 to never grab the screen
+DN_SCREENSHOT_ENV_VAR = "DN_HOUDINI_JIRA_SCREENSHOTS"
+
+# pane tabs grabbed, with the name of their screenshot
+DN_SCREENSHOT_PANES = (("scene_viewer", hou.paneTabType.SceneViewer),
+                       ("network_editor", hou.paneTabType.NetworkEditor))
+
+# longest side of a screenshot (pixels)
+DN_SCREENSHOT_MAX_SIDE = 1600
+
+# screenshots are scaled down further until they fit, but not below this (pixels)
+DN_SCREENSHOT_MIN_SIDE = 400
+
+# JPEG quality of the screenshots
+DN_SCREENSHOT_QUALITY = 85
+
+# most bytes attached over all screenshots
+DN_SCREENSHOT_TOTAL_BYTES = 1024 * 1024
+
+# longest the ticket waits for encoding still running when it is created (seconds)
+DN_SCREENSHOT_WAIT = 2.0
+
+# captures started before the submitter opened are not used once this old (seconds)
+DN_SCREENSHOT_PENDING_MAX_AGE = 60.0
+
+# capture started before the submitter pane opened, taken by the dialog
+_PENDING = None
+
+
+# ----------------------------------------------------
+# classes defined for this module
+# ----------------------------------------------------
+
+
+class ScreenCapture(object):
+    """Screenshots grabbed on the main thread and encoded on a daemon thread.
+
+    Args:
+        images (list): (name, QtGui.QImage) pairs as returned by grab_panes()
+
+    """
+
+    def __init__(self, images):
+        """Initialize the capture, call start() to encode the images."""
+        self.images = images
+        self.attachments = []
+        self.grab_ms = None
+        self.grabbed_at = time.time()
+        self._thread = threading.Thread(target=self._encode)
+        self._thread.daemon = True
+
+    def start(self):
+        """Start encoding in the background.
+
+        Returns:
+            ScreenCapture: self
+
+        """
+        self._thread.start()
+        return self
+
+    def get_attachments(self, timeout=DN_SCREENSHOT_WAIT):
+        """Get the encoded screenshots, waiting a little for encoding still running.
+
+        Args:
+            timeout (float): how long to wait (seconds)
+
+        Returns:
+            list of tuple: (file name, data) pairs, empty if encoding did not finish in time
+
+        """
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print "{0}: screenshots were not encoded in time, none attached".format(__name__)
+            return []
+        return list(self.attachments)
+
+    def _encode(self):
+        """Downscale and encode each image, sharing the byte budget between the images left."""
+        budget = DN_SCREENSHOT_TOTAL_BYTES
+        for index, (name, image) in enumerate(self.images):
+            data = encode_image(image, budget // (len(self.images) - index))
+            if data is None:
+                print "{0}: {1} screenshot does not fit in the attachment size cap".format(__name__, name)
+                continue
+            budget -= len(data)
+            self.attachments.append(("{0}.jpg".format(name), data))
+        self.images = []
+
+
+# ----------------------------------------------------
+# functions defined for this module
+# ----------------------------------------------------
+
+
+def is_enabled():
+    """Check whether screenshots may be grabbed in this session.
+
+    Returns:
+        bool: True if there is a UI and screenshots are not turned off
+
+    """
+    return hou.isUIAvailable() and os.environ.get(DN_SCREENSHOT_ENV_VAR, "1") not in ("", "0")
+
+
+def grab_rect(rect):
+    """Grab the screen pixels of a rectangle, must be called on the main thread.
+
+    Args:
+        rect (QtCore.QRect): screen coordinates
+
+    Returns:
+        QtGui.QImage: pixels, None if nothing could be grabbed
+
+    """
+    # Qt5 grabs through the screen, Qt4 through the desktop window
+    application = QtGui.QApplication
+    if hasattr(application, 'primaryScreen'):
+        pixmap = application.primaryScreen().grabWindow(0, rect.x(), rect.y(), rect.width(), rect.height())
+    else:
+        pixmap = QtGui.QPixmap.grabWindow(application.desktop().winId(), rect.x(), rect.y(), rect.width(),
+                                          rect.height())
+    return None if pixmap.isNull() else pixmap.toImage()
+
+
+def grab_panes():
+    """Grab the current scene viewer and network editor, must be called on the main thread.
+
+    Returns:
+        list: (name, QtGui.QImage) pairs of the panes found on screen
+
+    """
+    images = []
+    for name, pane_type in DN_SCREENSHOT_PANES:
+        pane_tab = hou.ui.paneTabOfType(pane_type)
+        if pane_tab is None or not pane_tab.isCurrentTab():
+            continue
+        try:
+            image = grab_rect(pane_tab.qtScreenGeometry())
+        except (AttributeError, hou.Error):
+            # no screen geometry for pane tabs in this Houdini version
+            continue
+        if image is not None:
+            images.append((name, image))
+    return images
+
+
+def encode_image(image, max_bytes, max_side=DN_SCREENSHOT_MAX_SIDE):
+    """Downscale and JPEG encode an image, scaling it down further until it fits.
+
+    Args:
+        image (QtGui.QImage): pixels
+        max_bytes (int): most bytes the encoded image may take
+        max_side (int): longest side of the encoded image (pixels)
+
+    Returns:
+        str: JPEG data, None if the image does not fit even at DN_SCREENSHOT_MIN_SIDE
+
+    """
+    side = max_side
+    while side >= DN_SCREENSHOT_MIN_SIDE:
+        scaled = image
+        if max(image.width(), image.height()) > side:
+            scaled = image.scaled(side, side, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+
+        byte_array = QtCore.QByteArray()
+        buffer_ = QtCore.QBuffer(byte_array)
+        buffer_.open(QtCore.QIODevice.WriteOnly)
+        scaled.save(buffer_, "JPG", DN_SCREENSHOT_QUALITY)
+        buffer_.close()
+
+        data = byte_array.data()
+        if len(data) <= max_bytes:
+            return data
+        side = min(side, max(scaled.width(), scaled.height())) // 2
+    return None
+
+
+def start_capture():
+    """Grab the panes now and start encoding them in the background, must be called on the main thread.
+
+    Returns:
+        ScreenCapture: running capture, None if screenshots are turned off or no pane was found
+
+    """
+    if not is_enabled():
+        return None
+
+    start = time.time()
+    images = grab_panes()
+    if not images:
+        return None
+    capture = ScreenCapture(images)
+    capture.grab_ms = (time.time() - start) * 1000.0
+    return capture.start()
+
+
+def capture_before_open():
+    """Grab the panes before the submitter pane opens over them, for the dialog to take with take_capture()."""
+    global _PENDING
+    _PENDING = start_capture()
+
+
+def take_capture():
+    """Take the capture started before the submitter opened, or grab the panes now if there is none.
+
+    Returns:
+        ScreenCapture: running capture, None if screenshots are turned off or no pane was found
+
+    """
+    global _PENDING
+    capture, _PENDING = _PENDING, None
+    if capture is None or time.time() - capture.grabbed_at > DN_SCREENSHOT_PENDING_MAX_AGE:
+        capture = start_capture()
+    return capture
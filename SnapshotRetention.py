@@ -0,0 +1,619 @@
+"""Module containing the retention of the hip snapshots saved in each shot's hip/<user>/jira folder.
+
+Every ticket saves a timestamped hip file, and the files saved next to it, into the jira folder of the shot and
+user, and nothing used to remove them. Each jira folder is now held to an age, count and total size policy, from
+the show's DN_RETENTION_POLICY_FILE when it has one:
+
+    {"default": {"max_age_days": 30, "max_count": 20, "max_size_mb": 5120},
+     "shots": {"sq010_sh0100": {"max_count": 50}},
+     "users": {"jdoe": {"max_age_days": 90}}}
+
+Each folder keeps a small index of its snapshots, their sizes and tickets in DN_RETENTION_INDEX. The folder is only
+listed again when its mtime changed since the index was written, and only the folders this user saved snapshots to
+are visited, so no tree is ever walked. A snapshot is only removed once every ticket it belongs to is resolved, and
+never while it is too recent, waiting for a transfer or upload, or on a queued ticket. The tickets of snapshots whose
+links expired, or were never recorded, are looked up in JIRA by the file name in their description, snapshots no
+ticket is found for are kept.
+
+The folder a snapshot was just saved to is cleaned in the background, going by the ticket status already in its index
+so the artist's session never queries JIRA for it. Ticket status is refreshed, and unlinked snapshots looked up, by
+the scheduled job cleaning all the user's folders:
+
+    hython -m jiraticketsubmitter.SnapshotRetention run
+"""
+
+# standard Python modules
+import argparse
+from collections import defaultdict
+import datetime
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+
+# local modules
+from jiraticketsubmitter import TransferScheduler
+from jiraticketsubmitter.MetadataCache import DN_JIRA_LOCAL_CACHE_DIR
+
+# index file kept in each jira folder
+DN_RETENTION_INDEX = ".jira_retention.json"
+DN_RETENTION_INDEX_VERSION = 1
+
+# jira folders this user saved snapshots to
+DN_RETENTION_FOLDERS = os.path.join(DN_JIRA_LOCAL_CACHE_DIR, "retention_folders.json")
+
+# show policy file name, in the show houdini data dir
+DN_RETENTION_POLICY_FILE = "houdiniJiraRetention.json"
+
+# policy of folders the show policy file does not cover
+DN_RETENTION_POLICY = {'max_age_days': 30, 'max_count': 20, 'max_size_mb': 5 * 1024}
+
+# newest snapshots of a folder always kept
+DN_RETENTION_KEEP_LATEST = 1
+
+# snapshots younger than this are always kept, their ticket may not be linked yet (seconds)
+DN_RETENTION_MIN_AGE = 24 * 3600.0
+
+# how long the status of a snapshot's tickets is trusted before asking JIRA again (seconds)
+DN_RETENTION_STATUS_TTL = 24 * 3600.0
+
+# how long before looking up the tickets of a snapshot again when none were found (seconds)
+DN_RETENTION_NOT_FOUND_TTL = 30 * 24 * 3600.0
+
+# least time between two background cleanups of the same folder (seconds)
+DN_RETENTION_INTERVAL = 3600.0
+
+# JIRA status category of resolved tickets
+DN_RETENTION_DONE_CATEGORY = "done"
+
+# jira server searched for the tickets of snapshots that are not linked to any
+DN_RETENTION_JIRA_SERVER = "jira"
+
+# snapshot names looked up in one JQL query
+DN_RETENTION_LOOKUP_BATCH = 20
+
+# timestamp save_hip adds to snapshot names
+DN_RETENTION_STAMP_RE = re.compile(r"_(\d{4}_\d\d_\d\d_\d\d_\d\d_\d\d)\.hip$")
+
+_LOCK = threading.Lock()
+
+
+def get_owner(folder):
+    """Get the shot and user a jira folder belongs to, from its <shot>/hip/<user>/jira layout.
+
+    Args:
+        folder (str): jira folder
+
+    Returns:
+        tuple (str, str): (shot, user)
+
+    """
+    user_dir = os.path.dirname(os.path.normpath(folder))
+    hip_dir = os.path.dirname(user_dir)
+    shot_dir = os.path.dirname(hip_dir) if os.path.basename(hip_dir) == "hip" else hip_dir
+    return os.path.basename(shot_dir), os.path.basename(user_dir)
+
+
+def get_policy(folder):
+    """Get the retention policy of a jira folder, the show default overridden by its shot then its user.
+
+    Args:
+        folder (str): jira folder
+
+    Returns:
+        dict: 'max_age_days', 'max_count' and 'max_size_mb'
+
+    """
+    policy = dict(DN_RETENTION_POLICY)
+    if "SHOW" not in os.environ:
+        return policy
+
+    path = os.path.join(os.sep, "tools", os.environ["SHOW"], "data", "houdini", DN_RETENTION_POLICY_FILE)
+    try:
+        with open(path, "r") as _file:
+            show_policy = json.load(_file)
+    except (IOError, OSError, ValueError):
+        return policy
+
+    shot, user = get_owner(folder)
+    policy.update(show_policy.get('default', {}))
+    policy.update(show_policy.get('shots', {}).get(shot, {}))
+    policy.update(show_policy.get('users', {}).get(user, {}))
+    return policy
+
+
+def read_folders():
+    """Read the jira folders this user saved snapshots to.
+
+    Returns:
+        list: folder paths
+
+    """
+    try:
+        with open(DN_RETENTION_FOLDERS, "r") as _file:
+            return json.load(_file)
+    except (IOError, OSError, ValueError):
+        return []
+
+
+def write_folders(folders):
+    """Write the jira folders this user saved snapshots to.
+
+    Args:
+        folders (list): folder paths
+
+    """
+    try:
+        if not os.path.isdir(DN_JIRA_LOCAL_CACHE_DIR):
+            os.makedirs(DN_JIRA_LOCAL_CACHE_DIR)
+        fd, tmp_path = tempfile.mkstemp(dir=DN_JIRA_LOCAL_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w") as _file:
+            json.dump(sorted(set(folders)), _file, indent=1)
+        os.rename(tmp_path, DN_RETENTION_FOLDERS)
+    except (IOError, OSError):
+        pass
+
+
+def register_snapshot(submission_hip_file):
+    """Register the jira folder a snapshot was saved to, for the scheduled job to clean.
+
+    Args:
+        submission_hip_file (str): saved hip file
+
+    """
+    folder = os.path.dirname(submission_hip_file)
+    with _LOCK:
+        folders = read_folders()
+        if folder not in folders:
+            write_folders(folders + [folder])
+
+
+def read_index(folder):
+    """Read the index of a jira folder.
+
+    Args:
+        folder (str): jira folder
+
+    Returns:
+        dict: 'mtime' of the folder when it was indexed, when it was last 'enforced' and the 'snapshots', name to
+            'time', 'size', 'files', 'tickets' as (jira server, key) pairs, whether a ticket is 'open', when that
+            was 'checked' and 'not_found' if looking up its tickets found none
+
+    """
+    try:
+        with open(os.path.join(folder, DN_RETENTION_INDEX), "r") as _file:
+            index = json.load(_file)
+        if index.get('version') == DN_RETENTION_INDEX_VERSION:
+            return index
+    except (IOError, OSError, ValueError):
+        pass
+    return {'version': DN_RETENTION_INDEX_VERSION, 'mtime': None, 'enforced': 0.0, 'snapshots': {}}
+
+
+def write_index(folder, index):
+    """Write the index of a jira folder, recording the folder's mtime.
+
+    Args:
+        folder (str): jira folder
+        index (dict): as returned by read_index
+
+    """
+    path = os.path.join(folder, DN_RETENTION_INDEX)
+    try:
+        # rewriting the index in place leaves the folder mtime alone, only creating it changes it
+        if not os.path.exists(path):
+            open(path, "w").close()
+        index['mtime'] = os.path.getmtime(folder)
+        with open(path, "w") as _file:
+            json.dump(index, _file)
+    except (IOError, OSError):
+        pass
+
+
+def get_snapshot_time(file_name, path):
+    """Get when a snapshot was saved, from the timestamp in its name.
+
+    Args:
+        file_name (str): hip file name
+        path (str): hip file path, its mtime is used for names without a timestamp
+
+    Returns:
+        float: seconds since the epoch
+
+    """
+    match = DN_RETENTION_STAMP_RE.search(file_name)
+    if match:
+        stamp = datetime.datetime.strptime(match.group(1), "%Y_%m_%d_%H_%M_%S")
+        return time.mktime(stamp.timetuple())
+    return os.path.getmtime(path)
+
+
+def sync_index(folder, index, links=None):
+    """Bring the index of a jira folder up to date, listing the folder only if it changed since it was indexed.
+
+    Args:
+        folder (str): jira folder
+        index (dict): as returned by read_index, updated in place
+        links (dict): as returned by TransferScheduler.read_ticket_links, read if not given
+
+    Returns:
+        bool: True if the index changed
+
+    """
+    changed = False
+    if os.path.getmtime(folder) != index['mtime']:
+        file_names = sorted(_ for _ in os.listdir(folder) if _ != DN_RETENTION_INDEX)
+        snapshots = {}
+        for file_name in file_names:
+            if not file_name.endswith(".hip"):
+                continue
+            name = os.path.splitext(file_name)[0]
+            files = [_ for _ in file_names if TransferScheduler.is_snapshot_file(_, name)]
+
+            # a file saved next to a snapshot belongs to the longest snapshot name it starts with
+            files = [_ for _ in files if not any(len(other) > len(name) + 4 and other.endswith(".hip") and
+                                                 TransferScheduler.is_snapshot_file(_, other[:-4])
+                                                 for other in file_names)]
+
+            snapshot = index['snapshots'].get(name)
+            if snapshot is None or snapshot['files'] != files:
+                snapshot = dict(snapshot or {'tickets': [], 'open': None, 'checked': 0.0})
+                try:
+                    snapshot['time'] = get_snapshot_time(file_name, os.path.join(folder, file_name))
+                    snapshot['size'] = sum(os.path.getsize(os.path.join(folder, _)) for _ in files)
+                except OSError:
+                    continue
+                snapshot['files'] = files
+            snapshots[name] = snapshot
+        changed = snapshots != index['snapshots']
+        index['snapshots'] = snapshots
+
+    # tickets stay in the index after their links expire
+    links = TransferScheduler.read_ticket_links() if links is None else links
+    for name, snapshot in index['snapshots'].items():
+        for ticket in links.get(os.path.join(folder, name), {}).get('tickets', []):
+            if ticket not in snapshot['tickets']:
+                snapshot['tickets'].append(ticket)
+                snapshot['checked'] = 0.0
+                snapshot['not_found'] = False
+                changed = True
+    return changed
+
+
+# noinspection PyBroadException
+def refresh_ticket_status(snapshots, now=None):
+    """Ask JIRA whether the tickets of some snapshots are still open, one query per server.
+
+    Snapshots whose tickets could not be checked are left with 'open' set to None, and kept.
+
+    Args:
+        snapshots (list of dict): index snapshots, updated in place
+        now (float): time of the check, defaults to now
+
+    """
+    from jiraticketsubmitter import JiraThrottle
+    from jiraticketsubmitter.HoudiniTicket import get_jira_connection
+
+    now = time.time() if now is None else now
+    keys = defaultdict(set)
+    for snapshot in snapshots:
+        for jira_server, key in snapshot['tickets']:
+            keys[jira_server].add(key)
+
+    open_keys, checked_servers = set(), set()
+    for jira_server, server_keys in keys.items():
+        try:
+            jira = get_jira_connection(server=jira_server)
+            issues = JiraThrottle.call(jira_server, jira.search_issues,
+                                       "key in ({0})".format(",".join(sorted(server_keys))), fields="status",
+                                       maxResults=len(server_keys), validate_query=False)
+        except Exception as e:
+            print "{0}: could not check tickets on {1}, keeping their snapshots: {2}".format(__name__, jira_server, e)
+            continue
+        checked_servers.add(jira_server)
+        open_keys.update((jira_server, _.key) for _ in issues
+                         if _.fields.status.statusCategory.key != DN_RETENTION_DONE_CATEGORY)
+
+    for snapshot in snapshots:
+        tickets = [tuple(_) for _ in snapshot['tickets']]
+        if any(_ in open_keys for _ in tickets):
+            snapshot['open'] = True
+        elif all(_[0] in checked_servers for _ in tickets):
+            # tickets JIRA no longer knows about count as closed
+            snapshot['open'] = False
+        else:
+            snapshot['open'] = None
+            continue
+        snapshot['checked'] = now
+
+
+# noinspection PyBroadException
+def find_tickets(snapshots, now=None, jira_server=DN_RETENTION_JIRA_SERVER):
+    """Look up the tickets of snapshots that are not linked to any, by their file name in the ticket description.
+
+    Tickets found are added to the snapshots along with whether one is open. Snapshots no ticket was found for are
+    marked 'not_found' and keep 'open' set to None, so they are kept and only looked up again after
+    DN_RETENTION_NOT_FOUND_TTL.
+
+    Args:
+        snapshots (dict): snapshot name to index snapshot, updated in place
+        now (float): time of the lookup, defaults to now
+        jira_server (str): name of jira server to search
+
+    """
+    from jiraticketsubmitter import JiraThrottle
+    from jiraticketsubmitter.HoudiniTicket import get_jira_connection
+
+    now = time.time() if now is None else now
+    names = sorted(snapshots)
+    for start in range(0, len(names), DN_RETENTION_LOOKUP_BATCH):
+        batch = names[start:start + DN_RETENTION_LOOKUP_BATCH]
+        query = " OR ".join("text ~ \"\\\"{0}.hip\\\"\"".format(_.replace("\"", "")) for _ in batch)
+        try:
+            jira = get_jira_connection(server=jira_server)
+            issues = JiraThrottle.call(jira_server, jira.search_issues, query, fields="status,description",
+                                       maxResults=False, validate_query=False)
+        except Exception as e:
+            print "{0}: could not look up the tickets of {1} snapshots, keeping them: {2}".format(__name__, len(batch),
+                                                                                                  e)
+            continue
+
+        for name in batch:
+            snapshot = snapshots[name]
+            found = [_ for _ in issues if "{0}.hip".format(name) in (_.fields.description or "")]
+            for issue in found:
+                if [jira_server, issue.key] not in snapshot['tickets']:
+                    snapshot['tickets'].append([jira_server, issue.key])
+            if found:
+                snapshot['open'] = any(_.fields.status.statusCategory.key != DN_RETENTION_DONE_CATEGORY
+                                       for _ in found)
+            snapshot['not_found'] = not found
+            snapshot['checked'] = now
+
+
+def get_busy_paths():
+    """Get the snapshot files still needed by a pending transfer, a queued ticket or a queued upload.
+
+    Returns:
+        set: file paths
+
+    """
+    from jiraticketsubmitter import SnapshotUpload, TicketQueue
+
+    paths = set(_['path'] for _ in TransferScheduler.read_jobs())
+    paths.update(TicketQueue.get_queued_hip_files())
+    paths.update(SnapshotUpload.get_queued_paths())
+    return paths
+
+
+def select_expired(index, policy, busy=None, now=None, query_jira=False):
+    """Pick the snapshots of a folder the policy removes, newest snapshots get to stay first.
+
+    Only snapshots whose tickets are all resolved can go. When querying JIRA, the status of the tickets of the
+    snapshots that could go is refreshed when it is older than DN_RETENTION_STATUS_TTL, and snapshots not linked to a
+    ticket are looked up with find_tickets. Otherwise the status in the index is used as is.
+
+    Args:
+        index (dict): synced index of the folder
+        policy (dict): as returned by get_policy
+        busy (set): names of the folder's files still needed, as found by get_busy_paths
+        now (float): current time, defaults to now
+        query_jira (bool): refresh ticket status and look up unlinked snapshots with JIRA
+
+    Returns:
+        list of tuple: (snapshot name, reason) pairs
+
+    """
+    now = time.time() if now is None else now
+    busy = busy or set()
+    snapshots = sorted(index['snapshots'].items(), key=lambda _: -_[1]['time'])
+
+    def _may_go(position, snapshot):
+        return (position >= DN_RETENTION_KEEP_LATEST and now - snapshot['time'] >= DN_RETENTION_MIN_AGE and
+                not any(_ in busy for _ in snapshot['files']))
+
+    def _is_stale(snapshot):
+        ttl = DN_RETENTION_NOT_FOUND_TTL if snapshot.get('not_found') else DN_RETENTION_STATUS_TTL
+        return now - snapshot['checked'] > ttl
+
+    stale = dict((name, _) for position, (name, _) in enumerate(snapshots)
+                 if query_jira and _may_go(position, _) and _is_stale(_))
+    unlinked = dict((name, _) for name, _ in stale.items() if not _['tickets'])
+    if unlinked:
+        find_tickets(unlinked, now)
+    linked = [_ for name, _ in stale.items() if name not in unlinked]
+    if linked:
+        refresh_ticket_status(linked, now)
+
+    expired = []
+    kept_count, kept_bytes = 0, 0
+    for position, (name, snapshot) in enumerate(snapshots):
+        reason = None
+        if _may_go(position, snapshot) and snapshot['tickets'] and snapshot['open'] is False:
+            if now - snapshot['time'] > policy['max_age_days'] * 24 * 3600.0:
+                reason = "older than {0} days".format(policy['max_age_days'])
+            elif kept_count >= policy['max_count']:
+                reason = "over {0} snapshots".format(policy['max_count'])
+            elif kept_bytes + snapshot['size'] > policy['max_size_mb'] * 1048576.0:
+                reason = "over {0} MB".format(policy['max_size_mb'])
+        if reason:
+            expired.append((name, reason))
+        else:
+            kept_count += 1
+            kept_bytes += snapshot['size']
+    return expired
+
+
+def enforce_folder(folder, policy=None, dry_run=False, force=True, links=None, busy=None, query_jira=False):
+    """Remove the snapshots of a jira folder its policy doesn't keep.
+
+    Args:
+        folder (str): jira folder
+        policy (dict): as returned by get_policy, defaults to the folder's policy
+        dry_run (bool): only report what would be removed
+        force (bool): clean even if the folder was cleaned less than DN_RETENTION_INTERVAL ago
+        links (dict): as returned by TransferScheduler.read_ticket_links, read if not given
+        busy (set): as returned by get_busy_paths, read if not given
+        query_jira (bool): refresh ticket status with JIRA, otherwise only the status in the index is used
+
+    Returns:
+        dict: 'removed' (snapshot name, reason) pairs, 'freed' bytes, 'kept' snapshots and 'kept_bytes'
+
+    """
+    result = {'removed': [], 'freed': 0, 'kept': 0, 'kept_bytes': 0}
+    index = read_index(folder)
+    now = time.time()
+    if not force and now - index['enforced'] < DN_RETENTION_INTERVAL:
+        return result
+
+    sync_index(folder, index, links)
+    busy = get_busy_paths() if busy is None else busy
+    busy = set(os.path.basename(_) for _ in busy if os.path.dirname(_) == folder)
+    expired = select_expired(index, policy or get_policy(folder), busy, now, query_jira)
+
+    for name, reason in expired:
+        snapshot = index['snapshots'][name]
+        if not dry_run:
+            for file_name in snapshot['files']:
+                try:
+                    os.remove(os.path.join(folder, file_name))
+                except OSError:
+                    pass
+            del index['snapshots'][name]
+        print "{0}: {1} {2} ({3:.1f} MB), {4}".format(__name__, "Would remove" if dry_run else "Removed",
+                                                      os.path.join(folder, name), snapshot['size'] / 1048576.0,
+                                                      reason)
+        result['removed'].append((name, reason))
+        result['freed'] += snapshot['size']
+
+    kept = [_ for name, _ in index['snapshots'].items() if name not in dict(expired)]
+    result['kept'] = len(kept)
+    result['kept_bytes'] = sum(_['size'] for _ in kept)
+    if not dry_run:
+        index['enforced'] = now
+        write_index(folder, index)
+    return result
+
+
+def enforce_all(folders=None, dry_run=False):
+    """Clean every jira folder this user saved snapshots to, refreshing ticket status with JIRA.
+
+    Folders that are gone are dropped from the registered folders.
+
+    Args:
+        folders (list): jira folders, defaults to the registered folders
+        dry_run (bool): only report what would be removed
+
+    Returns:
+        dict: folder to its result, as returned by enforce_folder
+
+    """
+    registered = folders is None
+    folders = read_folders() if registered else folders
+    links = TransferScheduler.read_ticket_links()
+    busy = get_busy_paths()
+
+    results = {}
+    for folder in folders:
+        if not os.path.isdir(folder):
+            continue
+        try:
+            results[folder] = enforce_folder(folder, dry_run=dry_run, links=links, busy=busy, query_jira=True)
+        except OSError as e:
+            print "{0}: could not clean {1}: {2}".format(__name__, folder, e)
+
+    if registered and not dry_run:
+        with _LOCK:
+            # keep folders registered while this ran
+            write_folders([_ for _ in read_folders() if _ not in folders or os.path.isdir(_)])
+    return results
+
+
+# noinspection PyBroadException
+def enforce_in_background(folder):
+    """Clean a jira folder on a daemon thread, unless it was cleaned recently, without querying JIRA.
+
+    Args:
+        folder (str): jira folder
+
+    """
+    def _enforce():
+        try:
+            enforce_folder(folder, force=False)
+        except Exception as e:
+            print "{0}: could not clean {1}: {2}".format(__name__, folder, e)
+
+    thread = threading.Thread(target=_enforce)
+    thread.daemon = True
+    thread.start()
+
+
+def scan_folders(root, register=False):
+    """Find the jira folders holding snapshots under a directory, and register them to adopt existing folders.
+
+    This walks the whole tree once, the cleanups themselves never do.
+
+    Args:
+        root (str): directory to search
+        register (bool): register the folders found, for the scheduled job to clean, otherwise only list them
+
+    Returns:
+        list: jira folders found
+
+    """
+    found = []
+    for directory, dir_names, file_names in os.walk(root):
+        if os.path.basename(directory) == "jira" and any(_.endswith(".hip") for _ in file_names):
+            found.append(directory)
+            dir_names[:] = []
+    if register:
+        with _LOCK:
+            write_folders(read_folders() + found)
+    return found
+
+
+def main(argv=None):
+    """Clean the registered jira folders from the command line, e.g. from a nightly cron job.
+
+    Args:
+        argv (list): arguments, defaults to sys.argv[1:]
+
+    Returns:
+        int: exit code, 0 on success
+
+    """
+    parser = argparse.ArgumentParser(prog="jiraticketsubmitter.SnapshotRetention",
+                                     description="Remove Houdini JIRA ticket hip snapshots the retention policy "
+                                                 "doesn't keep.")
+    parser.add_argument("command", choices=("run", "scan"),
+                        help="clean the jira folders, or find the jira folders under a directory")
+    parser.add_argument("paths", nargs="*",
+                        help="jira folders to clean instead of the registered ones, or the directory to scan")
+    parser.add_argument("--dry-run", action="store_true", help="only print what would be removed")
+    parser.add_argument("--register", action="store_true",
+                        help="register the folders scan finds for cleaning, scan only lists them otherwise")
+    args = parser.parse_args(argv)
+
+    if args.command == "scan":
+        if len(args.paths) != 1:
+            parser.error("scan takes one directory")
+        found = scan_folders(args.paths[0], args.register)
+        for folder in found:
+            print folder
+        if found and not args.register:
+            print "{0} folders found, run scan again with --register to have them cleaned".format(len(found))
+        return 0
+
+    results = enforce_all(args.paths or None, args.dry_run)
+    print "{0} folders, {1} snapshots {2}, {3:.1f} MB freed, {4} snapshots ({5:.1f} MB) kept".format(
+        len(results), sum(len(_['removed']) for _ in results.values()),
+        "to remove" if args.dry_run else "removed", sum(_['freed'] for _ in results.values()) / 1048576.0,
+        sum(_['kept'] for _ in results.values()), sum(_['kept_bytes'] for _ in results.values()) / 1048576.0)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
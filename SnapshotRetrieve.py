@@ -0,0 +1,139 @@
+"""Module containing the retrieval of hip snapshots left at their origin site by the pull transfer policy.
+
+The ticket description says which site a pulled snapshot was saved at and the command that fetches it:
+
+    hython -m jiraticketsubmitter.SnapshotRetrieve fetch /path/to/shot_jira_1.hip --origin london
+
+The snapshot and the files saved next to it, e.g. its manifest and profile, are copied to the same path at this site
+with a single rsync, the same way a pushed snapshot would have arrived. Once there the copy serves as the local cache,
+later fetches of the same snapshot don't go over the WAN again. From a Houdini session open_snapshot() fetches and
+loads it in one go.
+"""
+
+# standard Python modules
+import argparse
+import os
+import subprocess
+import sys
+
+# local modules
+from jiraticketsubmitter import TransferScheduler
+
+
+def get_snapshot_files(submission_hip_file):
+    """Get the files of a snapshot already at this site.
+
+    Args:
+        submission_hip_file (str): saved hip file
+
+    Returns:
+        dict: path to size in bytes
+
+    """
+    snapshot = os.path.splitext(submission_hip_file)[0]
+    try:
+        file_names = os.listdir(os.path.dirname(submission_hip_file))
+    except OSError:
+        return {}
+
+    files = {}
+    for file_name in file_names:
+        path = os.path.join(os.path.dirname(submission_hip_file), file_name)
+        if TransferScheduler.is_snapshot_file(path, snapshot) and os.path.isfile(path):
+            files[path] = os.path.getsize(path)
+    return files
+
+
+def retrieve_snapshot(submission_hip_file, origin_site, force=False):
+    """Fetch a snapshot from its origin site, unless it is already here.
+
+    Args:
+        submission_hip_file (str): saved hip file, as given in the ticket
+        origin_site (str): site the snapshot was saved at
+        force (bool): fetch again even if the snapshot is already here
+
+    Raises:
+        ValueError: the origin site has no host to fetch from
+
+    Returns:
+        bool: True if the snapshot is here
+
+    """
+    if os.path.exists(submission_hip_file) and not force:
+        return True
+    if origin_site not in TransferScheduler.DN_REMOTE_HOST_MAP:
+        raise ValueError("No host to fetch snapshots from at site '{0}'".format(origin_site))
+
+    directory = os.path.dirname(submission_hip_file)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    # the snapshot's files are the hip file and the ones saved next to it under its name
+    base_name = os.path.basename(os.path.splitext(submission_hip_file)[0])
+    rsync_command = ["rsync", "-avu", "--include={0}.*".format(base_name), "--include={0}_*".format(base_name),
+                     "--exclude=*", "{0}@{1}:{2}/".format(os.environ["USER"],
+                                                          TransferScheduler.DN_REMOTE_HOST_MAP[origin_site],
+                                                          directory),
+                     "{0}/".format(directory)]
+    print "{0}: Fetching snapshot from {1}:\n\t{2}".format(__name__, origin_site, " ".join(rsync_command))
+
+    before = get_snapshot_files(submission_hip_file)
+    try:
+        code = subprocess.call(rsync_command)
+    except OSError as e:
+        print "{0}: rsync from {1} failed: {2}".format(__name__, origin_site, e)
+        return False
+
+    moved = sum(size for path, size in get_snapshot_files(submission_hip_file).items() if before.get(path) != size)
+    TransferScheduler.record_policy_bytes(TransferScheduler.DN_TRANSFER_PULL, "moved", submission_hip_file, moved)
+    if code:
+        print "{0}: rsync from {1} failed with exit code {2}".format(__name__, origin_site, code)
+    return not code and os.path.exists(submission_hip_file)
+
+
+def open_snapshot(submission_hip_file, origin_site):
+    """Fetch a snapshot if needed and load it in this Houdini session.
+
+    Args:
+        submission_hip_file (str): saved hip file, as given in the ticket
+        origin_site (str): site the snapshot was saved at
+
+    Raises:
+        hou.OperationFailed: the snapshot could not be fetched
+
+    """
+    import hou
+
+    if not retrieve_snapshot(submission_hip_file, origin_site):
+        raise hou.OperationFailed("Could not fetch {0} from {1}".format(submission_hip_file, origin_site))
+    hou.hipFile.load(submission_hip_file)
+
+
+def main(argv=None):
+    """Fetch a snapshot from the command line.
+
+    Args:
+        argv (list): arguments, defaults to sys.argv[1:]
+
+    Returns:
+        int: exit code, 0 on success
+
+    """
+    parser = argparse.ArgumentParser(prog="jiraticketsubmitter.SnapshotRetrieve",
+                                     description="Fetch a Houdini JIRA ticket hip snapshot from its origin site.")
+    parser.add_argument("command", choices=("fetch",), help="fetch the snapshot unless it is already here")
+    parser.add_argument("path", help="snapshot hip file, as given in the ticket")
+    parser.add_argument("--origin", required=True, help="site the snapshot was saved at, as given in the ticket")
+    parser.add_argument("--force", action="store_true", help="fetch again even if the snapshot is already here")
+    args = parser.parse_args(argv)
+
+    try:
+        fetched = retrieve_snapshot(args.path, args.origin, args.force)
+    except (ValueError, OSError) as e:
+        sys.stderr.write("{0}\n".format(e))
+        return 1
+    return 0 if fetched else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
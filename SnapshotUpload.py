@@ -0,0 +1,483 @@
+"""Module containing the upload of hip snapshots as attachments of the created issue.
+
+Support staff at remote sites rely on the rsync mirror paths, which don't exist for sites missing from
+DN_REMOTE_HOST_MAP or for external vendors. The snapshot can be attached to the issue instead. It is gzipped into the
+local cache and uploaded in parts of DN_SNAPSHOT_UPLOAD_PART_SIZE, each streamed from disk as it is sent. Parts
+already on the issue are skipped, so an upload cut short, even by the session ending, resumes from the first missing
+part the next time a submitter connects to the server. Snapshots over DN_SNAPSHOT_UPLOAD_MAX_SIZE compressed are not
+uploaded, the issue gets a comment saying so.
+
+Once all parts are attached a comment explains how to put them back together:
+
+    cat shot_jira_1.hip.gz.part* | gunzip > shot_jira_1.hip
+"""
+
+# standard Python modules
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+# local modules
+from jiraticketsubmitter.MetadataCache import DN_JIRA_LOCAL_CACHE_DIR
+
+# queued uploads and the compressed snapshots they send
+DN_SNAPSHOT_UPLOAD_DIR = os.path.join(DN_JIRA_LOCAL_CACHE_DIR, "snapshot_uploads")
+
+# largest attachment sent, below the server's attachment size limit (bytes)
+DN_SNAPSHOT_UPLOAD_PART_SIZE = 8 * 1024 * 1024
+
+# largest compressed snapshot uploaded (bytes)
+DN_SNAPSHOT_UPLOAD_MAX_SIZE = 512 * 1024 * 1024
+
+# bytes read from disk at a time while a part is sent
+DN_SNAPSHOT_UPLOAD_READ_SIZE = 64 * 1024
+
+# times a part is retried within a session before the upload is left for later
+DN_SNAPSHOT_UPLOAD_PART_RETRIES = 2
+
+# sessions a snapshot upload is tried in before it is given up on
+DN_SNAPSHOT_UPLOAD_MAX_ATTEMPTS = 5
+
+# claimed uploads not touched for this long were left by a session that went away (seconds)
+DN_SNAPSHOT_UPLOAD_STALE = 3600.0
+
+_LOCK = threading.Lock()
+
+
+# ----------------------------------------------------
+# classes defined for this module
+# ----------------------------------------------------
+
+
+class MultipartFileRange(object):
+    """File like multipart/form-data body of one attachment, reading a byte range of a file as it is sent.
+
+    Args:
+        path (str): file to read
+        offset (int): first byte of the range
+        length (int): bytes in the range
+        file_name (str): attachment name
+
+    """
+
+    def __init__(self, path, offset, length, file_name):
+        """Initialize the body, the file is opened on the first read."""
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.boundary = uuid.uuid4().hex
+        self._head = "--{0}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{1}\"\r\n" \
+                     "Content-Type: application/octet-stream\r\n\r\n".format(self.boundary, file_name)
+        self._tail = "\r\n--{0}--\r\n".format(self.boundary)
+        self._file = None
+        self._remaining = length
+        self.len = len(self._head) + length + len(self._tail)
+
+    @property
+    def content_type(self):
+        """str: Content-Type header of the body."""
+        return "multipart/form-data; boundary={0}".format(self.boundary)
+
+    def read(self, size=-1):
+        """Read the next bytes of the body.
+
+        Args:
+            size (int): most bytes to read, negative for DN_SNAPSHOT_UPLOAD_READ_SIZE
+
+        Returns:
+            str: data, empty once the whole body was read
+
+        """
+        if size is None or size < 0:
+            size = DN_SNAPSHOT_UPLOAD_READ_SIZE
+
+        if self._head:
+            data, self._head = self._head[:size], self._head[size:]
+            return data
+
+        if self._remaining:
+            if self._file is None:
+                self._file = open(self.path, "rb")
+                self._file.seek(self.offset)
+            data = self._file.read(min(size, self._remaining))
+            if not data:
+                raise IOError("{0} is shorter than expected".format(self.path))
+            self._remaining -= len(data)
+            return data
+
+        self.close()
+        data, self._tail = self._tail[:size], self._tail[size:]
+        return data
+
+    def close(self):
+        """Close the file, if open."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# ----------------------------------------------------
+# functions defined for this module
+# ----------------------------------------------------
+
+
+def get_part_names(file_name, size, part_size=DN_SNAPSHOT_UPLOAD_PART_SIZE):
+    """Get the attachment names and byte ranges of a file's parts.
+
+    Args:
+        file_name (str): name of the compressed snapshot
+        size (int): bytes in the file
+        part_size (int): most bytes per part
+
+    Returns:
+        list: (attachment name, offset, length) per part, in order
+
+    """
+    count = max(1, (size + part_size - 1) // part_size)
+    return [("{0}.part{1:03d}of{2:03d}".format(file_name, index + 1, count), index * part_size,
+             min(part_size, size - index * part_size)) for index in range(count)]
+
+
+def get_rest_url(jira, path):
+    """Get the REST API url of a resource on the jira connection's server.
+
+    Args:
+        jira (object): jira connection
+        path (str): resource path, e.g. 'issue/HOU-1/attachments'
+
+    Returns:
+        str: url
+
+    """
+    return "{0}/rest/api/2/{1}".format(jira._options['server'].rstrip("/"), path)
+
+
+def get_attached_sizes(jira, key):
+    """Get the attachments already on an issue.
+
+    Args:
+        jira (object): jira connection
+        key (str): issue key
+
+    Returns:
+        dict: attachment name to size in bytes
+
+    """
+    response = jira._session.get(get_rest_url(jira, "issue/{0}".format(key)), params={'fields': 'attachment'})
+    response.raise_for_status()
+    attachments = response.json().get('fields', {}).get('attachment') or []
+    return dict((_['filename'], _['size']) for _ in attachments)
+
+
+def upload_part(jira, key, path, offset, length, file_name):
+    """Attach a byte range of a file to an issue, streaming it from disk.
+
+    Args:
+        jira (object): jira connection
+        key (str): issue key
+        path (str): file to read
+        offset (int): first byte of the range
+        length (int): bytes in the range
+        file_name (str): attachment name
+
+    """
+    body = MultipartFileRange(path, offset, length, file_name)
+    try:
+        response = jira._session.post(get_rest_url(jira, "issue/{0}/attachments".format(key)), data=body,
+                                      headers={'Content-Type': body.content_type, 'X-Atlassian-Token': 'no-check'})
+    finally:
+        body.close()
+    response.raise_for_status()
+
+
+def compress_snapshot(path, upload_id):
+    """Gzip a snapshot into the upload directory, streaming it.
+
+    Args:
+        path (str): saved hip file
+        upload_id (str): upload the compressed copy is for
+
+    Returns:
+        str: path of the compressed copy
+
+    """
+    gz_path = os.path.join(DN_SNAPSHOT_UPLOAD_DIR, upload_id, "{0}.gz".format(os.path.basename(path)))
+    if not os.path.isdir(os.path.dirname(gz_path)):
+        os.makedirs(os.path.dirname(gz_path))
+    with open(path, "rb") as source, gzip.open(gz_path + ".tmp", "wb") as target:
+        shutil.copyfileobj(source, target, DN_SNAPSHOT_UPLOAD_READ_SIZE)
+    os.rename(gz_path + ".tmp", gz_path)
+    return gz_path
+
+
+def queue_upload(submission_hip_file, key, jira_server='jira'):
+    """Queue a snapshot to be attached to an issue.
+
+    Args:
+        submission_hip_file (str): saved hip file
+        key (str): JIRA issue key
+        jira_server (str): name of jira server the issue is on
+
+    Returns:
+        dict: queued upload
+
+    """
+    upload = {'id': uuid.uuid4().hex,
+              'path': submission_hip_file,
+              'gz_path': None,
+              'jira_server': jira_server,
+              'key': key,
+              'queued_at': time.time(),
+              'attempts': 0}
+    _write_upload(upload)
+    return upload
+
+
+# noinspection PyBroadException
+def upload_snapshot(upload):
+    """Attach the parts of a claimed snapshot upload the issue does not have yet.
+
+    Args:
+        upload (dict): claimed upload, updated as it goes
+
+    Raises:
+        Exception: anything the jira connection raises, the upload can be resumed later
+
+    Returns:
+        bool: True if the upload is finished, attached or given up on
+
+    """
+    from jiraticketsubmitter import JiraThrottle
+    from jiraticketsubmitter.HoudiniTicket import get_jira_connection
+
+    jira_server = upload['jira_server']
+    jira = get_jira_connection(server=jira_server)
+
+    if not os.path.exists(upload['gz_path'] or ""):
+        if not os.path.exists(upload['path']):
+            print "{0}: {1} is gone, not attaching it to {2}".format(__name__, upload['path'], upload['key'])
+            return True
+        upload['gz_path'] = compress_snapshot(upload['path'], upload['id'])
+        _write_upload(upload, claimed=True)
+
+    size = os.path.getsize(upload['gz_path'])
+    if size > DN_SNAPSHOT_UPLOAD_MAX_SIZE:
+        JiraThrottle.add_comment(jira_server, jira, upload['key'], "Hip snapshot {0} is {1:.0f} MB compressed, over "
+                                 "the {2:.0f} MB limit for attachments, it was not attached.".format(
+                                     upload['path'], size / 1048576.0, DN_SNAPSHOT_UPLOAD_MAX_SIZE / 1048576.0))
+        return True
+
+    parts = get_part_names(os.path.basename(upload['gz_path']), size)
+    attached = JiraThrottle.call(jira_server, get_attached_sizes, jira, upload['key'])
+    for name, offset, length in parts:
+        if attached.get(name) == length:
+            continue
+        attempt = 0
+        while True:
+            try:
+                JiraThrottle.call(jira_server, upload_part, jira, upload['key'], upload['gz_path'], offset, length,
+                                  name)
+                break
+            except Exception:
+                if attempt >= DN_SNAPSHOT_UPLOAD_PART_RETRIES:
+                    raise
+                attempt += 1
+                time.sleep(attempt)
+
+        # keep the claim fresh so other sessions don't take it over
+        _write_upload(upload, claimed=True)
+
+    file_name = os.path.basename(upload['path'])
+    JiraThrottle.add_comment(jira_server, jira, upload['key'],
+                             "Hip snapshot {0} is attached in {1} part(s), to restore it run:\n"
+                             "{{noformat}}cat {2}.gz.part* | gunzip > {2}{{noformat}}".format(
+                                 upload['path'], len(parts), file_name))
+    return True
+
+
+# noinspection PyBroadException
+def resume_uploads(jira_server='jira', upload_ids=None):
+    """Upload the queued snapshots of a jira server, including ones left by sessions that went away.
+
+    Each upload is claimed by renaming its file first, so two sessions never upload the same snapshot. Uploads that
+    fail are put back in the queue until they run out of attempts.
+
+    Args:
+        jira_server (str): name of jira server to use
+        upload_ids (list): only upload these, as returned by queue_upload, defaults to every queued upload
+
+    Returns:
+        list: keys of the issues whose uploads finished
+
+    """
+    keys = []
+    with _LOCK:
+        for upload in _read_uploads():
+            if upload['jira_server'] != jira_server or (upload_ids is not None and upload['id'] not in upload_ids):
+                continue
+            if not _claim_upload(upload):
+                continue
+
+            upload['attempts'] += 1
+            try:
+                finished = upload_snapshot(upload)
+            except Exception as e:
+                print "{0}: could not attach {1} to {2}: {3}".format(__name__, upload['path'], upload['key'], e)
+                finished = upload['attempts'] >= DN_SNAPSHOT_UPLOAD_MAX_ATTEMPTS
+                if finished:
+                    print "{0}: giving up on attaching {1}".format(__name__, upload['path'])
+
+            if not finished:
+                _write_upload(upload, claimed=True)
+                os.rename(_get_upload_path(upload) + ".uploading", _get_upload_path(upload))
+                continue
+
+            shutil.rmtree(os.path.join(DN_SNAPSHOT_UPLOAD_DIR, upload['id']), ignore_errors=True)
+            os.remove(_get_upload_path(upload) + ".uploading")
+            keys.append(upload['key'])
+    return keys
+
+
+def has_queued_uploads():
+    """Check for queued uploads without reading them.
+
+    Returns:
+        bool: True if any upload is queued or claimed
+
+    """
+    try:
+        return any(_.endswith((".json", ".json.uploading")) for _ in os.listdir(DN_SNAPSHOT_UPLOAD_DIR))
+    except OSError:
+        return False
+
+
+def get_queued_paths():
+    """Get the snapshots still to be compressed and uploaded, without claiming anything.
+
+    Returns:
+        set: saved hip file paths
+
+    """
+    paths = set()
+    try:
+        file_names = os.listdir(DN_SNAPSHOT_UPLOAD_DIR)
+    except OSError:
+        return paths
+
+    for file_name in file_names:
+        if not file_name.endswith((".json", ".json.uploading")):
+            continue
+        try:
+            with open(os.path.join(DN_SNAPSHOT_UPLOAD_DIR, file_name), "r") as _file:
+                upload = json.load(_file)
+        except (IOError, OSError, ValueError):
+            continue
+        if not os.path.exists(upload.get('gz_path') or ""):
+            paths.add(upload['path'])
+    return paths
+
+
+def resume_uploads_in_background(jira_server='jira', upload_ids=None):
+    """Upload queued snapshots on a daemon thread.
+
+    Args:
+        jira_server (str): name of jira server to use
+        upload_ids (list): only upload these, as returned by queue_upload, defaults to every queued upload
+
+    """
+    thread = threading.Thread(target=resume_uploads, args=(jira_server, upload_ids))
+    thread.daemon = True
+    thread.start()
+
+
+def attach_snapshot(submission_hip_file, key, jira_server='jira'):
+    """Queue a snapshot to be attached to an issue and start uploading it in the background.
+
+    Args:
+        submission_hip_file (str): saved hip file
+        key (str): JIRA issue key
+        jira_server (str): name of jira server the issue is on
+
+    """
+    upload = queue_upload(submission_hip_file, key, jira_server)
+    resume_uploads_in_background(jira_server, [upload['id']])
+
+
+def _get_upload_path(upload):
+    """Get the queue file of an upload.
+
+    Args:
+        upload (dict): queued upload
+
+    Returns:
+        str: path, without the claim suffix
+
+    """
+    return os.path.join(DN_SNAPSHOT_UPLOAD_DIR, "{0}.json".format(upload['id']))
+
+
+def _write_upload(upload, claimed=False):
+    """Write an upload to the queue.
+
+    Args:
+        upload (dict): upload to write
+        claimed (bool): write the claimed file of an upload this session owns
+
+    """
+    if not os.path.isdir(DN_SNAPSHOT_UPLOAD_DIR):
+        os.makedirs(DN_SNAPSHOT_UPLOAD_DIR)
+    fd, tmp_path = tempfile.mkstemp(dir=DN_SNAPSHOT_UPLOAD_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as _file:
+        json.dump(upload, _file)
+    os.rename(tmp_path, _get_upload_path(upload) + (".uploading" if claimed else ""))
+
+
+def _read_uploads():
+    """Read the queued uploads, and the claimed ones left by sessions that went away.
+
+    Returns:
+        list: uploads, oldest first
+
+    """
+    uploads = []
+    try:
+        file_names = os.listdir(DN_SNAPSHOT_UPLOAD_DIR)
+    except OSError:
+        return uploads
+
+    now = time.time()
+    for file_name in file_names:
+        path = os.path.join(DN_SNAPSHOT_UPLOAD_DIR, file_name)
+        try:
+            if file_name.endswith(".json.uploading") and now - os.path.getmtime(path) > DN_SNAPSHOT_UPLOAD_STALE:
+                os.rename(path, path[:-len(".uploading")])
+                path = path[:-len(".uploading")]
+            elif not file_name.endswith(".json"):
+                continue
+            with open(path, "r") as _file:
+                uploads.append(json.load(_file))
+        except (IOError, OSError, ValueError):
+            continue
+    return sorted(uploads, key=lambda _: _['queued_at'])
+
+
+def _claim_upload(upload):
+    """Claim an upload by renaming its file, so two sessions never upload the same snapshot.
+
+    Args:
+        upload (dict): queued upload
+
+    Returns:
+        bool: True if this session now owns the upload
+
+    """
+    try:
+        os.rename(_get_upload_path(upload), _get_upload_path(upload) + ".uploading")
+    except OSError:
+        return False
+    return True
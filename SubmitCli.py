@@ -0,0 +1,145 @@
+"""Module containing the headless command line entry point used to file tickets from batch hython.
+
+Usage:
+
+    hython -m jiraticketsubmitter.SubmitCli /path/to/scene.hip --node /obj/geo1/sim \\
+        --title "sim failed on frame 1001" --description "see farm log"
+
+Runs the whole submission without Qt or ui prompts and prints a single line of JSON to stdout, e.g.
+{"key": "PTSUP-1234", "url": "http://jira/browse/PTSUP-1234"} or {"error": "..."} with a non-zero exit code.
+Anything else the submitter prints goes to stderr so the output can be parsed by failure handlers.
+"""
+
+# standard Python modules
+import argparse
+import json
+import sys
+
+
+def parse_args(argv=None):
+    """Parse command line arguments.
+
+    Args:
+        argv (list): arguments, defaults to sys.argv[1:]
+
+    Returns:
+        argparse.Namespace: parsed arguments
+
+    """
+    parser = argparse.ArgumentParser(prog="jiraticketsubmitter.SubmitCli",
+                                     description="Submit a Houdini JIRA ticket without a UI.")
+    parser.add_argument("hip", help="hip file to load and submit the ticket from")
+    parser.add_argument("--node", help="path of the node to submit the ticket on, generic ticket if not given")
+    parser.add_argument("--title", required=True, help="ticket summary")
+    description = parser.add_mutually_exclusive_group(required=True)
+    description.add_argument("--description", help="ticket description")
+    description.add_argument("--description-file", help="file to read the ticket description from, - for stdin")
+    parser.add_argument("--priority", help="ticket priority, e.g. Major")
+    parser.add_argument("--save-hip", action="store_true", help="save and transfer a copy of the hip file")
+    parser.add_argument("--attach-hip", action="store_true",
+                        help="also attach the saved copy of the hip file to the ticket, implies --save-hip")
+    parser.add_argument("--coalesce-duplicates", action="store_true",
+                        help="comment on a recent ticket filed on the same item instead of creating a new one")
+    parser.add_argument("--jira-server", default="jira", help="name of jira server to use")
+    return parser.parse_args(argv)
+
+
+def read_description(args):
+    """Get the description from the arguments.
+
+    Args:
+        args (argparse.Namespace): parsed arguments
+
+    Returns:
+        str: ticket description
+
+    """
+    if args.description is not None:
+        return args.description
+    if args.description_file == "-":
+        return sys.stdin.read()
+    with open(args.description_file, "r") as _file:
+        return _file.read()
+
+
+def submit(args):
+    """Load the hip file and submit the ticket.
+
+    Houdini and submitter modules are imported here rather than at module level so --help stays instant.
+
+    Args:
+        args (argparse.Namespace): parsed arguments
+
+    Raises:
+        hou.OperationFailed: node could not be found or the ticket is not valid
+
+    Returns:
+        dict: issue key and url
+
+    """
+    import hou
+    from jiraticketsubmitter import BulkSubmit, HipFileUtils, HoudiniTicket, SnapshotUpload, TicketLedger
+
+    description = read_description(args)
+    if hou.hipFile.path() != args.hip:
+        hou.hipFile.load(args.hip, suppress_save_prompt=True, ignore_load_warnings=True)
+
+    item = None
+    if args.node:
+        item = hou.node(args.node)
+        if item is None:
+            raise hou.OperationFailed("Could not find node: {0}".format(args.node))
+
+    jira_submit = HoudiniTicket.HoudiniTicket(item=item, disable_ui=True, jira_server=args.jira_server)
+    if args.priority:
+        jira_submit.priority = args.priority
+
+    submission_hip_file = None
+    if args.save_hip or args.attach_hip:
+        submission_hip_file = HipFileUtils.save_and_transfer_hip(is_ui=False, priority=jira_submit.priority)
+    if args.coalesce_duplicates:
+        TicketLedger.refresh_index()
+    issue = BulkSubmit.submit_ticket(jira_submit, args.title, description, submission_hip_file,
+                                     coalesce_duplicates=args.coalesce_duplicates)
+    if not issue:
+        raise hou.OperationFailed("JIRA did not return an issue")
+
+    # upload this ticket's snapshot before exiting, anything left over is resumed by the next session
+    if args.attach_hip and submission_hip_file:
+        upload = SnapshotUpload.queue_upload(submission_hip_file, issue.key, args.jira_server)
+        SnapshotUpload.resume_uploads(args.jira_server, [upload['id']])
+
+    return {"key": issue.key, "url": "http://{0}/browse/{1}".format(args.jira_server, issue.key)}
+
+
+# noinspection PyBroadException
+def main(argv=None):
+    """Run the command line submitter.
+
+    Args:
+        argv (list): arguments, defaults to sys.argv[1:]
+
+    Returns:
+        int: exit code, 0 on success
+
+    """
+    args = parse_args(argv)
+
+    # keep stdout for the JSON result only
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        result = submit(args)
+        code = 0
+    except Exception as e:
+        result = {"error": str(e)}
+        code = 1
+    finally:
+        sys.stdout = stdout
+
+    print json.dumps(result)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 """Module containing functions to gather info for the Jira Submitter."""
 
 # standard Python modules
+from collections import OrderedDict
 import os
 
 # dn
@@ -27,58 +28,108 @@ def get_shot_info():
     return 'No SHOT set for this submission\n'
 
 
+def get_site_name():
+    """Get the name of the local dn site.
+
+    Returns:
+        str: site name, empty if not known
+
+    """
+    return dnsitedata.local_site().name or ''
+
+
 def get_location_info():
     """Retrieve info about shot from dnsitedata."""
     # add section 'location'
-    site_name = dnsitedata.local_site().name
+    site_name = get_site_name()
     if site_name:
         return 'LOCATION:   {0} \n'.format(site_name.capitalize())
     return 'LOCATION:   Could not find dn_site name\n'
 
 
+def get_curtools_dict():
+    """Get the DN HOUDINI tool environment variables.
+
+    Returns:
+        OrderedDict: variable name to value, sorted by name
+
+    """
+    return OrderedDict((key, os.environ[key]) for key in sorted(os.environ.keys())
+                       if "HOUDINI" in key and "DN" in key)
+
+
 def get_curtools_info():
     """Get curtools, build a list first so it can be sorted."""
-    # Gather tool info from env
-    raw_hou_env_vars = []
-    curtools = "Current DN HOUDINI Tools versions:\n\n"
-    for key in os.environ.keys():
-        if "HOUDINI" in key and "DN" in key:
-            raw_hou_env_vars.append(key)
-    raw_hou_env_vars.sort()
-
     # format env info into strings
-    for key in raw_hou_env_vars:
-        curtools += "{0}        {1}\n".format(key, os.environ[key])
+    curtools = "Current DN HOUDINI Tools versions:\n\n"
+    for key, value in get_curtools_dict().iteritems():
+        curtools += "{0}        {1}\n".format(key, value)
     return curtools
 
 
+def get_houdini_path_list():
+    """Get the HOUDINI_PATH entries.
+
+    Returns:
+        list: HOUDINI_PATH locations in order
+
+    """
+    return os.environ['HOUDINI_PATH'].split(":")
+
+
+def get_houdini_version_dict():
+    """Get houdini version.
+
+    Returns:
+        OrderedDict: version, platform, build date, license and HFS
+
+    """
+    return OrderedDict([('version', hou.applicationVersionString()),
+                        ('platform', hou.applicationPlatformInfo()),
+                        ('build_date', hou.applicationCompilationDate()),
+                        ('license', "Escape license" if hou.applicationName() == "hescape" else "Master license"),
+                        ('hfs', os.environ['HFS'])])
+
+
 def get_houdini_version_info():
     """Get houdini version."""
     # get houdini version info
-    app_name = "Escape license" if hou.applicationName() == "hescape" else "Master license"
-    houdini_version = "Houdini version info:\n\n{0}\n{1}\n{2}\n{3}\n". format(hou.applicationVersionString(),
-                                                                              hou.applicationPlatformInfo(),
-                                                                              hou.applicationCompilationDate(),
-                                                                              app_name)
-    houdini_version += "{0}\n".format(os.environ['HFS'])
+    houdini_version = "Houdini version info:\n\n{0}\n".format("\n".join(get_houdini_version_dict().values()))
     return houdini_version
 
 
-def get_bob_info():
-    """Just add bob paths."""
+def get_bob_dict():
+    """Get the BOB packages and their versions.
+
+    Returns:
+        OrderedDict: package to version, sorted by package, empty if the BOB world can't be read
+
+    """
     # noinspection PyBroadException
     try:
-        bpath = "BOB Paths and Versions: \n\n"
         bob_world = bobhelper.World()
 
         # loop thru bob package paths
+        packages = OrderedDict()
         for package in sorted(bob_world.packages):
             pack = bob_world.packages[package]
-            bpath += '{0}      {1}\n'.format(pack, pack.version)
-        return bpath
+            packages[str(pack)] = str(pack.version)
+        return packages
     except:
+        return OrderedDict()
+
+
+def get_bob_info():
+    """Just add bob paths."""
+    packages = get_bob_dict()
+    if not packages:
         return ''
 
+    bpath = "BOB Paths and Versions: \n\n"
+    for pack, version in packages.iteritems():
+        bpath += '{0}      {1}\n'.format(pack, version)
+    return bpath
+
 
 def get_item_info(issue_type, item, item_parent):
     """Get name information for node.
@@ -159,3 +210,109 @@ def get_item_type_info(issue_type, item):
     elif issue_type == 'generic':
         return "Generic Houdini"
     return ''
+
+
+def get_definition_path(node_type):
+    """Get where a node type is defined.
+
+    Args:
+        node_type (hou.NodeType): node type to look up
+
+    Returns:
+        str: library file of the definition, source path of built in types, None if neither can be found
+
+    """
+    definition = node_type.definition()
+    try:
+        return definition.libraryFilePath() if definition else node_type.sourcePath()
+    except hou.Error:
+        return None
+
+
+def get_nodes_dicts(nodes):
+    """Get the item information of several nodes in one pass, looking up each node type's definition once.
+
+    Args:
+        nodes (list of hou.Node): selected nodes
+
+    Returns:
+        list of OrderedDict: same information as get_item_dict, one per node in order
+
+    """
+    definition_paths = {}
+    infos = []
+    for node in nodes:
+        node_type = node.type()
+        type_name = node_type.nameWithCategory()
+        if type_name not in definition_paths:
+            definition_paths[type_name] = get_definition_path(node_type)
+        infos.append(OrderedDict([('kind', 'dneg_node'), ('path', node.path()), ('type', type_name),
+                                  ('definition_path', definition_paths[type_name])]))
+    return infos
+
+
+def get_nodes_item_info(infos):
+    """Get name information for several nodes.
+
+    Args:
+        infos (list of OrderedDict): as returned by get_nodes_dicts
+
+    Returns:
+        str: required info
+
+    """
+    return "Issue submitted on {0} nodes:\n{1}".format(len(infos), "\n".join(_['path'] for _ in infos))
+
+
+def get_nodes_type_info(infos):
+    """Get type information for several nodes, each type listed once.
+
+    Args:
+        infos (list of OrderedDict): as returned by get_nodes_dicts
+
+    Returns:
+        str: required info
+
+    """
+    types = OrderedDict((_['type'], None) for _ in infos)
+    return "Operator types:\n{0}\n".format("\n".join(types))
+
+
+def get_nodes_path_info(infos):
+    """Get path information for several nodes, each definition listed once.
+
+    Args:
+        infos (list of OrderedDict): as returned by get_nodes_dicts
+
+    Returns:
+        str: required info
+
+    """
+    paths = OrderedDict((_['definition_path'] or "Could not determine source path of {0}".format(_['type']), None)
+                        for _ in infos)
+    return "Operator definition paths:\n{0}\n".format("\n".join(paths))
+
+
+def get_item_dict(issue_type, item, item_parent):
+    """Get the item information as values rather than description text.
+
+    Args:
+        issue_type (str): whether item is 'node', 'tool', or 'generic'
+        item (hou.Node): item node to process
+        item (hou.Tool): item tool to process
+        item_parent (hou.Shelf): item parent (shelf) to process
+
+    Returns:
+        OrderedDict: kind, path, type and definition path of the item, values are None when they don't apply
+
+    """
+    info = OrderedDict([('kind', issue_type), ('path', None), ('type', None), ('definition_path', None)])
+    if issue_type == 'dneg_node':
+        info['path'] = item.path()
+        info['type'] = item.type().nameWithCategory()
+        info['definition_path'] = get_definition_path(item.type())
+    elif issue_type == 'dneg_tool':
+        info['path'] = item_parent.filePath() if isinstance(item_parent, hou.Shelf) else item.filePath()
+        info['type'] = item.name()
+        info['definition_path'] = item.filePath()
+    return info
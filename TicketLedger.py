@@ -0,0 +1,154 @@
+"""Module containing the local submission ledger used to spot duplicate tickets before they are created.
+
+When a broken HDA hits a show, dozens of artists file near-identical tickets. Every created ticket is recorded
+against a signature of what it was submitted on (operator type, definition path and Houdini version) in an
+append-only ledger shared by the show, plus a per user ledger of recent tickets. The ledgers are read into an in
+memory index ahead of time so checking for a duplicate is a dict lookup, with no JQL query on the hot path.
+"""
+
+# standard Python modules
+from collections import namedtuple
+import hashlib
+import json
+import os
+import threading
+import time
+
+# local modules
+from jiraticketsubmitter.MetadataCache import DN_JIRA_LOCAL_CACHE_DIR
+
+# ledger file name, one in the show houdini data dir and one in the local cache dir
+DN_LEDGER_FILE = "houdiniJiraLedger.jsonl"
+
+# tickets older than this are no longer treated as likely duplicates (seconds)
+DN_LEDGER_MAX_AGE = 3 * 24 * 3600.0
+
+# one recorded ticket
+LedgerEntry = namedtuple("LedgerEntry", ["signature", "key", "time", "user"])
+
+# signature to most recent LedgerEntry, and how far each ledger file has been read
+_INDEX = {}
+_OFFSETS = {}
+_LOCK = threading.Lock()
+
+
+def get_signature(item_type_info, item_path_info, houdini_version):
+    """Build the signature used to match tickets on the same thing.
+
+    Args:
+        item_type_info (str): as returned by TicketInfo.get_item_type_info
+        item_path_info (str): as returned by TicketInfo.get_item_path_info
+        houdini_version (str): hou.applicationVersionString()
+
+    Returns:
+        str: signature
+
+    """
+    text = "|".join(_.strip() for _ in (item_type_info, item_path_info, houdini_version))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def get_ledger_paths():
+    """Get the ledger files, shared show ledger first.
+
+    Returns:
+        list: ledger file paths
+
+    """
+    paths = [os.path.join(DN_JIRA_LOCAL_CACHE_DIR, DN_LEDGER_FILE)]
+    if "SHOW" in os.environ:
+        paths.insert(0, os.path.join(os.sep, "tools", os.environ["SHOW"], "data", "houdini", DN_LEDGER_FILE))
+    return paths
+
+
+def refresh_index():
+    """Read any entries added to the ledgers since the last refresh into the in memory index.
+
+    Ledgers are append-only so only the new tail of each file is read.
+    """
+    with _LOCK:
+        for path in get_ledger_paths():
+            try:
+                with open(path, "r") as _file:
+                    _file.seek(_OFFSETS.get(path, 0))
+                    for line in _file:
+                        if not line.endswith("\n"):
+                            # partially written entry, pick it up next time
+                            break
+                        _OFFSETS[path] = _OFFSETS.get(path, 0) + len(line)
+                        _add_to_index(line)
+            except (IOError, OSError):
+                continue
+
+
+def refresh_index_in_background():
+    """Refresh the index on a daemon thread, e.g. when the submitter opens."""
+    thread = threading.Thread(target=refresh_index)
+    thread.daemon = True
+    thread.start()
+
+
+def find_duplicate(signature, max_age=DN_LEDGER_MAX_AGE):
+    """Look up a recent ticket with the same signature, in memory only.
+
+    Args:
+        signature (str): signature from get_signature, None for tickets that can't be matched
+        max_age (float): ignore tickets older than this (seconds)
+
+    Returns:
+        LedgerEntry: most recent matching ticket, None if there is none
+
+    """
+    entry = _INDEX.get(signature) if signature else None
+    if entry and time.time() - entry.time <= max_age:
+        return entry
+    return None
+
+
+def record(signature, key):
+    """Record a created ticket in the ledgers and the index.
+
+    Writes to the shared ledger fail silently, the local ledger still has it.
+
+    Args:
+        signature (str): signature from get_signature, nothing is recorded if None
+        key (str): JIRA issue key
+
+    Returns:
+        LedgerEntry: recorded entry, None if nothing was recorded
+
+    """
+    if not signature:
+        return None
+
+    entry = LedgerEntry(signature, key, time.time(), os.environ.get("USER", ""))
+    line = json.dumps(entry._asdict()) + "\n"
+    for path in get_ledger_paths():
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, "a") as _file:
+                _file.write(line)
+        except (IOError, OSError):
+            continue
+
+    with _LOCK:
+        _INDEX[signature] = entry
+    return entry
+
+
+def _add_to_index(line):
+    """Add one ledger line to the index, keeping the most recent entry per signature.
+
+    Args:
+        line (str): JSON ledger line
+
+    """
+    try:
+        entry = LedgerEntry(**json.loads(line))
+    except (ValueError, TypeError):
+        return
+
+    current = _INDEX.get(entry.signature)
+    if current is None or entry.time >= current.time:
+        _INDEX[entry.signature] = entry
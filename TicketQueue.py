@@ -0,0 +1,287 @@
+"""Module containing the local queue of tickets filed while JIRA was unreachable.
+
+Queued tickets are kept as JSON files in the local cache dir and submitted once the CircuitBreaker sees the server
+again, or the next time a submitter connects. A ticket whose issue was created before the server went away is queued
+with its key, and only its description comment and attachments are added later. The key is also written to the queue
+file as soon as the issue is created, so a submission cut short never creates the issue twice.
+"""
+
+# standard Python modules
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+
+# local modules
+from jiraticketsubmitter.MetadataCache import DN_JIRA_LOCAL_CACHE_DIR
+
+# queued ticket files
+DN_TICKET_QUEUE_DIR = os.path.join(DN_JIRA_LOCAL_CACHE_DIR, "queued_tickets")
+
+# tickets claimed longer ago than this were left by a session that went away (seconds)
+DN_TICKET_QUEUE_STALE = 3600.0
+
+# ticket attributes kept for a queued ticket
+DN_QUEUED_TICKET_FIELDS = ("project", "group", "issue_type", "priority", "title", "comment", "reporter", "watchers",
+                           "labels", "components", "shows")
+
+# per queue dir locks, so a session never submits the same ticket twice
+_LOCKS = {}
+_LOCK = threading.Lock()
+
+
+def queue_ticket(ticket, final_description, jira_server='jira', signature=None, attachments=None,
+                 submission_hip_file=None, attach_hip=False, key=None, queue_dir=None):
+    """Queue a ticket to be submitted once JIRA is reachable.
+
+    Args:
+        ticket (ticket_creator.Ticket): ticket ready to be created
+        final_description (str): description to add as the first comment
+        jira_server (str): name of jira server to use
+        signature (str): TicketLedger signature, if any
+        attachments (list of tuple): (file name, data) pairs to upload once created
+        submission_hip_file (str): saved hip file whose deliveries are confirmed on the ticket, if any
+        attach_hip (bool): attach the saved hip file to the ticket once created
+        key (str): key of the issue if it was already created, only the comment and attachments are then added, its
+            snapshot was linked when it was created
+        queue_dir (str): dir to queue the ticket in, defaults to DN_TICKET_QUEUE_DIR
+
+    Returns:
+        str: path of the queued ticket file
+
+    """
+    fields = {}
+    for field in DN_QUEUED_TICKET_FIELDS:
+        value = getattr(ticket, field, None)
+        fields[field] = list(value) if isinstance(value, (list, tuple, set)) else value
+
+    data = {'jira_server': jira_server,
+            'queued_at': time.time(),
+            'ticket': fields,
+            'final_description': final_description,
+            'signature': signature,
+            'attachments': [(_[0], base64.b64encode(_[1])) for _ in attachments or []],
+            'submission_hip_file': submission_hip_file,
+            'attach_hip': attach_hip,
+            'key': key,
+            'commented': False,
+            'attached': 0}
+
+    queue_dir = queue_dir or DN_TICKET_QUEUE_DIR
+    if not os.path.isdir(queue_dir):
+        os.makedirs(queue_dir)
+    fd, path = tempfile.mkstemp(dir=queue_dir, prefix="{0:.0f}_".format(time.time()), suffix=".json")
+    with os.fdopen(fd, "w") as _file:
+        json.dump(data, _file, indent=1)
+    return path
+
+
+def has_queued_tickets(queue_dir=None):
+    """Check for queued tickets without reading them.
+
+    Args:
+        queue_dir (str): queue dir to look in, defaults to DN_TICKET_QUEUE_DIR
+
+    Returns:
+        bool: True if any ticket is queued or claimed
+
+    """
+    try:
+        return any(_.endswith((".json", ".json.submitting")) for _ in os.listdir(queue_dir or DN_TICKET_QUEUE_DIR))
+    except OSError:
+        return False
+
+
+def get_queued_hip_files():
+    """Get the saved hip files of the queued tickets, including the ones being submitted.
+
+    Returns:
+        set: saved hip file paths
+
+    """
+    hip_files = set()
+    try:
+        file_names = os.listdir(DN_TICKET_QUEUE_DIR)
+    except OSError:
+        return hip_files
+
+    for file_name in file_names:
+        if not file_name.endswith((".json", ".json.submitting")):
+            continue
+        try:
+            with open(os.path.join(DN_TICKET_QUEUE_DIR, file_name), "r") as _file:
+                hip_file = json.load(_file).get('submission_hip_file')
+        except (IOError, OSError, ValueError):
+            continue
+        if hip_file:
+            hip_files.add(hip_file)
+    return hip_files
+
+
+# noinspection PyBroadException
+def submit_queued_tickets(jira_server='jira', queue_dir=None):
+    """Submit the tickets queued for a jira server, oldest first.
+
+    Each file is claimed by renaming it first, so two sessions never submit the same ticket. Tickets that fail are
+    put back in the queue, with how far they got, so a retry carries on with the same issue. Claims older than
+    DN_TICKET_QUEUE_STALE were left by a session that went away and are put back first.
+
+    Args:
+        jira_server (str): name of jira server to use
+        queue_dir (str): queue dir to submit from, defaults to DN_TICKET_QUEUE_DIR
+
+    Returns:
+        list: keys of the finished issues
+
+    """
+    import ticket_creator
+    from jiraticketsubmitter import JiraThrottle, SnapshotUpload, TicketLedger, TransferScheduler
+    from jiraticketsubmitter.HoudiniTicket import add_attachments, get_jira_connection, set_auto_info_field
+
+    queue_dir = queue_dir or DN_TICKET_QUEUE_DIR
+    keys = []
+    upload_ids = []
+    with _get_lock(queue_dir):
+        _recover_stale_claims(queue_dir)
+        try:
+            file_names = sorted(_ for _ in os.listdir(queue_dir) if _.endswith(".json"))
+        except OSError:
+            return keys
+
+        creator = None
+        for file_name in file_names:
+            path = os.path.join(queue_dir, file_name)
+            claimed_path = "{0}.submitting".format(path)
+            try:
+                os.rename(path, claimed_path)
+                # the claim is as old as the queued file, make it fresh so other sessions don't take it over
+                os.utime(claimed_path, None)
+                with open(claimed_path, "r") as _file:
+                    data = json.load(_file)
+            except (IOError, OSError, ValueError):
+                continue
+
+            if data.get('jira_server') != jira_server:
+                os.rename(claimed_path, path)
+                continue
+
+            try:
+                creator = creator or ticket_creator.ext.jira.JiraTicketCreator()
+                jira = get_jira_connection(server=jira_server)
+
+                ticket = ticket_creator.Ticket()
+                for field, value in data['ticket'].items():
+                    if value is not None:
+                        setattr(ticket, field, value)
+
+                if not data.get('key'):
+                    issue = JiraThrottle.call(jira_server, creator.create, ticket)
+                    if not issue:
+                        os.remove(claimed_path)
+                        continue
+
+                    # from here on a retry must not create the issue again
+                    data['key'] = issue.key
+                    _write_claimed(claimed_path, data)
+                    print "{0}: Created queued issue {1}".format(__name__, issue.key)
+
+                    TicketLedger.record(data.get('signature'), issue.key)
+                    if data.get('submission_hip_file'):
+                        TransferScheduler.link_ticket(data['submission_hip_file'], issue.key, jira_server)
+                        if data.get('attach_hip'):
+                            upload_ids.append(SnapshotUpload.queue_upload(data['submission_hip_file'], issue.key,
+                                                                          jira_server)['id'])
+
+                if data['final_description'] and not data.get('commented'):
+                    JiraThrottle.add_comment(jira_server, jira, data['key'], data['final_description'], window=0)
+                    data['commented'] = True
+                    _write_claimed(claimed_path, data)
+
+                attachments = [(_[0], base64.b64decode(_[1])) for _ in data.get('attachments') or []]
+                for attachment in attachments[data.get('attached', 0):]:
+                    add_attachments(jira_server, jira, data['key'], [attachment])
+                    data['attached'] = data.get('attached', 0) + 1
+                    _write_claimed(claimed_path, data)
+                if attachments:
+                    set_auto_info_field(jira_server, jira, data['key'], attachments)
+            except Exception as e:
+                print "{0}: could not submit queued ticket {1}: {2}".format(__name__, file_name, e)
+                os.rename(claimed_path, path)
+                break
+
+            os.remove(claimed_path)
+            keys.append(data['key'])
+
+    # attach the snapshots of the tickets just created, earlier uploads are resumed when a submitter connects
+    if upload_ids:
+        SnapshotUpload.resume_uploads(jira_server, upload_ids)
+    return keys
+
+
+def submit_queued_tickets_in_background(jira_server='jira'):
+    """Submit queued tickets on a daemon thread.
+
+    Args:
+        jira_server (str): name of jira server to use
+
+    """
+    thread = threading.Thread(target=submit_queued_tickets, args=(jira_server,))
+    thread.daemon = True
+    thread.start()
+
+
+def _write_claimed(claimed_path, data):
+    """Record how far the submission of a claimed ticket got, replacing its file in one go.
+
+    Args:
+        claimed_path (str): path of the claimed ticket file
+        data (dict): queued ticket
+
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(claimed_path), suffix=".tmp")
+    with os.fdopen(fd, "w") as _file:
+        json.dump(data, _file, indent=1)
+    os.rename(tmp_path, claimed_path)
+
+
+def _get_lock(queue_dir):
+    """Get the lock held while submitting from a queue dir.
+
+    Args:
+        queue_dir (str): queue dir
+
+    Returns:
+        threading.Lock: the dir's lock
+
+    """
+    with _LOCK:
+        lock = _LOCKS.get(queue_dir)
+        if lock is None:
+            lock = _LOCKS[queue_dir] = threading.Lock()
+        return lock
+
+
+def _recover_stale_claims(queue_dir):
+    """Put back the claimed tickets left by sessions that went away, they keep how far they got.
+
+    Args:
+        queue_dir (str): queue dir
+
+    """
+    try:
+        file_names = os.listdir(queue_dir)
+    except OSError:
+        return
+
+    now = time.time()
+    for file_name in file_names:
+        if not file_name.endswith(".json.submitting"):
+            continue
+        path = os.path.join(queue_dir, file_name)
+        try:
+            if now - os.path.getmtime(path) > DN_TICKET_QUEUE_STALE:
+                os.rename(path, path[:-len(".submitting")])
+        except OSError:
+            continue
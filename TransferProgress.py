@@ -0,0 +1,164 @@
+"""Module containing the progress of snapshot transfers, shown in Houdini's status bar.
+
+rsync's --progress output is read as it streams and parsed one record at a time, so memory use stays the same
+however large the transfer. The percent, rate and ETA of the file being sent are posted to the status bar through
+hdefereval, since the transfers run on the scheduler's worker threads, at most every DN_TRANSFER_PROGRESS_INTERVAL
+seconds per site. Nothing is posted when Houdini has no UI.
+"""
+
+# standard Python modules
+import os
+import re
+import time
+
+# SESI supplied modules
+import hou
+
+# least time between two status bar updates of a site (seconds)
+DN_TRANSFER_PROGRESS_INTERVAL = 0.5
+
+# bytes read from the rsync output at a time
+DN_TRANSFER_PROGRESS_READ_SIZE = 4096
+
+# longest partial record kept while waiting for the rest of it, anything longer is not progress output
+DN_TRANSFER_PROGRESS_MAX_RECORD = 1024
+
+# rsync --progress record, e.g. "  1,234,567  45%   12.34MB/s    0:01:10 (xfr#1, to-chk=0/2)"
+DN_TRANSFER_PROGRESS_RE = re.compile(r"^\s*([\d,]+)\s+(\d+)%\s+(\S+/s)\s+(\d+:\d\d:\d\d)")
+
+# rsync summary and header lines, which are not file names
+DN_TRANSFER_PROGRESS_SKIP_RE = re.compile(r"^(sending|sent|total|building|receiving|created|delta-transmission)\b")
+
+
+# ----------------------------------------------------
+# classes defined for this module
+# ----------------------------------------------------
+
+
+class TransferProgress(object):
+    """Parser of a running rsync's output, posting throttled status bar updates.
+
+    Args:
+        dest_site (str): destination site name
+        files (int): number of files sent by the rsync
+
+    """
+
+    def __init__(self, dest_site, files=1):
+        """Initialize the parser, feed it the output with feed() or read_stream()."""
+        self.dest_site = dest_site
+        self.files = files
+        self.current_file = None
+        self.files_started = 0
+        self.percent = None
+        self.rate = None
+        self.eta = None
+        self._partial = ""
+        self._last_post = 0.0
+
+    def feed(self, data):
+        """Parse a chunk of output, keeping only the unfinished record for the next chunk.
+
+        Args:
+            data (str): output read from rsync
+
+        """
+        records = re.split(r"[\r\n]", self._partial + data)
+        self._partial = records.pop()[-DN_TRANSFER_PROGRESS_MAX_RECORD:]
+        for record in records:
+            self.parse_record(record)
+
+    def read_stream(self, stream):
+        """Parse output as it is written until the stream closes.
+
+        Args:
+            stream (file): rsync's stdout
+
+        """
+        fd = stream.fileno()
+        while True:
+            data = os.read(fd, DN_TRANSFER_PROGRESS_READ_SIZE)
+            if not data:
+                break
+            self.feed(data)
+        if self._partial:
+            self.parse_record(self._partial)
+            self._partial = ""
+
+    def parse_record(self, record):
+        """Parse a single progress record or file name line.
+
+        Args:
+            record (str): one line or carriage return separated record
+
+        """
+        match = DN_TRANSFER_PROGRESS_RE.match(record)
+        if match:
+            self.percent = int(match.group(2))
+            self.rate = match.group(3)
+            self.eta = match.group(4)
+            self.post(force=self.percent == 100 and self.files_started == self.files)
+            return
+
+        record = record.strip()
+        if record and not record.endswith("/") and not DN_TRANSFER_PROGRESS_SKIP_RE.match(record):
+            self.current_file = record
+            self.files_started += 1
+            self.percent = self.rate = self.eta = None
+
+    def get_message(self):
+        """Format the current progress.
+
+        Returns:
+            str: status bar message
+
+        """
+        message = "JIRA snapshot transfer to {0}".format(self.dest_site.capitalize())
+        if self.files > 1:
+            message += " ({0}/{1})".format(min(max(self.files_started, 1), self.files), self.files)
+        if self.current_file:
+            message += ": {0}".format(os.path.basename(self.current_file))
+        if self.percent is not None:
+            message += " {0}% at {1}, ETA {2}".format(self.percent, self.rate, self.eta)
+        return message
+
+    def post(self, force=False):
+        """Post the current progress to the status bar, unless the last update was too recent.
+
+        Args:
+            force (bool): post even if the last update was too recent
+
+        """
+        now = time.time()
+        if not force and now - self._last_post < DN_TRANSFER_PROGRESS_INTERVAL:
+            return
+        self._last_post = now
+        post_status(self.get_message())
+
+    def finish(self, success):
+        """Post the outcome of the transfer.
+
+        Args:
+            success (bool): whether rsync succeeded
+
+        """
+        post_status("JIRA snapshot transfer to {0} {1}".format(self.dest_site.capitalize(),
+                                                               "finished" if success else "failed"))
+
+
+# ----------------------------------------------------
+# functions defined for this module
+# ----------------------------------------------------
+
+
+def post_status(message):
+    """Show a message in the status bar from any thread.
+
+    Args:
+        message (str): message to show
+
+    """
+    if not hou.isUIAvailable():
+        return
+    import hdefereval
+    hdefereval.executeDeferred(hou.ui.setStatusMessage, message)
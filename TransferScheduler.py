@@ -0,0 +1,1138 @@
+"""Module containing the scheduler that transfers ticket hip snapshots to the remote sites.
+
+Snapshots used to be pushed across the WAN straight away, at full speed, from inside the artist's session, where big
+FX hips collide with dailies and shot sync traffic. Every transfer is now a job in a persistent queue, sent by a
+background worker with a bandwidth cap per destination site:
+
+    - small snapshots and Blocker tickets are sent straight away
+    - other snapshots are sent one at a time in the background, most urgent ticket priority first
+    - large snapshots of tickets below Critical wait for the off-peak window
+
+Rather than the source pushing a copy to every destination itself, snapshots are relayed along the cheapest tree
+grown from the source over the site graph, e.g. mumbai to london, then london to vancouver, so the source uploads
+each snapshot once. Link costs come from the throughput measured by earlier transfers, or DN_TRANSFER_LINKS until a
+link has been measured. Every hop is a job of its own, started once the hop before it has delivered, and delivery to
+each site is logged separately.
+
+Jobs queued for the same hop within a short window, e.g. a snapshot and its manifest, or the snapshots of several
+tickets filed in a row, are sent in a single rsync with a file list. Once a ticket is created its snapshot files are
+linked to it, and delivery of each file to each site is confirmed on the ticket.
+
+Most snapshots are never opened at the destination sites though, so unless DN_TRANSFER_POLICY is set to push, only
+snapshots of DN_TRANSFER_PUSH_PRIORITIES tickets are pushed. The others stay at the origin site, the ticket says where,
+and support fetch them with the SnapshotRetrieve module when they open them. Bytes each policy moved, and would have
+moved pushing, are logged in the show's houdini data dir, where the artists' and support's sessions both write, so the
+two can be compared:
+
+    hython -m jiraticketsubmitter.TransferScheduler stats
+
+Sessions without a UI, e.g. hython scripts, wait for the snapshots to send now before they exit. Jobs left in the
+queue when the session ends, or claimed by a session that went away, are picked up when the next UI session starts, or
+by a scheduled job running:
+
+    hython -m jiraticketsubmitter.TransferScheduler run
+"""
+
+# standard Python modules
+import argparse
+import atexit
+import datetime
+import json
+import os
+import pipes
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+# SESI supplied modules
+import hou
+
+# dn
+import dnsitedata
+
+# local modules
+from jiraticketsubmitter import TransferProgress
+from jiraticketsubmitter.MetadataCache import DN_JIRA_LOCAL_CACHE_DIR
+
+#    site hip file transfer mappings, { 'source site': 'destination sites' }
+#    i.e. 'mum': 'lon, van'
+#    "if site for source hip file is mumbai, then copy to london and vancouver"
+
+DN_TRANSFER_MAP = {'vancouver': 'london,',
+                   'mumbai': 'london,vancouver',
+                   'london': 'vancouver,'}
+
+# remote host names
+DN_REMOTE_HOST_MAP = {'london': 'nomachine2',
+                      'vancouver': 'vannomachine2',
+                      'mumbai': 'mumnomachine2'}
+
+# site graph, expected throughput of each inter-site link in both directions (KiB/s), until measured
+DN_TRANSFER_LINKS = {('london', 'vancouver'): 20480,
+                     ('london', 'mumbai'): 6144,
+                     ('mumbai', 'vancouver'): 2048}
+
+# weight of the latest transfer in the measured throughput of a link
+DN_TRANSFER_LINK_SMOOTHING = 0.3
+
+# bandwidth cap per destination site (KiB/s, as taken by rsync --bwlimit), 0 for no cap
+DN_TRANSFER_BANDWIDTH_CAP = {'london': 10240,
+                             'vancouver': 10240,
+                             'mumbai': 4096}
+
+# snapshots up to this size are sent straight away (bytes)
+DN_TRANSFER_SMALL_FILE = 25 * 1024 * 1024
+
+# snapshots above this size wait for the off-peak window, unless the ticket is Critical or Blocker (bytes)
+DN_TRANSFER_LARGE_FILE = 500 * 1024 * 1024
+
+# off-peak window, local hours at the source site, may wrap past midnight
+DN_TRANSFER_OFF_PEAK = (20, 6)
+
+# urgency of a ticket priority, lower is more urgent, unknown priorities rank as Minor
+DN_TRANSFER_PRIORITY_RANK = {'Blocker': 0, 'Critical': 1, 'Major': 2, 'Minor': 3, 'Trivial': 4}
+
+# transfer policies, pushed snapshots are sent to every destination site, pulled ones stay here until fetched
+DN_TRANSFER_PUSH = "push"
+DN_TRANSFER_PULL = "pull"
+
+# policy of snapshots of tickets below DN_TRANSFER_PUSH_PRIORITIES, set to push to send every snapshot eagerly
+DN_TRANSFER_POLICY = os.environ.get("DN_HOUDINI_JIRA_TRANSFER_POLICY", DN_TRANSFER_PULL)
+
+# ticket priorities whose snapshots are always pushed
+DN_TRANSFER_PUSH_PRIORITIES = ("Blocker",)
+
+# how long the worker collects jobs before sending, so they can share an rsync (seconds)
+DN_TRANSFER_BATCH_WINDOW = 3.0
+
+# how often the worker looks for jobs it may send (seconds)
+DN_TRANSFER_POLL_INTERVAL = 60.0
+
+# failed jobs are retried this many times
+DN_TRANSFER_MAX_ATTEMPTS = 3
+
+# jobs claimed longer ago than this were left by a session that went away, longer than any transfer under the caps
+DN_TRANSFER_STALE = 6 * 3600.0
+
+# persistent queue, one JSON file per job
+DN_TRANSFER_QUEUE_DIR = os.path.join(DN_JIRA_LOCAL_CACHE_DIR, "transfer_queue")
+
+# append-only log of delivered and failed jobs, and the measured link throughput
+DN_TRANSFER_DELIVERY_LOG = os.path.join(DN_TRANSFER_QUEUE_DIR, "deliveries.jsonl")
+DN_TRANSFER_LINK_STATS = os.path.join(DN_TRANSFER_QUEUE_DIR, "link_stats.json")
+
+# snapshot files to the tickets they belong to, and how long the links are kept (seconds)
+DN_TRANSFER_TICKET_LINKS = os.path.join(DN_TRANSFER_QUEUE_DIR, "ticket_links.json")
+DN_TRANSFER_TICKET_LINK_MAX_AGE = 14 * 24 * 3600.0
+
+# bytes scheduled and moved under each policy, one log in the show houdini data dir shared by the artists scheduling
+# and the support staff retrieving snapshots, and one in the local queue dir for when the shared one can't be written
+DN_TRANSFER_POLICY_LOG_FILE = "houdiniJiraTransferPolicy.jsonl"
+DN_TRANSFER_POLICY_LOG = os.path.join(DN_TRANSFER_QUEUE_DIR, "policy_stats.jsonl")
+
+# delivery states
+DN_TRANSFER_DELIVERED = "delivered"
+DN_TRANSFER_FAILED = "failed"
+DN_TRANSFER_PENDING = "pending"
+
+# job schedules
+DN_TRANSFER_NOW = "now"
+DN_TRANSFER_QUEUED = "queued"
+DN_TRANSFER_OFF_PEAK_ONLY = "off_peak"
+
+_WORKERS = {}
+_METRICS = None
+_FLUSH_REGISTERED = False
+
+# files left at this site by the pull policy this session
+_PULLED = set()
+_LOCK = threading.Lock()
+
+
+# ----------------------------------------------------
+# classes defined for this module
+# ----------------------------------------------------
+
+
+class TransferMetrics(object):
+    """Counters for the transfers made by this session."""
+
+    def __init__(self):
+        """Initialize counters."""
+        self.transfers = 0
+        self.failures = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.sites = {}
+        self._lock = threading.Lock()
+
+    def record_transfer(self, dest_site, size, seconds, success):
+        """Count a finished transfer.
+
+        Args:
+            dest_site (str): site sent to
+            size (int): bytes sent
+            seconds (float): time taken
+            success (bool): False if the transfer failed
+
+        """
+        with self._lock:
+            if not success:
+                self.failures += 1
+                return
+            self.transfers += 1
+            self.bytes += size
+            self.seconds += seconds
+            site = self.sites.setdefault(dest_site, {'transfers': 0, 'bytes': 0, 'seconds': 0.0})
+            site['transfers'] += 1
+            site['bytes'] += size
+            site['seconds'] += seconds
+
+    def as_dict(self):
+        """Get the counters, with the current queue depth.
+
+        Returns:
+            dict: counter name to value
+
+        """
+        jobs = read_jobs()
+        with self._lock:
+            return {'transfers': self.transfers,
+                    'failures': self.failures,
+                    'bytes': self.bytes,
+                    'throughput': self.bytes / self.seconds if self.seconds else 0.0,
+                    'sites': dict((k, dict(v, throughput=v['bytes'] / v['seconds'] if v['seconds'] else 0.0))
+                                  for k, v in self.sites.items()),
+                    'queue_depth': len(jobs),
+                    'queued_bytes': sum(_['size'] for _ in jobs)}
+
+
+class TransferWorker(object):
+    """Daemon thread sending the queued jobs of some schedules that this session may send.
+
+    Args:
+        schedules (tuple): schedules of the jobs this worker sends
+
+    """
+
+    def __init__(self, schedules):
+        """Initialize an idle worker."""
+        self.schedules = schedules
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def wake(self):
+        """Start the worker thread if needed and have it look at the queue now."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self):
+        """Have the worker send what it can without waiting for the batch window, then wait for it to finish."""
+        self._stopping.set()
+        self._wake.set()
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    # noinspection PyBroadException
+    def _run(self):
+        """Send runnable jobs until there are none left, waiting for the poll interval when nothing may be sent."""
+        while True:
+            self._wake.clear()
+
+            # let jobs queued right after this one join its rsync
+            self._stopping.wait(DN_TRANSFER_BATCH_WINDOW)
+            sent = 0
+            try:
+                sent = process_queue(self.schedules)
+            except Exception as e:
+                print "{0}: transfer worker error: {1}".format(__name__, e)
+            if self._stopping.is_set() or not any(_['schedule'] in self.schedules for _ in read_jobs()):
+                return
+
+            # relayed hops may have become runnable with what was just delivered
+            if not sent:
+                self._wake.wait(DN_TRANSFER_POLL_INTERVAL)
+
+
+# ----------------------------------------------------
+# functions defined for this module
+# ----------------------------------------------------
+
+
+def get_metrics():
+    """Get the transfer metrics of this session.
+
+    Returns:
+        TransferMetrics: the session's metrics
+
+    """
+    global _METRICS
+    with _LOCK:
+        if _METRICS is None:
+            _METRICS = TransferMetrics()
+        return _METRICS
+
+
+def report_metrics():
+    """Print queue depth and throughput."""
+    metrics = get_metrics().as_dict()
+    print "{0}: {1} queued ({2:.1f} MB), {3} sent ({4:.1f} MB at {5:.0f} KB/s), {6} failed".format(
+        __name__, metrics['queue_depth'], metrics['queued_bytes'] / 1048576.0, metrics['transfers'],
+        metrics['bytes'] / 1048576.0, metrics['throughput'] / 1024.0, metrics['failures'])
+    for site, values in sorted(metrics['sites'].items()):
+        print "{0}:     {1}: {2} sent at {3:.0f} KB/s".format(__name__, site, values['transfers'],
+                                                              values['throughput'] / 1024.0)
+
+
+def get_schedule(size, priority=None):
+    """Decide when a snapshot may be sent.
+
+    Args:
+        size (int): file size in bytes
+        priority (str): ticket priority
+
+    Returns:
+        str: DN_TRANSFER_NOW, DN_TRANSFER_QUEUED or DN_TRANSFER_OFF_PEAK_ONLY
+
+    """
+    rank = get_priority_rank(priority)
+    if rank == 0 or size <= DN_TRANSFER_SMALL_FILE:
+        return DN_TRANSFER_NOW
+    if size > DN_TRANSFER_LARGE_FILE and rank > 1:
+        return DN_TRANSFER_OFF_PEAK_ONLY
+    return DN_TRANSFER_QUEUED
+
+
+def get_priority_rank(priority):
+    """Get the urgency of a ticket priority.
+
+    Args:
+        priority (str): ticket priority
+
+    Returns:
+        int: rank, lower is more urgent
+
+    """
+    return DN_TRANSFER_PRIORITY_RANK.get(priority, DN_TRANSFER_PRIORITY_RANK['Minor'])
+
+
+def is_off_peak(now=None):
+    """Check if the source site is in its off-peak window.
+
+    Args:
+        now (datetime.datetime): time to check, defaults to now
+
+    Returns:
+        bool: True in the off-peak window
+
+    """
+    hour = (now or datetime.datetime.now()).hour
+    start, end = DN_TRANSFER_OFF_PEAK
+    return start <= hour < end if start < end else hour >= start or hour < end
+
+
+def get_policy(priority=None):
+    """Get whether the snapshot of a ticket is pushed to the destination sites or left to be pulled.
+
+    Args:
+        priority (str): ticket priority
+
+    Returns:
+        str: DN_TRANSFER_PUSH or DN_TRANSFER_PULL
+
+    """
+    if DN_TRANSFER_POLICY == DN_TRANSFER_PUSH or priority in DN_TRANSFER_PUSH_PRIORITIES:
+        return DN_TRANSFER_PUSH
+    return DN_TRANSFER_PULL
+
+
+def is_pulled(path):
+    """Check whether a file was left at this site by the pull policy this session.
+
+    Args:
+        path (str): file given to schedule_transfer
+
+    Returns:
+        bool: True if the file was not pushed
+
+    """
+    return path in _PULLED
+
+
+def get_destination_sites(site_name=None):
+    """Get the sites a snapshot made at a site is sent to.
+
+    Args:
+        site_name (str): source site, defaults to the local site
+
+    Returns:
+        list: destination site names
+
+    """
+    site_name = site_name or dnsitedata.local_site().name
+    return [_.strip() for _ in DN_TRANSFER_MAP.get(site_name, '').split(',') if _.strip()]
+
+
+def get_link_throughput(site_a, site_b):
+    """Get the throughput of a link, as measured by earlier transfers or as configured.
+
+    Args:
+        site_a (str): site at one end
+        site_b (str): site at the other end
+
+    Returns:
+        float: KiB/s, 0 if the sites are not linked
+
+    """
+    link = "-".join(sorted((site_a, site_b)))
+    measured = read_link_stats().get(link)
+    if measured:
+        return measured
+    return DN_TRANSFER_LINKS.get((site_a, site_b)) or DN_TRANSFER_LINKS.get((site_b, site_a)) or 0
+
+
+def get_route_tree(source_site, dest_sites):
+    """Get the hops delivering a file from a site to every destination, each destination receiving it once.
+
+    The tree is grown from the source, each step attaching the destination with the cheapest link to a site that
+    already has the file.
+
+    Args:
+        source_site (str): site the file is at
+        dest_sites (list): sites to deliver to
+
+    Returns:
+        list of tuple: (from site, to site) hops, every hop after the one delivering to its from site
+
+    """
+    hops = []
+    reached = [source_site]
+    pending = [_ for _ in dest_sites if _ != source_site]
+    while pending:
+        links = [(get_link_throughput(a, b), a, b) for a in reached for b in pending]
+        links = [_ for _ in links if _[0]]
+        if not links:
+            # sites not in the graph are sent to directly
+            hops += [(source_site, _) for _ in pending]
+            break
+        throughput, from_site, to_site = max(links)
+        hops.append((from_site, to_site))
+        reached.append(to_site)
+        pending.remove(to_site)
+    return hops
+
+
+def schedule_transfer(path, priority=None):
+    """Queue a file to be delivered to every destination site of the local site and wake the worker.
+
+    Args:
+        path (str): file to transfer
+        priority (str): priority of the ticket the file belongs to
+
+    Returns:
+        list: queued jobs, one per hop
+
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return []
+
+    source_site = dnsitedata.local_site().name
+    dest_sites = [_ for _ in get_destination_sites(source_site) if _ in DN_REMOTE_HOST_MAP]
+
+    # log what pushing would move either way, to compare the policies
+    policy = get_policy(priority)
+    record_policy_bytes(policy, "scheduled", path, size * len(dest_sites))
+    if policy == DN_TRANSFER_PULL:
+        _PULLED.add(path)
+        return []
+    _PULLED.discard(path)
+
+    jobs = []
+    hop_jobs = {}
+    for from_site, dest_site in get_route_tree(source_site, dest_sites):
+        job = {'id': "{0:.0f}_{1}".format(time.time() * 1000, uuid.uuid4().hex[:8]),
+               'path': path,
+               'from_site': None if from_site == source_site else from_site,
+               'dest_site': dest_site,
+               'after': hop_jobs[from_site]['id'] if from_site in hop_jobs else None,
+               'size': size,
+               'priority': priority,
+               'schedule': get_schedule(size, priority),
+               'queued_at': time.time(),
+               'attempts': 0}
+        hop_jobs[dest_site] = job
+        write_job(job)
+        jobs.append(job)
+
+    # jobs to send now get their own worker, so they never wait behind a large transfer
+    for job in jobs:
+        get_worker(job['schedule'] == DN_TRANSFER_NOW).wake()
+
+    # daemon threads die with the process, a session without a UI sends its urgent jobs before it exits
+    global _FLUSH_REGISTERED
+    if not hou.isUIAvailable() and not _FLUSH_REGISTERED:
+        _FLUSH_REGISTERED = True
+        atexit.register(flush_transfers)
+    return jobs
+
+
+def get_worker(urgent):
+    """Get the worker of this session sending urgent jobs, or the one sending the others.
+
+    Args:
+        urgent (bool): get the worker sending DN_TRANSFER_NOW jobs
+
+    Returns:
+        TransferWorker: the worker
+
+    """
+    with _LOCK:
+        if urgent not in _WORKERS:
+            schedules = (DN_TRANSFER_NOW,) if urgent else (DN_TRANSFER_QUEUED, DN_TRANSFER_OFF_PEAK_ONLY)
+            _WORKERS[urgent] = TransferWorker(schedules)
+        return _WORKERS[urgent]
+
+
+# noinspection PyBroadException
+def flush_transfers():
+    """Send the jobs to send now, waiting for the urgent worker, e.g. before a session without a UI exits.
+
+    Other jobs stay queued for the next session or the scheduled job.
+
+    Returns:
+        int: number of jobs sent
+
+    """
+    with _LOCK:
+        worker = _WORKERS.get(True)
+    if worker is not None:
+        worker.stop()
+    try:
+        return process_queue((DN_TRANSFER_NOW,))
+    except Exception as e:
+        print "{0}: could not send the urgent transfers: {1}".format(__name__, e)
+        return 0
+
+
+def resume_transfers():
+    """Wake this session's workers for the jobs left in the queue, e.g. when a session starts.
+
+    Returns:
+        int: number of queued jobs
+
+    """
+    jobs = read_jobs()
+    if any(_['schedule'] == DN_TRANSFER_NOW for _ in jobs):
+        get_worker(True).wake()
+    if any(_['schedule'] != DN_TRANSFER_NOW for _ in jobs):
+        get_worker(False).wake()
+    return len(jobs)
+
+
+def write_job(job):
+    """Write a job to the persistent queue.
+
+    Args:
+        job (dict): job to write
+
+    """
+    if not os.path.isdir(DN_TRANSFER_QUEUE_DIR):
+        os.makedirs(DN_TRANSFER_QUEUE_DIR)
+    fd, tmp_path = tempfile.mkstemp(dir=DN_TRANSFER_QUEUE_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as _file:
+        json.dump(job, _file)
+    os.rename(tmp_path, os.path.join(DN_TRANSFER_QUEUE_DIR, "{0}.json".format(job['id'])))
+
+
+def read_jobs():
+    """Read the queued jobs, and the claimed ones left by sessions that went away.
+
+    Returns:
+        list: jobs, most urgent first
+
+    """
+    jobs = []
+    state_files = (os.path.basename(DN_TRANSFER_LINK_STATS), os.path.basename(DN_TRANSFER_TICKET_LINKS))
+    try:
+        file_names = os.listdir(DN_TRANSFER_QUEUE_DIR)
+    except OSError:
+        return jobs
+
+    now = time.time()
+    for file_name in file_names:
+        path = os.path.join(DN_TRANSFER_QUEUE_DIR, file_name)
+        try:
+            if file_name.endswith(".json.sending") and now - os.path.getmtime(path) > DN_TRANSFER_STALE:
+                os.rename(path, path[:-len(".sending")])
+                path = path[:-len(".sending")]
+            elif not file_name.endswith(".json") or file_name in state_files:
+                continue
+            with open(path, "r") as _file:
+                jobs.append(json.load(_file))
+        except (IOError, OSError, ValueError):
+            continue
+
+    schedules = (DN_TRANSFER_NOW, DN_TRANSFER_QUEUED, DN_TRANSFER_OFF_PEAK_ONLY)
+    return sorted(jobs, key=lambda _: (schedules.index(_['schedule']), get_priority_rank(_['priority']),
+                                       _['queued_at']))
+
+
+def record_delivery(job, state):
+    """Log the outcome of a job.
+
+    Args:
+        job (dict): finished job
+        state (str): DN_TRANSFER_DELIVERED or DN_TRANSFER_FAILED
+
+    """
+    entry = {'id': job['id'], 'path': job['path'], 'site': job['dest_site'], 'state': state, 'time': time.time()}
+    try:
+        with open(DN_TRANSFER_DELIVERY_LOG, "a") as _file:
+            _file.write(json.dumps(entry) + "\n")
+    except (IOError, OSError):
+        pass
+
+
+def read_deliveries():
+    """Read the delivery log.
+
+    Returns:
+        dict: job id to log entry
+
+    """
+    deliveries = {}
+    try:
+        with open(DN_TRANSFER_DELIVERY_LOG, "r") as _file:
+            for line in _file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                deliveries[entry['id']] = entry
+    except (IOError, OSError):
+        pass
+    return deliveries
+
+
+def get_delivery_status(path):
+    """Get where a file has been delivered to.
+
+    Args:
+        path (str): transferred file
+
+    Returns:
+        dict: site to DN_TRANSFER_DELIVERED, DN_TRANSFER_FAILED or DN_TRANSFER_PENDING
+
+    """
+    status = dict((_['site'], _['state']) for _ in read_deliveries().values() if _['path'] == path)
+    status.update((_['dest_site'], DN_TRANSFER_PENDING) for _ in read_jobs() if _['path'] == path)
+    return status
+
+
+def get_policy_log_paths(path=None):
+    """Get the policy stats logs, shared show log first.
+
+    The show is taken from the transferred file's /jobs/<show> path when it has one, as support retrieving a snapshot
+    may be set up for another show than the artist who saved it, else from $SHOW.
+
+    Args:
+        path (str): transferred file the bytes are logged for
+
+    Returns:
+        list: log file paths
+
+    """
+    paths = [DN_TRANSFER_POLICY_LOG]
+    parts = os.path.normpath(path).split(os.sep) if path else []
+    show = parts[2] if len(parts) > 2 and parts[:2] == ["", "jobs"] else os.environ.get("SHOW")
+    if show:
+        paths.insert(0, os.path.join(os.sep, "tools", show, "data", "houdini", DN_TRANSFER_POLICY_LOG_FILE))
+    return paths
+
+
+def record_policy_bytes(policy, event, path, size):
+    """Log bytes scheduled or moved under a policy, in the first log that can be written.
+
+    Args:
+        policy (str): DN_TRANSFER_PUSH or DN_TRANSFER_PULL
+        event (str): "scheduled" for bytes pushing the file would move, "moved" for bytes actually moved
+        path (str): transferred file
+        size (int): bytes
+
+    """
+    entry = {'policy': policy, 'event': event, 'path': path, 'size': size, 'time': time.time(),
+             'user': os.environ.get("USER", "")}
+    for log_path in get_policy_log_paths(path):
+        try:
+            if not os.path.isdir(os.path.dirname(log_path)):
+                os.makedirs(os.path.dirname(log_path))
+            with open(log_path, "a") as _file:
+                _file.write(json.dumps(entry) + "\n")
+            return
+        except (IOError, OSError):
+            continue
+
+
+def read_policy_stats(since=None):
+    """Total the bytes scheduled and moved under each policy, over the shared and local logs.
+
+    Args:
+        since (float): only count entries logged after this time
+
+    Returns:
+        dict: policy to 'files' scheduled, 'scheduled' bytes pushing them would move and 'moved' bytes
+
+    """
+    stats = dict((_, {'files': 0, 'scheduled': 0, 'moved': 0}) for _ in (DN_TRANSFER_PUSH, DN_TRANSFER_PULL))
+    for log_path in get_policy_log_paths():
+        try:
+            with open(log_path, "r") as _file:
+                for line in _file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry['policy'] not in stats or since and entry['time'] < since:
+                        continue
+                    stats[entry['policy']][entry['event']] += entry['size']
+                    if entry['event'] == "scheduled":
+                        stats[entry['policy']]['files'] += 1
+        except (IOError, OSError):
+            continue
+    return stats
+
+
+def read_link_stats():
+    """Read the measured link throughputs.
+
+    Returns:
+        dict: link name, site names sorted and joined with '-', to KiB/s
+
+    """
+    try:
+        with open(DN_TRANSFER_LINK_STATS, "r") as _file:
+            return json.load(_file)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def record_link_throughput(site_a, site_b, size, seconds):
+    """Blend a transfer's throughput into the measured throughput of its link.
+
+    Args:
+        site_a (str): site sent from
+        site_b (str): site sent to
+        size (int): bytes sent
+        seconds (float): time taken
+
+    """
+    if not seconds or size < DN_TRANSFER_SMALL_FILE:
+        # small transfers mostly measure connection setup
+        return
+
+    link = "-".join(sorted((site_a, site_b)))
+    stats = read_link_stats()
+    throughput = size / 1024.0 / seconds
+    if link in stats:
+        throughput = DN_TRANSFER_LINK_SMOOTHING * throughput + (1.0 - DN_TRANSFER_LINK_SMOOTHING) * stats[link]
+    stats[link] = throughput
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=DN_TRANSFER_QUEUE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w") as _file:
+            json.dump(stats, _file)
+        os.rename(tmp_path, DN_TRANSFER_LINK_STATS)
+    except (IOError, OSError):
+        pass
+
+
+def is_runnable(job, off_peak=None, deliveries=None):
+    """Check if a job may be sent now.
+
+    Args:
+        job (dict): queued job
+        off_peak (bool): whether we are in the off-peak window, defaults to is_off_peak()
+        deliveries (dict): as returned by read_deliveries, read if not given
+
+    Returns:
+        bool: True if it may be sent
+
+    """
+    # relayed hops wait for the file to reach the site they are sent from
+    if job.get('after'):
+        deliveries = read_deliveries() if deliveries is None else deliveries
+        if deliveries.get(job['after'], {}).get('state') != DN_TRANSFER_DELIVERED:
+            return False
+
+    if job['schedule'] != DN_TRANSFER_OFF_PEAK_ONLY:
+        return True
+    return is_off_peak() if off_peak is None else off_peak
+
+
+def get_batches(jobs):
+    """Group jobs sent over the same hop, keeping the most urgent jobs first.
+
+    Args:
+        jobs (list): runnable jobs, most urgent first
+
+    Returns:
+        list: lists of jobs to send in one rsync each
+
+    """
+    batches = []
+    hops = {}
+    for job in jobs:
+        # jobs whose batch failed are retried on their own to find out which file failed
+        if job.get('solo'):
+            batches.append([job])
+            continue
+        hop = (job.get('from_site'), job['dest_site'], job['schedule'])
+        if hop not in hops:
+            hops[hop] = []
+            batches.append(hops[hop])
+        hops[hop].append(job)
+    return batches
+
+
+def process_queue(schedules=None):
+    """Send the runnable jobs, most urgent first, one rsync per hop at a time.
+
+    Each job file is claimed by renaming it first, so two sessions never send the same job. Failed jobs go back in
+    the queue until they run out of attempts.
+
+    Args:
+        schedules (tuple): only send jobs of these schedules, defaults to all
+
+    Returns:
+        int: number of jobs sent
+
+    """
+    off_peak = is_off_peak()
+    deliveries = read_deliveries()
+    runnable = []
+    for job in read_jobs():
+        if schedules and job['schedule'] not in schedules:
+            continue
+
+        # hops relaying from a site the file never reached can't be sent either
+        if job.get('after') and deliveries.get(job['after'], {}).get('state') == DN_TRANSFER_FAILED:
+            if _claim_job(job):
+                _finish_job(job, DN_TRANSFER_FAILED)
+            continue
+
+        if is_runnable(job, off_peak, deliveries):
+            runnable.append(job)
+
+    sent = 0
+    for batch in get_batches(runnable):
+        batch = [_ for _ in batch if _claim_job(_)]
+        for job in [_ for _ in batch if not os.path.exists(_['path'])]:
+            _finish_job(job, DN_TRANSFER_FAILED)
+            batch.remove(job)
+        if not batch:
+            continue
+
+        dest_site = batch[0]['dest_site']
+        from_site = batch[0].get('from_site')
+        size = sum(_['size'] for _ in batch)
+        start = time.time()
+        success = rsync_files(dest_site, [_['path'] for _ in batch], from_site)
+        seconds = time.time() - start
+        get_metrics().record_transfer(dest_site, size, seconds, success)
+
+        if success:
+            record_link_throughput(from_site or dnsitedata.local_site().name, dest_site, size, seconds)
+            for job in batch:
+                _finish_job(job, DN_TRANSFER_DELIVERED)
+                record_policy_bytes(DN_TRANSFER_PUSH, "moved", job['path'], job['size'])
+            confirm_deliveries(batch)
+            sent += len(batch)
+            continue
+
+        for job in batch:
+            if len(batch) > 1:
+                job['solo'] = True
+            elif job['attempts'] + 1 < DN_TRANSFER_MAX_ATTEMPTS:
+                job['attempts'] += 1
+            else:
+                print "{0}: giving up on transfer of {1} to {2}".format(__name__, job['path'], job['dest_site'])
+                _finish_job(job, DN_TRANSFER_FAILED)
+                continue
+            os.remove(_get_job_path(job) + ".sending")
+            write_job(job)
+    return sent
+
+
+def read_ticket_links():
+    """Read which tickets the snapshot files belong to.
+
+    Returns:
+        dict: snapshot name, the hip file path without extension, to its 'time' and (jira server, key) 'tickets'
+
+    """
+    try:
+        with open(DN_TRANSFER_TICKET_LINKS, "r") as _file:
+            return json.load(_file)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def is_snapshot_file(path, snapshot):
+    """Check whether a file belongs to a snapshot, the hip file or a file saved next to it under its name.
+
+    Args:
+        path (str): transferred file
+        snapshot (str): hip file path without extension
+
+    Returns:
+        bool: True if the file belongs to the snapshot
+
+    """
+    return path.startswith(snapshot + ".") or path.startswith(snapshot + "_")
+
+
+def get_linked_tickets(path):
+    """Get the tickets a transferred file belongs to.
+
+    Args:
+        path (str): transferred file
+
+    Returns:
+        list: (jira server, key) pairs
+
+    """
+    tickets = []
+    for snapshot, link in read_ticket_links().items():
+        if is_snapshot_file(path, snapshot):
+            tickets += [tuple(_) for _ in link['tickets']]
+    return tickets
+
+
+def link_ticket(submission_hip_file, key, jira_server='jira'):
+    """Link a snapshot's files to the ticket created for it, confirming deliveries made before the ticket existed.
+
+    Args:
+        submission_hip_file (str): saved hip file
+        key (str): JIRA issue key
+        jira_server (str): name of jira server the issue is on
+
+    """
+    snapshot = os.path.splitext(submission_hip_file)[0]
+    with _LOCK:
+        links = read_ticket_links()
+        now = time.time()
+        links = dict((k, v) for k, v in links.items() if now - v['time'] < DN_TRANSFER_TICKET_LINK_MAX_AGE)
+        link = links.setdefault(snapshot, {'time': now, 'tickets': []})
+        if [jira_server, key] not in link['tickets']:
+            link['tickets'].append([jira_server, key])
+        try:
+            if not os.path.isdir(DN_TRANSFER_QUEUE_DIR):
+                os.makedirs(DN_TRANSFER_QUEUE_DIR)
+            fd, tmp_path = tempfile.mkstemp(dir=DN_TRANSFER_QUEUE_DIR, suffix=".tmp")
+            with os.fdopen(fd, "w") as _file:
+                json.dump(links, _file)
+            os.rename(tmp_path, DN_TRANSFER_TICKET_LINKS)
+        except (IOError, OSError):
+            pass
+
+    delivered = [{'path': _['path'], 'dest_site': _['site']} for _ in read_deliveries().values()
+                 if _['state'] == DN_TRANSFER_DELIVERED and is_snapshot_file(_['path'], snapshot)]
+    if delivered:
+        confirm_deliveries(delivered, [(jira_server, key)])
+
+
+# noinspection PyBroadException
+def confirm_deliveries(jobs, tickets=None):
+    """Comment on each ticket which of its snapshot files reached which site.
+
+    Args:
+        jobs (list): delivered jobs
+        tickets (list): (jira server, key) pairs to confirm on, defaults to the tickets linked to each file
+
+    """
+    from jiraticketsubmitter import JiraThrottle
+    from jiraticketsubmitter.HoudiniTicket import get_jira_connection
+
+    comments = {}
+    for job in jobs:
+        for ticket in tickets or get_linked_tickets(job['path']):
+            comments.setdefault(ticket, {}).setdefault(job['dest_site'], []).append(job['path'])
+
+    for (jira_server, key), sites in comments.items():
+        body = "\n".join("Hip snapshot files delivered to {0}:\n{1}\n".format(
+            site.capitalize(), "\n".join(sorted(paths))) for site, paths in sorted(sites.items()))
+        try:
+            JiraThrottle.add_comment(jira_server, get_jira_connection(server=jira_server), key, body)
+        except Exception as e:
+            print "{0}: could not confirm delivery on {1}: {2}".format(__name__, key, e)
+
+
+def _get_job_path(job):
+    """Get the queue file of a job.
+
+    Args:
+        job (dict): queued job
+
+    Returns:
+        str: path to job file
+
+    """
+    return os.path.join(DN_TRANSFER_QUEUE_DIR, "{0}.json".format(job['id']))
+
+
+def _claim_job(job):
+    """Claim a job by renaming its file, so two sessions never send the same job.
+
+    Args:
+        job (dict): queued job
+
+    Returns:
+        bool: True if this session now owns the job
+
+    """
+    try:
+        os.rename(_get_job_path(job), _get_job_path(job) + ".sending")
+
+        # the claim's age is counted from now, not from when the job was queued
+        os.utime(_get_job_path(job) + ".sending", None)
+    except OSError:
+        return False
+    return True
+
+
+def _finish_job(job, state):
+    """Log the outcome of a claimed job and remove it from the queue.
+
+    Args:
+        job (dict): claimed job
+        state (str): DN_TRANSFER_DELIVERED or DN_TRANSFER_FAILED
+
+    """
+    record_delivery(job, state)
+    os.remove(_get_job_path(job) + ".sending")
+
+
+def rsync_file(dest_site, path_to_file, from_site=None):
+    """Run rsync to copy a file to the same path at a remote site, within the site's bandwidth cap.
+
+    Args:
+        dest_site (str): destination site name
+        path_to_file (str): file to copy
+        from_site (str): site to relay the copy from, the file must already be there, None to send it from here
+
+    Returns:
+        bool: True if the file was copied
+
+    """
+    return rsync_files(dest_site, [path_to_file], from_site)
+
+
+def rsync_files(dest_site, paths, from_site=None):
+    """Run a single rsync copying files to the same paths at a remote site, within the site's bandwidth cap.
+
+    The files are passed as a file list on stdin, so rsync creates the remote directories and pipelines the files
+    over one connection.
+
+    Args:
+        dest_site (str): destination site name
+        paths (list): absolute paths of the files to copy
+        from_site (str): site to relay the copy from, the files must already be there, None to send them from here
+
+    Returns:
+        bool: True if every file was copied
+
+    """
+    # get proper destination host name
+    if dest_site not in DN_REMOTE_HOST_MAP or from_site and from_site not in DN_REMOTE_HOST_MAP:
+        return False
+
+    user = os.environ["USER"]
+    dest_host = '{0}@{1}'.format(user, DN_REMOTE_HOST_MAP[dest_site])
+
+    rsync_command = ["rsync", "-avux", "--keep-dirlinks", "--progress", "--files-from=-"]
+    if DN_TRANSFER_BANDWIDTH_CAP.get(dest_site):
+        rsync_command.append("--bwlimit={0}".format(DN_TRANSFER_BANDWIDTH_CAP[dest_site]))
+    rsync_command += ["/", "{0}:/".format(dest_host)]
+
+    # relayed copies run rsync on the relay site's host
+    if from_site:
+        rsync_command = ["ssh", "{0}@{1}".format(user, DN_REMOTE_HOST_MAP[from_site]),
+                         " ".join(pipes.quote(_) for _ in rsync_command)]
+
+    print "{0}: Running rsync of {1} backup file(s) to {2}:\n\t{3}".format(__name__, len(paths), dest_site,
+                                                                          " ".join(rsync_command))
+    # progress is parsed as rsync writes it rather than collected
+    progress = TransferProgress.TransferProgress(dest_site, len(paths))
+    try:
+        process = subprocess.Popen(rsync_command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        process.stdin.write("".join("{0}\n".format(_.lstrip("/")) for _ in paths))
+        process.stdin.close()
+        progress.read_stream(process.stdout)
+        process.wait()
+    except (IOError, OSError) as e:
+        print "{0}: rsync to {1} failed: {2}".format(__name__, dest_site, e)
+        progress.finish(False)
+        return False
+
+    if process.returncode:
+        print "{0}: rsync to {1} failed with exit code {2}".format(__name__, dest_site, process.returncode)
+    progress.finish(not process.returncode)
+    return not process.returncode
+
+
+def main(argv=None):
+    """Send the queued jobs that may be sent now, or report the queue.
+
+    Args:
+        argv (list): arguments, defaults to sys.argv[1:]
+
+    Returns:
+        int: exit code, 0 on success
+
+    """
+    parser = argparse.ArgumentParser(prog="jiraticketsubmitter.TransferScheduler",
+                                     description="Houdini JIRA ticket snapshot transfers.")
+    parser.add_argument("command", choices=("run", "status", "deliveries", "stats"),
+                        help="send runnable jobs, print the queue, print where a file has been delivered, or compare "
+                             "the bytes moved by each policy")
+    parser.add_argument("path", nargs="?", help="transferred file, for deliveries")
+    parser.add_argument("--days", type=float, help="only count the last few days, for stats")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        process_queue()
+    elif args.command == "stats":
+        stats = read_policy_stats(time.time() - args.days * 24 * 3600.0 if args.days else None)
+        for policy in (DN_TRANSFER_PUSH, DN_TRANSFER_PULL):
+            entry = stats[policy]
+            print "{0:<5} {1:>6} files  {2:>10.1f} MB if pushed  {3:>10.1f} MB moved".format(
+                policy, entry['files'], entry['scheduled'] / 1048576.0, entry['moved'] / 1048576.0)
+        return 0
+    elif args.command == "deliveries":
+        for site, state in sorted(get_delivery_status(args.path).items()):
+            print "{0}  {1}".format(site, state)
+        return 0
+    else:
+        for job in read_jobs():
+            route = "{0}>{1}".format(job.get('from_site') or "here", job['dest_site'])
+            print "{0:<20} {1:>8.1f} MB  {2:<10} {3:<9} {4}".format(route, job['size'] / 1048576.0, job['schedule'],
+                                                                   job['priority'] or '-', job['path'])
+    report_metrics()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
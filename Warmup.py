@@ -0,0 +1,235 @@
+"""Module containing the optional warm-up stage that prepares the submitter while Houdini is idle.
+
+The first time the JiraSubmitter panel is opened the artist pays for the JIRA connection probe, watcher lookup,
+environment collection and Qt dialog construction all at once. Warming up does that work ahead of time so opening
+from the RMB menu shows a ready form.
+
+To enable it at session start (e.g. from 456.py):
+
+    from jiraticketsubmitter import Warmup
+    Warmup.start_warmup_if_enabled()
+
+Nothing is done until the first idle event loop tick, the blocking work runs on a background thread and only the
+hidden dialog is built on the main thread. Call cancel_warmup() to stop it at any point.
+"""
+
+# standard Python modules
+import os
+import threading
+import time
+
+# SESI supplied modules
+import hou
+
+# set this environment variable to a non-zero value to warm up the submitter at session start
+DN_JIRA_WARMUP_ENV_VAR = "DN_HOUDINI_JIRA_WARMUP"
+
+# the warm-up object for this session
+_WARMUP = None
+
+
+# ----------------------------------------------------
+# classes defined for this module
+# ----------------------------------------------------
+
+
+class SubmitterWarmup(object):
+    """Prepare the submitter in stages on Houdini idle event loop ticks.
+
+    Args:
+        jira_server (str): name of jira server to use
+
+    """
+
+    def __init__(self, jira_server='jira'):
+        """Initialize warm-up state, nothing is started until start() is called."""
+        self.jira_server = jira_server
+        self.dialog = None
+        self.error = None
+        self.timings = {}
+
+        self._ticket = None
+        self._thread = None
+        self._registered = False
+        self._cancelled = threading.Event()
+        self._prepared = threading.Event()
+
+    @property
+    def is_ready(self):
+        """bool: True if a hidden dialog is ready to be shown."""
+        return self.dialog is not None
+
+    def start(self, immediate=False):
+        """Register the idle callback that drives the warm-up.
+
+        Args:
+            immediate (bool): start the background stages now rather than on the first idle tick
+        """
+        if self._registered or self._cancelled.is_set():
+            return
+
+        if immediate and self._thread is None:
+            self._start_thread()
+
+        hou.ui.addEventLoopCallback(self._on_idle)
+        self._registered = True
+
+    def cancel(self):
+        """Stop the warm-up and throw away any dialog kept ready.
+
+        A background stage that is already running finishes on its own but its result is ignored.
+        """
+        self._cancelled.set()
+        self._unregister()
+
+        dialog = self.dialog
+        self.dialog = None
+        if dialog is not None:
+            dialog.deleteLater()
+
+    def take_dialog(self):
+        """Hand over the hidden dialog, and keep another one ready for the next submission.
+
+        Returns:
+            HouJiraReportDialog: lightweight dialog to retarget at a ticket, None if not ready
+
+        """
+        dialog = self.dialog
+        self.dialog = None
+        if dialog is not None:
+            self.start()
+        return dialog
+
+    def _on_idle(self):
+        """Event loop callback, does at most one quick step per tick so it never blocks the UI."""
+        if self._cancelled.is_set():
+            self._unregister()
+            return
+
+        # first tick, kick off the blocking stages in the background
+        if self._thread is None:
+            self._start_thread()
+            return
+
+        # wait for the background stages
+        if not self._prepared.is_set():
+            return
+
+        self._unregister()
+        if self.error is None and self.dialog is None:
+            self._build_dialog()
+
+    def _start_thread(self):
+        """Run the blocking stages on a daemon thread."""
+        self._thread = threading.Thread(target=self._prepare)
+        self._thread.daemon = True
+        self._thread.start()
+
+    # noinspection PyBroadException
+    def _prepare(self):
+        """Establish the connection, look up watchers, collect the static auto info and check the metadata cache.
+
+        Building a generic HoudiniTicket fills the per session caches used by every later ticket.
+        """
+        from jiraticketsubmitter import HoudiniTicket, MetadataCache
+
+        try:
+            start = time.time()
+            HoudiniTicket.get_jira_connection(server=self.jira_server)
+            self.timings['connection'] = time.time() - start
+            if self._cancelled.is_set():
+                return
+
+            start = time.time()
+            self._ticket = HoudiniTicket.HoudiniTicket(item=None, disable_ui=True, jira_server=self.jira_server)
+            self.timings['ticket'] = time.time() - start
+
+            # make sure dialog metadata is on disk and fresh
+            MetadataCache.get_metadata(self.jira_server, self._ticket.project)
+
+        except Exception as e:
+            self.error = e
+            print "{0}: submitter warm-up failed: {1}".format(__name__, e)
+
+        finally:
+            self._prepared.set()
+
+    def _build_dialog(self):
+        """Build the hidden dialog, this is the only stage that runs on the main thread."""
+        from jiraticketsubmitter.HouJiraReportDialog import HouJiraReportDialog
+
+        start = time.time()
+        info = dict(self._ticket.info_for_dialog, disable_ui=False, lightweight=True, warmup=True)
+        self.dialog = HouJiraReportDialog(**info)
+        self.timings['dialog'] = time.time() - start
+
+    def _unregister(self):
+        """Remove our event loop callback if it is registered."""
+        if self._registered:
+            self._registered = False
+            try:
+                hou.ui.removeEventLoopCallback(self._on_idle)
+            except hou.OperationFailed:
+                pass
+
+
+# ----------------------------------------------------
+# functions defined for this module
+# ----------------------------------------------------
+
+
+def start_warmup(jira_server='jira', immediate=False):
+    """Start warming up the submitter for this session.
+
+    Args:
+        jira_server (str): name of jira server to use
+        immediate (bool): start the background stages now rather than on the first idle tick
+
+    Returns:
+        SubmitterWarmup: the session warm-up object, None if there is no UI
+
+    """
+    global _WARMUP
+    if not hou.isUIAvailable():
+        return None
+
+    if _WARMUP is None or _WARMUP.jira_server != jira_server:
+        cancel_warmup()
+        _WARMUP = SubmitterWarmup(jira_server)
+    _WARMUP.start(immediate=immediate)
+    return _WARMUP
+
+
+def start_warmup_if_enabled(jira_server='jira'):
+    """Start the warm-up if DN_HOUDINI_JIRA_WARMUP is set, for use from session start scripts.
+
+    Args:
+        jira_server (str): name of jira server to use
+
+    Returns:
+        SubmitterWarmup: the session warm-up object, None if not enabled
+
+    """
+    if os.environ.get(DN_JIRA_WARMUP_ENV_VAR, "0") in ("", "0"):
+        return None
+    return start_warmup(jira_server)
+
+
+def cancel_warmup():
+    """Cancel the session warm-up, if any."""
+    global _WARMUP
+    if _WARMUP is not None:
+        _WARMUP.cancel()
+        _WARMUP = None
+
+
+def take_dialog():
+    """Take the hidden dialog kept ready by the warm-up.
+
+    Returns:
+        HouJiraReportDialog: lightweight dialog to retarget at a ticket, None if the warm-up has not finished
+
+    """
+    if _WARMUP is None:
+        return None
+    return _WARMUP.take_dialog()
@@ -1,5 +1,31 @@
+import hou
+
+import MetadataCache
+import TransferProgress
+import TransferScheduler
+import FileManifest
+import SnapshotRetrieve
+import SnapshotRetention
 import HipFileUtils
 import TicketInfo
+import EnvBaseline
+import SceneDiagnostics
+import ProfileCapture
+import JiraThrottle
+import TicketLedger
+import TicketQueue
+import LogCapture
+import SnapshotUpload
+import CircuitBreaker
 import HoudiniTicket
-import HouJiraReportDialog
-import Creator
+import BulkSubmit
+import Warmup
+
+# Qt based modules are only imported when there is a UI, so batch hython never loads Qt
+if hou.isUIAvailable():
+    import ScreenCapture
+    import HouJiraReportDialog
+    import Creator
+
+    # send snapshot transfers left queued by earlier sessions, batch hython leaves them to the scheduled job
+    TransferScheduler.resume_transfers()
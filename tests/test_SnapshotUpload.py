@@ -0,0 +1,162 @@
+"""Tests of the resumable hip snapshot upload against a local FakeJiraServer.
+
+Run from hython, with jiraticketsubmitter importable:
+
+    hython -m unittest discover -s tests
+"""
+
+# standard Python modules
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+# third party modules
+import jira
+
+# local modules
+from jiraticketsubmitter import HoudiniTicket, LoadTest, SnapshotUpload
+
+# name the fake server's jira connection is registered under
+DN_TEST_JIRA_SERVER = "fakejira"
+
+# size of the test snapshot, random bytes so it doesn't compress, gives three parts
+DN_TEST_SNAPSHOT_SIZE = 2 * SnapshotUpload.DN_SNAPSHOT_UPLOAD_PART_SIZE + 1024 * 1024
+
+
+# ----------------------------------------------------
+# classes defined for this module
+# ----------------------------------------------------
+
+
+class InterruptingJiraServer(LoadTest.FakeJiraServer):
+    """Fake server failing every attachment after the first few, like a session going away mid upload."""
+
+    def __init__(self, **kwargs):
+        """Initialize the server, attachments are accepted until fail_after is set."""
+        super(InterruptingJiraServer, self).__init__(**kwargs)
+        self.fail_after = None
+        self.keep_attachment_data = True
+
+    def _route(self, request, method, body):
+        """Answer attachments with a 500 once fail_after were accepted."""
+        if method == "POST" and request.path.endswith("/attachments") and self.fail_after is not None and \
+                self.stats['attachments'] >= self.fail_after:
+            self._send(request, 500, {'errorMessages': ["Connection reset"]})
+            return
+        super(InterruptingJiraServer, self)._route(request, method, body)
+
+
+class SnapshotUploadTest(unittest.TestCase):
+    """Upload a snapshot to a fresh fake server, with the upload queue in a temporary dir."""
+
+    def setUp(self):
+        """Start the fake server, create an issue and write a snapshot."""
+        self.server = InterruptingJiraServer(latency=0.0, jitter=0.0).start()
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self._upload_dir = SnapshotUpload.DN_SNAPSHOT_UPLOAD_DIR
+        self._max_size = SnapshotUpload.DN_SNAPSHOT_UPLOAD_MAX_SIZE
+        self._part_retries = SnapshotUpload.DN_SNAPSHOT_UPLOAD_PART_RETRIES
+        SnapshotUpload.DN_SNAPSHOT_UPLOAD_DIR = os.path.join(self.tmp_dir, "uploads")
+        SnapshotUpload.DN_SNAPSHOT_UPLOAD_PART_RETRIES = 0
+
+        self.snapshot = os.path.join(self.tmp_dir, "shot_jira_1.hip")
+        self.data = os.urandom(DN_TEST_SNAPSHOT_SIZE)
+        with open(self.snapshot, "wb") as _file:
+            _file.write(self.data)
+
+        HoudiniTicket._JIRA_CONNECTIONS[DN_TEST_JIRA_SERVER] = jira.JIRA(options={'server': self.server.url},
+                                                                        get_server_info=False)
+        self.key = HoudiniTicket._JIRA_CONNECTIONS[DN_TEST_JIRA_SERVER].create_issue(
+            fields={'project': {'key': "LOAD"}, 'summary': "snapshot upload test", 'issuetype': {'name': "Bug"}}).key
+
+    def tearDown(self):
+        """Stop the server and restore the module settings."""
+        self.server.stop()
+        HoudiniTicket._JIRA_CONNECTIONS.pop(DN_TEST_JIRA_SERVER, None)
+        SnapshotUpload.DN_SNAPSHOT_UPLOAD_DIR = self._upload_dir
+        SnapshotUpload.DN_SNAPSHOT_UPLOAD_MAX_SIZE = self._max_size
+        SnapshotUpload.DN_SNAPSHOT_UPLOAD_PART_RETRIES = self._part_retries
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def get_attachments(self):
+        """Get the names of the attachments on the test issue, in the order they were attached."""
+        return [_['filename'] for _ in self.server.issues[self.key]['attachment']]
+
+    def get_reassembled(self):
+        """Put the attached parts back together and decompress them, like the reassembly comment says."""
+        parts = sorted(_ for _ in self.server.attachment_data if _[0] == self.key)
+        gz_path = os.path.join(self.tmp_dir, "reassembled.hip.gz")
+        with open(gz_path, "wb") as _file:
+            for part in parts:
+                _file.write(self.server.attachment_data[part])
+        with gzip.open(gz_path, "rb") as _file:
+            return _file.read()
+
+    def test_multipart_file_range(self):
+        """The streamed body holds exactly the byte range, with a length matching what is sent."""
+        body = SnapshotUpload.MultipartFileRange(self.snapshot, 1000, 5000, "part")
+        chunks = []
+        while True:
+            chunk = body.read(777)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        data = "".join(chunks)
+
+        self.assertEqual(len(data), body.len)
+        self.assertIn(self.data[1000:6000], data)
+        self.assertNotIn(self.data[999:6000], data)
+        self.assertTrue(data.endswith("--{0}--\r\n".format(body.boundary)))
+
+    def test_upload(self):
+        """A snapshot is attached in parts that put back together give the snapshot."""
+        upload = SnapshotUpload.queue_upload(self.snapshot, self.key, DN_TEST_JIRA_SERVER)
+
+        self.assertEqual(SnapshotUpload.resume_uploads(DN_TEST_JIRA_SERVER, [upload['id']]), [self.key])
+        self.assertEqual(len(self.get_attachments()), 3)
+        self.assertEqual(self.get_reassembled(), self.data)
+        self.assertIn("attached in 3 part(s)", self.server.issues[self.key]['comments'][-1])
+        self.assertFalse(SnapshotUpload.has_queued_uploads())
+
+    def test_interrupted_upload_resumes(self):
+        """An upload cut short is put back in the queue and resumed without sending the parts already attached."""
+        self.server.fail_after = 1
+        SnapshotUpload.queue_upload(self.snapshot, self.key, DN_TEST_JIRA_SERVER)
+
+        self.assertEqual(SnapshotUpload.resume_uploads(DN_TEST_JIRA_SERVER), [])
+        self.assertEqual(len(self.get_attachments()), 1)
+        self.assertTrue(SnapshotUpload.has_queued_uploads())
+        self.assertEqual(self.server.issues[self.key]['comments'], [])
+
+        self.server.fail_after = None
+        self.assertEqual(SnapshotUpload.resume_uploads(DN_TEST_JIRA_SERVER), [self.key])
+        attachments = self.get_attachments()
+        self.assertEqual(len(attachments), 3)
+        self.assertEqual(len(set(attachments)), 3)
+        self.assertEqual(self.get_reassembled(), self.data)
+        self.assertFalse(SnapshotUpload.has_queued_uploads())
+
+    def test_other_uploads_left_queued(self):
+        """Resuming given uploads leaves the other queued uploads alone."""
+        upload = SnapshotUpload.queue_upload(self.snapshot, self.key, DN_TEST_JIRA_SERVER)
+        SnapshotUpload.queue_upload(self.snapshot, self.key, DN_TEST_JIRA_SERVER)
+
+        self.assertEqual(SnapshotUpload.resume_uploads(DN_TEST_JIRA_SERVER, [upload['id']]), [self.key])
+        self.assertTrue(SnapshotUpload.has_queued_uploads())
+
+    def test_size_cap(self):
+        """Snapshots over the size cap are not attached, the issue gets a comment instead."""
+        SnapshotUpload.DN_SNAPSHOT_UPLOAD_MAX_SIZE = 1024
+        SnapshotUpload.queue_upload(self.snapshot, self.key, DN_TEST_JIRA_SERVER)
+
+        self.assertEqual(SnapshotUpload.resume_uploads(DN_TEST_JIRA_SERVER), [self.key])
+        self.assertEqual(self.get_attachments(), [])
+        self.assertIn("over the 0 MB limit", self.server.issues[self.key]['comments'][-1])
+        self.assertFalse(SnapshotUpload.has_queued_uploads())
+
+
+if __name__ == "__main__":
+    unittest.main()